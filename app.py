@@ -1,14 +1,35 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, redirect, url_for, session, g, has_app_context, \
+    has_request_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+from sqlalchemy.schema import AddConstraint
+from sqlalchemy.orm import with_loader_criteria
+from sqlalchemy.sql.dml import UpdateBase
+from flask_sqlalchemy.session import Session as FlaskSQLAlchemySession
 from werkzeug.security import generate_password_hash, check_password_hash
-import stripe
 import os
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
+from collections import deque, namedtuple, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import gzip
+import hashlib
 import json
+import math
+import multiprocessing
+import struct
+import threading
+import time
+import signal
+import sqlite3
+import tempfile
 import jinja2
+import click
 from functools import wraps
 
 load_dotenv()
@@ -20,26 +41,338 @@ app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key-change-in-pro
 DATABASE_URL = os.getenv('DATABASE_URL')
 if DATABASE_URL and DATABASE_URL.startswith('postgres://'):
     DATABASE_URL = DATABASE_URL.replace('postgres://', 'postgresql://', 1)
-    app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///chronicle.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = DATABASE_URL or 'sqlite:///chronicle.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-db = SQLAlchemy(app)
+# Engine profile: 'postgres', 'pgbouncer', 'sqlite' or 'default' (plain SQLAlchemy settings).
+# Picked from the database URL unless DB_PROFILE is set.
+DB_PROFILE = os.getenv('DB_PROFILE') or \
+    ('sqlite' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite') else 'postgres')
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 15000))
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', 128 * 1024 * 1024)),
+    'cache_size': int(os.getenv('SQLITE_CACHE_SIZE', -32000)),  # Negative = KiB
+    'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+}
+# 'monthly' once `flask partitions enable` has range-partitioned rep and
+# program_set_log by created_at on Postgres; rep loads then bound created_at
+DB_PARTITIONING = os.getenv('DB_PARTITIONING', 'none')
+
+
+def engine_options(profile):
+    """SQLAlchemy engine options for a database profile"""
+    if profile == 'postgres':
+        # Each gunicorn worker process gets its own pool; split the connection
+        # budget across workers and keep one pooled connection per thread
+        workers = int(os.getenv('WEB_CONCURRENCY', 1))
+        threads = int(os.getenv('GUNICORN_THREADS', 1))
+        per_worker = max(1, int(os.getenv('DB_MAX_CONNECTIONS', 20)) // workers)
+        pool_size = int(os.getenv('DB_POOL_SIZE', min(threads, per_worker)))
+        return {
+            'pool_size': pool_size,
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', max(0, per_worker - pool_size))),
+            'pool_pre_ping': True,
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', 1800)),
+            'pool_timeout': 10,
+            'connect_args': {'options': f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'},
+        }
+    if profile == 'pgbouncer':
+        # PgBouncer (transaction pooling) owns the pool and rejects startup
+        # options, so hold no connections here and set the timeout per transaction
+        return {'poolclass': NullPool}
+    if profile == 'sqlite':
+        return {'connect_args': {'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000}}
+    return {}
+
+
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if DB_PROFILE != 'sqlite' or not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for pragma, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f'PRAGMA {pragma} = {value}')
+    cursor.close()
+
+
+@event.listens_for(Engine, 'begin')
+def set_transaction_timeout(conn):
+    if DB_PROFILE == 'pgbouncer':
+        conn.exec_driver_sql(f'SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}')
+
+
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(DB_PROFILE)
+
+# Optional read replica for the dashboard GET endpoints (see replica_reads)
+REPLICA_DATABASE_URL = os.getenv('REPLICA_DATABASE_URL')
+if REPLICA_DATABASE_URL and REPLICA_DATABASE_URL.startswith('postgres://'):
+    REPLICA_DATABASE_URL = REPLICA_DATABASE_URL.replace('postgres://', 'postgresql://', 1)
+if REPLICA_DATABASE_URL:
+    app.config['SQLALCHEMY_BINDS'] = {'replica': REPLICA_DATABASE_URL}
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+
+
+class RoutingSession(FlaskSQLAlchemySession):
+    """Sends reads to the replica engine while a replica_reads view is running.
+
+    Flushes and INSERT/UPDATE/DELETE statements always go to the primary, and so
+    does every read after the request's first write.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and not isinstance(clause, UpdateBase) \
+                and has_app_context() and g.get('use_replica') and not g.get('wrote_to_primary'):
+            replica = self._db.engines.get('replica')
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
-migrate = Migrate(app, db)
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+
+def init_app():
+    """Attach the extensions to the module-level app (this is not an app factory).
+
+    There is one app per process: routes, models and commands register on it as
+    the module is imported, and the end of the module calls this once. Nothing
+    here touches the database: engines connect on first use, and the schema
+    comes from `flask db upgrade` (the release command), not create_all().
+    Safe to call more than once.
+    """
+    if 'sqlalchemy' in app.extensions:
+        return
+    db.init_app(app)
+    login_manager.init_app(app)
+    app.cli.add_command(MigrateCommands('db', help='Perform database migrations.'))
+
+
+class MigrateCommands(click.Group):
+    """Flask-Migrate's `flask db` commands, imported only when one is looked up.
+
+    Web workers never need alembic, the slowest import in the app.
+    """
+
+    def migrate_group(self):
+        from flask_migrate import Migrate
+        from flask_migrate.cli import db as migrate_group
+        if 'migrate' not in app.extensions:
+            Migrate(app, db, include_object=not_a_partition)
+        return migrate_group
+
+    def make_context(self, info_name, args, parent=None, **extra):
+        # Click invokes the command of the returned context, so the real group takes over
+        return self.migrate_group().make_context(info_name, args, parent=parent, **extra)
+
+
+class LazyStripe:
+    """The stripe module, imported and configured on first use"""
+    module = None
+
+    def __getattr__(self, name):
+        if LazyStripe.module is None:
+            import stripe
+            stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+            LazyStripe.module = stripe
+        return getattr(LazyStripe.module, name)
+
+
 # Stripe configuration
-stripe.api_key = os.getenv('STRIPE_SECRET_KEY')
+stripe_client = LazyStripe()  # Every Stripe API call goes through this; tests swap in a fake
 WEBHOOK_SECRET = os.getenv('STRIPE_WEBHOOK_SECRET')
 STRIPE_MONTHLY_LINK = os.getenv('STRIPE_MONTHLY_LINK', 'https://buy.stripe.com/your-monthly-link')
 STRIPE_ANNUAL_LINK = os.getenv('STRIPE_ANNUAL_LINK', 'https://buy.stripe.com/your-annual-link')
 ACCESS_CODE = os.getenv('ACCESS_CODE')
 COACH_CODE = os.getenv('COACH_CODE')
+METRICS_TOKEN = os.getenv('METRICS_TOKEN')  # Bearer token for /metrics; unset hides it
+
+
+# ========== Latency Metrics ==========
+
+class LatencyStats:
+    """Count and recent percentiles of one operation's duration in this process"""
+
+    def __init__(self, window=1000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds * 1000)
+            self.count += 1
+
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+        if not samples:
+            return {'count': self.count}
+        return {'count': self.count, 'p50_ms': round(samples[len(samples) // 2], 1),
+                'p95_ms': round(samples[int(len(samples) * 0.95)], 1), 'max_ms': round(samples[-1], 1)}
+
+
+latency_stats = {}  # operation name -> LatencyStats
+
+
+def record_latency(name, seconds):
+    """Add to the process-wide stats and to this response's Server-Timing header"""
+    latency_stats.setdefault(name, LatencyStats()).record(seconds)
+    if has_request_context():
+        g.setdefault('server_timing', []).append((name, seconds))
+
+
+# ========== Password Hashing ==========
+# The KDF runs in a small process pool so a burst of logins can't hold the
+# GIL (and every other request) on a shared vCPU. At most
+# PASSWORD_HASH_MAX_PENDING hashes wait at once; past that the request gets a
+# 503. The work factor is pinned by PASSWORD_HASH_METHOD, the same for every
+# worker and machine: `flask passwords calibrate` measures a machine and prints
+# one. Logins re-hash passwords stored at a lower cost than that.
+
+PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')  # Werkzeug's default
+PASSWORD_HASH_TARGET_MS = int(os.getenv('PASSWORD_HASH_TARGET_MS', 250))  # For `flask passwords calibrate`
+PASSWORD_HASH_IN_POOL = os.getenv('PASSWORD_HASH_IN_POOL', '1') == '1'
+PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 1))
+PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 8))
+SCRYPT_MIN_N = 2 ** 15  # Werkzeug's default; calibration never goes below it
+SCRYPT_MAX_N = 2 ** 16  # 64 MiB per hash with r=8, in each worker's hashing process
+
+password_hash_pool = None
+password_hash_lock = threading.Lock()
+password_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_MAX_PENDING)
+
+
+class PasswordHashBusy(Exception):
+    """Every hashing slot is taken"""
+
+
+def hashing_pool():
+    global password_hash_pool
+    with password_hash_lock:
+        if password_hash_pool is None:
+            # spawn: forking a threaded worker could copy held locks into the child
+            password_hash_pool = ProcessPoolExecutor(PASSWORD_HASH_WORKERS,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+        return password_hash_pool
+
+
+def discard_hashing_pool(pool):
+    """Drop a broken pool so the next hash starts a new one (unless another thread already has)"""
+    global password_hash_pool
+    with password_hash_lock:
+        if password_hash_pool is pool:
+            password_hash_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def run_kdf(name, function, *args):
+    """Run a werkzeug hashing function in the pool (or inline) and record its latency.
+
+    A pool whose process died (e.g. OOM-killed) is replaced and the hash retried
+    once; if the new one breaks too the request gets PasswordHashBusy's 503.
+    """
+    if not password_hash_slots.acquire(blocking=False):
+        raise PasswordHashBusy()
+    start = time.perf_counter()
+    try:
+        if not PASSWORD_HASH_IN_POOL:
+            return function(*args)
+        for _ in range(2):
+            pool = hashing_pool()
+            try:
+                return pool.submit(function, *args).result()
+            except BrokenProcessPool:
+                print(f"❌ Password hashing process died, restarting the pool (pid {os.getpid()})")
+                discard_hashing_pool(pool)
+        raise PasswordHashBusy()
+    finally:
+        password_hash_slots.release()
+        record_latency(name, time.perf_counter() - start)
+
+
+def calibrate_hash_method(target_ms):
+    """Largest scrypt N (a power of two) whose hash takes about target_ms through run_kdf"""
+    run_kdf('password_calibrate', generate_password_hash, 'warm-up', 'pbkdf2:sha256:1')  # Starts the pool
+    n = SCRYPT_MIN_N
+    start = time.perf_counter()
+    run_kdf('password_calibrate', generate_password_hash, 'calibration', f'scrypt:{n}:8:1')
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    while n < SCRYPT_MAX_N and elapsed_ms * 2 <= target_ms:
+        n *= 2
+        elapsed_ms *= 2
+    return f'scrypt:{n}:8:1'
+
+
+def hash_cost(method):
+    """(algorithm strength, work factor) of a werkzeug method string such as 'scrypt:32768:8:1'"""
+    name, *params = method.split(':')
+    if name == 'scrypt':
+        n, r, p = (int(x) for x in params) if params else (2 ** 15, 8, 1)
+        return 1, n * r * p
+    if name == 'pbkdf2':
+        return 0, int(params[1]) if len(params) > 1 else 1_000_000
+    return -1, 0
+
+
+def hash_password(password):
+    return run_kdf('password_hash', generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+
+def verify_password(pwhash, password):
+    return run_kdf('password_verify', check_password_hash, pwhash, password)
+
+
+def password_needs_rehash(pwhash):
+    """Only upgrades: a hash stored at a higher cost than the current method is kept"""
+    return hash_cost(pwhash.split('$', 1)[0]) < hash_cost(PASSWORD_HASH_METHOD)
+
+
+@app.errorhandler(PasswordHashBusy)
+def password_hash_busy(e):
+    response = jsonify({'error': 'Too many sign-ins at once, please try again'})
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+
+@app.after_request
+def add_server_timing(response):
+    timings = g.pop('server_timing', None)
+    if timings:
+        response.headers['Server-Timing'] = ', '.join(f'{name};dur={seconds * 1000:.1f}' for name, seconds in timings)
+    return response
+
+
+@app.route('/metrics')
+def metrics():
+    """Latency summaries of this worker process"""
+    if not METRICS_TOKEN or request.headers.get('Authorization') != f'Bearer {METRICS_TOKEN}':
+        return jsonify({'error': 'Not found'}), 404
+    return jsonify({
+        'pid': os.getpid(),
+        'password_hash_method': PASSWORD_HASH_METHOD,
+        'rejected': dict(admission_rejections),
+        'latency': {name: stats.summary() for name, stats in sorted(latency_stats.items())}
+    })
+
+
+@app.cli.group('passwords')
+def passwords_cli():
+    """Password hashing settings"""
+
+
+@passwords_cli.command('calibrate')
+@click.option('--target-ms', default=PASSWORD_HASH_TARGET_MS, show_default=True)
+def calibrate_passwords_command(target_ms):
+    """Measure this machine and print a PASSWORD_HASH_METHOD to pin for every machine of its size"""
+    print(f"✅ PASSWORD_HASH_METHOD={calibrate_hash_method(target_ms)}")
+
+
 # Database Models
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -47,29 +380,39 @@ class User(UserMixin, db.Model):
     password_hash = db.Column(db.String(255), nullable=False)
     name = db.Column(db.String(100), nullable=True)  # Display name
     subscribed = db.Column(db.Boolean, default=False)
-    stripe_customer_id = db.Column(db.String(255), nullable=True)
+    stripe_customer_id = db.Column(db.String(255), nullable=True, index=True)
     subscription_type = db.Column(db.String(50), nullable=True)  # 'monthly' or 'annual'
     subscription_end_date = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     height = db.Column(db.Integer, default=58)  # Default height in inches
     needs_password_setup = db.Column(db.Boolean, default=False)  # Flag for users created via payment
+    subscription_event_at = db.Column(db.DateTime, nullable=True)  # 'created' of the last Stripe event applied
 
     # Coach system
     is_coach = db.Column(db.Boolean, default=False)
-    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # For athletes linked to a coach
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True, index=True)  # For athletes linked to a coach
 
     # Dashboard customization - JSON string of metric names
     dashboard_metrics = db.Column(db.Text, nullable=True)  # e.g. '["squat", "bench", "deadlift"]'
 
+    deleted_at = db.Column(db.DateTime, nullable=True)  # Soft-deleted; purged in the background
+    # Bumped by every write to the user's training data; part of the response cache key
+    data_version = db.Column(db.Integer, default=0, nullable=False)
+
     # Relationships
     athletes = db.relationship('User', backref=db.backref('coach', remote_side=[id]), lazy='dynamic')
 
+    __table_args__ = (
+        db.Index('ix_user_deleted_at', 'deleted_at', postgresql_where=db.text('deleted_at IS NOT NULL'),
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
+
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hash_password(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return verify_password(self.password_hash, password)
 
     def get_dashboard_metrics(self):
         if self.dashboard_metrics:
@@ -88,17 +431,48 @@ class User(UserMixin, db.Model):
 
 class Workout(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), default='Squat Session')
     exercise_type = db.Column(db.String(50), default='squat')
     notes = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
 
+    # Set when the sets moved to archived_workout (see archive_workouts);
+    # the counts keep the summary and the stats rollup whole without them
+    archived_at = db.Column(db.DateTime, nullable=True)
+    archived_set_count = db.Column(db.Integer, nullable=True)
+    archived_rep_count = db.Column(db.Integer, nullable=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)  # Soft-deleted; purged in the background
+    revision = db.Column(db.Integer, default=0, nullable=False)  # Bumped by writes to the set tree; part of the ETag
+
     user = db.relationship('User', backref=db.backref('workouts', lazy='dynamic', order_by='Workout.created_at.desc()'))
-    sets = db.relationship('Set', backref='workout', lazy='dynamic', order_by='Set.set_number', cascade='all, delete-orphan')
+    sets = db.relationship('Set', backref='workout', lazy='dynamic', order_by='Set.set_number',
+                           cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        # Serves history pagination: WHERE user_id = ? ORDER BY created_at DESC, id DESC
+        db.Index('ix_workout_user_created_id', 'user_id', 'created_at', 'id'),
+        db.Index('ix_workout_deleted_at', 'deleted_at', postgresql_where=db.text('deleted_at IS NOT NULL'),
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
 
-    def to_dict(self):
+    def history_cursor(self):
+        return f"{self.created_at.isoformat()},{self.id}"
+
+    def to_dict(self, sets=None, reps_by_set=None, archived_sets=None):
+        # sets/reps_by_set come preloaded from load_set_trees(); when omitted the
+        # tree is fetched here in two queries instead of one per set. Archived
+        # workouts take their already-serialized sets from archived_workout.
+        if self.archived_at is not None:
+            if archived_sets is None:
+                archived_sets = read_archived_sets([self.id])[self.id]
+            set_dicts = archived_sets
+        else:
+            if sets is None:
+                sets_by_workout, reps_by_set = load_set_trees([self.id])
+                sets = sets_by_workout[self.id]
+            set_dicts = [s.to_dict(reps=reps_by_set.get(s.id) if reps_by_set is not None else None) for s in sets]
         return {
             'id': self.id,
             'name': self.name,
@@ -106,15 +480,15 @@ class Workout(db.Model):
             'notes': self.notes,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'sets': [s.to_dict() for s in self.sets],
-            'total_reps': sum(s.reps_completed for s in self.sets),
-            'set_count': self.sets.count()
+            'sets': set_dicts,
+            'total_reps': sum(s['reps_completed'] or 0 for s in set_dicts),
+            'set_count': len(set_dicts)
         }
 
 
 class Set(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    workout_id = db.Column(db.Integer, db.ForeignKey('workout.id'), nullable=False)
+    workout_id = db.Column(db.Integer, db.ForeignKey('workout.id', ondelete='CASCADE'), nullable=False)
     set_number = db.Column(db.Integer, nullable=False)
     reps_completed = db.Column(db.Integer, default=0)
     avg_depth = db.Column(db.Float, nullable=True)  # Average depth in inches
@@ -124,9 +498,101 @@ class Set(db.Model):
     fatigue_drop = db.Column(db.Float, nullable=True)  # Percentage drop from first rep
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
-    reps = db.relationship('Rep', backref='set', lazy='dynamic', order_by='Rep.rep_number', cascade='all, delete-orphan')
+    # Running aggregates over the set's reps, so rep edits don't reload the set
+    rep_count = db.Column(db.Integer, default=0)
+    depth_sum = db.Column(db.Float, default=0)
+    depth_count = db.Column(db.Integer, default=0)
+    velocity_sum = db.Column(db.Float, default=0)
+    velocity_count = db.Column(db.Integer, default=0)
+    first_velocity = db.Column(db.Float, nullable=True)  # Velocity of rep 1
+    last_velocity = db.Column(db.Float, nullable=True)  # Velocity of the highest-numbered rep
 
-    def to_dict(self):
+    rep_data = db.Column(db.LargeBinary, nullable=True)  # Packed reps (see pack_reps); null when stored as Rep rows
+
+    reps = db.relationship('Rep', backref='set', lazy='dynamic', order_by='Rep.rep_number',
+                           cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        # Set loading per workout and MAX(set_number) allocation; unique so
+        # concurrent adds can't share a number
+        db.Index('ux_set_workout_number', 'workout_id', 'set_number', unique=True),
+    )
+
+    def append_rep(self, rep):
+        """Fold a rep added at the end of the set into the running aggregates"""
+        self.rep_count = (self.rep_count or 0) + 1
+        if rep.depth:
+            self.depth_sum = (self.depth_sum or 0) + rep.depth
+            self.depth_count = (self.depth_count or 0) + 1
+        if rep.velocity:
+            self.velocity_sum = (self.velocity_sum or 0) + rep.velocity
+            self.velocity_count = (self.velocity_count or 0) + 1
+            self.min_velocity = min(self.min_velocity or rep.velocity, rep.velocity)
+            self.max_velocity = max(self.max_velocity or rep.velocity, rep.velocity)
+        if self.rep_count == 1:
+            self.first_velocity = rep.velocity
+        self.last_velocity = rep.velocity
+        self.refresh_averages()
+
+    def remove_rep(self, rep):
+        """Take a deleted rep out of the running aggregates.
+
+        Returns True when min/max or the first/last velocity depended on the rep
+        and must be reloaded with reload_velocity_bounds().
+        """
+        was_last = rep.rep_number == self.rep_count
+        self.rep_count = max(0, (self.rep_count or 0) - 1)
+        if rep.depth:
+            self.depth_sum = (self.depth_sum or 0) - rep.depth
+            self.depth_count = max(0, (self.depth_count or 0) - 1)
+        if rep.velocity:
+            self.velocity_sum = (self.velocity_sum or 0) - rep.velocity
+            self.velocity_count = max(0, (self.velocity_count or 0) - 1)
+        self.refresh_averages()
+        return bool(rep.rep_number == 1 or was_last or
+                    (rep.velocity and rep.velocity in (self.min_velocity, self.max_velocity)))
+
+    def reload_velocity_bounds(self):
+        """Reload min/max and first/last velocity with one aggregate statement"""
+        if self.rep_data is not None:
+            reps = unpack_reps(self.rep_data)
+            velocities = [r.velocity for r in reps if r.velocity]
+            self.min_velocity = min(velocities, default=None)
+            self.max_velocity = max(velocities, default=None)
+            self.first_velocity = reps[0].velocity if reps else None
+            self.last_velocity = reps[-1].velocity if reps else None
+            return
+        velocity_at = lambda number: db.select(Rep.velocity)\
+            .where(Rep.set_id == self.id, Rep.rep_number == number)\
+            .correlate(None).scalar_subquery()
+        self.min_velocity, self.max_velocity, self.first_velocity, self.last_velocity = db.session.execute(
+            db.select(
+                db.func.min(db.case((Rep.velocity != 0, Rep.velocity))),
+                db.func.max(db.case((Rep.velocity != 0, Rep.velocity))),
+                velocity_at(1),
+                velocity_at(self.rep_count)
+            ).where(Rep.set_id == self.id)
+        ).one()
+
+    def refresh_averages(self):
+        self.avg_depth = self.depth_sum / self.depth_count if self.depth_count else None
+        self.avg_velocity = self.velocity_sum / self.velocity_count if self.velocity_count else None
+        if not self.velocity_count:
+            self.min_velocity = None
+            self.max_velocity = None
+
+    def refresh_fatigue_drop(self):
+        first, last = self.first_velocity, self.last_velocity
+        if (self.velocity_count or 0) >= 2 and first and last and first > 0:
+            self.fatigue_drop = round(((first - last) / first) * 100, 1)
+        else:
+            self.fatigue_drop = None
+
+    def to_dict(self, reps=None):
+        if self.rep_data is not None:
+            rep_dicts = packed_rep_dicts(self.rep_data)
+        else:
+            rep_dicts = [r.to_dict() for r in (self.reps if reps is None else reps)]
         return {
             'id': self.id,
             'set_number': self.set_number,
@@ -137,13 +603,13 @@ class Set(db.Model):
             'max_velocity': round(self.max_velocity) if self.max_velocity else None,
             'fatigue_drop': round(self.fatigue_drop, 1) if self.fatigue_drop else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
-            'reps': [r.to_dict() for r in self.reps]
+            'reps': rep_dicts
         }
 
 
 class Rep(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    set_id = db.Column(db.Integer, db.ForeignKey('set.id'), nullable=False)
+    set_id = db.Column(db.Integer, db.ForeignKey('set.id', ondelete='CASCADE'), nullable=False)
     rep_number = db.Column(db.Integer, nullable=False)
     depth = db.Column(db.Float, nullable=True)  # Depth in inches
     time_seconds = db.Column(db.Float, nullable=True)  # Ascent time
@@ -151,6 +617,10 @@ class Rep(db.Model):
     quality = db.Column(db.String(20), nullable=True)  # 'deep', 'parallel', 'half', 'shallow'
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    __table_args__ = (
+        db.Index('ix_rep_set_number', 'set_id', 'rep_number'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -162,26 +632,237 @@ class Rep(db.Model):
         }
 
 
+# ========== Packed Rep Storage ==========
+# A set's reps can be stored as one blob on Set.rep_data instead of Rep rows:
+# a uint32 header with the id the next rep will get, then per rep its id,
+# depth/time_seconds/velocity as little-endian float64 (NaN = missing; the same
+# values a Float row holds) and a one-byte quality code. Reps are always read
+# and written as a whole set, so this drops the per-rep row, index entries and
+# ORM object.
+
+REP_STORAGE = os.getenv('REP_STORAGE', 'rows')  # How new sets store reps: 'rows' or 'packed'
+PACKED_REPS_HEADER = struct.Struct('<I')
+PACKED_REP = struct.Struct('<IdddB')
+REP_QUALITIES = (None, 'deep', 'parallel', 'half', 'shallow')
+REP_QUALITY_CODES = {quality: code for code, quality in enumerate(REP_QUALITIES)}
+
+
+class PackedRep(namedtuple('PackedRep', 'id rep_number depth time_seconds velocity quality')):
+    """A rep decoded from Set.rep_data. Ids are unique within the set and never reused, like row ids."""
+
+    def to_dict(self):
+        return Rep.to_dict(self)
+
+
+def can_pack_reps(reps_data):
+    """Whether every rep's quality has a packed code (unknown strings stay as rows)"""
+    return all(r.get('quality') in REP_QUALITY_CODES for r in reps_data)
+
+
+def pack_reps(reps, next_id=None):
+    """Encode reps (Rep or PackedRep, in rep_number order) into a rep_data blob.
+
+    next_id defaults to one past the highest id; pass the old blob's
+    next_packed_rep_id() when reps were removed so their ids aren't reused.
+    """
+    reps = list(reps)
+    if next_id is None:
+        next_id = max((r.id for r in reps), default=0) + 1
+    nan = float('nan')
+    return PACKED_REPS_HEADER.pack(next_id) + b''.join(PACKED_REP.pack(
+        r.id,
+        nan if r.depth is None else r.depth,
+        nan if r.time_seconds is None else r.time_seconds,
+        nan if r.velocity is None else r.velocity,
+        REP_QUALITY_CODES[r.quality]
+    ) for r in reps)
+
+
+def next_packed_rep_id(rep_data):
+    return PACKED_REPS_HEADER.unpack_from(rep_data)[0]
+
+
+def iter_packed_reps(rep_data):
+    return PACKED_REP.iter_unpack(memoryview(rep_data)[PACKED_REPS_HEADER.size:])
+
+
+def unpack_reps(rep_data):
+    """Decode a rep_data blob into PackedReps numbered from 1"""
+    return [PackedRep(rep_id, number,
+                      None if math.isnan(depth) else depth,
+                      None if math.isnan(time_seconds) else time_seconds,
+                      None if math.isnan(velocity) else velocity,
+                      REP_QUALITIES[code])
+            for number, (rep_id, depth, time_seconds, velocity, code) in enumerate(iter_packed_reps(rep_data), 1)]
+
+
+def packed_rep_dicts(rep_data):
+    """Decode a rep_data blob straight into the dicts Rep.to_dict() returns"""
+    # NaN != NaN, so `x == x and x` is falsy for missing values just like None/0 are
+    return [{
+        'id': rep_id,
+        'rep_number': number,
+        'depth': round(depth, 1) if depth == depth and depth else None,
+        'time_seconds': round(time_seconds, 2) if time_seconds == time_seconds and time_seconds else None,
+        'velocity': round(velocity) if velocity == velocity and velocity else None,
+        'quality': REP_QUALITIES[code]
+    } for number, (rep_id, depth, time_seconds, velocity, code) in enumerate(iter_packed_reps(rep_data), 1)]
+
+
+def load_set_trees(workout_ids):
+    """Fetch all sets and reps for the given workouts in two queries.
+
+    Returns (sets_by_workout, reps_by_set), both ordered the same way as the
+    dynamic relationships (set_number, rep_number).
+    """
+    sets_by_workout = {workout_id: [] for workout_id in workout_ids}
+    reps_by_set = {}
+    if not workout_ids:
+        return sets_by_workout, reps_by_set
+
+    sets = Set.query.filter(Set.workout_id.in_(workout_ids))\
+        .order_by(Set.workout_id, Set.set_number).all()
+    for s in sets:
+        sets_by_workout[s.workout_id].append(s)
+
+    row_sets = [s for s in sets if s.rep_data is None]
+    return sets_by_workout, load_reps([s.id for s in row_sets], since=rep_partition_floor(row_sets))
+
+
+def rep_partition_floor(sets):
+    """Oldest created_at of the sets when the rep table is partitioned, else None.
+
+    A rep is never older than its set, so bounding rep loads by this lets
+    Postgres skip every monthly partition before it.
+    """
+    if DB_PARTITIONING != 'monthly' or not sets or any(s.created_at is None for s in sets):
+        return None
+    return min(s.created_at for s in sets)
+
+
+def load_reps(set_ids, since=None):
+    """Fetch the reps of many sets in one query, keyed by set id in rep_number order"""
+    reps_by_set = {set_id: [] for set_id in set_ids}
+    if reps_by_set:
+        query = Rep.query.filter(Rep.set_id.in_(list(reps_by_set)))
+        if since is not None:
+            query = query.filter(Rep.created_at >= since)
+        reps = query.order_by(Rep.set_id, Rep.rep_number).all()
+        for r in reps:
+            reps_by_set[r.set_id].append(r)
+    return reps_by_set
+
+
+def rep_aggregates(reps_data):
+    """Summary and running-aggregate Set columns for a list of rep dicts"""
+    velocities = [r.get('velocity') for r in reps_data if r.get('velocity')]
+    depths = [r.get('depth') for r in reps_data if r.get('depth')]
+    return {
+        'avg_depth': sum(depths) / len(depths) if depths else None,
+        'avg_velocity': sum(velocities) / len(velocities) if velocities else None,
+        'min_velocity': min(velocities) if velocities else None,
+        'max_velocity': max(velocities) if velocities else None,
+        'rep_count': len(reps_data),
+        'depth_sum': sum(depths),
+        'depth_count': len(depths),
+        'velocity_sum': sum(velocities),
+        'velocity_count': len(velocities),
+        'first_velocity': reps_data[0].get('velocity') if reps_data else None,
+        'last_velocity': reps_data[-1].get('velocity') if reps_data else None
+    }
+
+
+def insert_set_with_reps(workout_id, reps_data, values):
+    """Insert a set and all of its reps with two statements and no read-back.
+
+    The set number is allocated inside the INSERT (MAX(set_number) + 1 as a
+    scalar subquery) and the reps go in as one batched multi-row INSERT, or
+    packed into the set row itself when REP_STORAGE is 'packed'. Returns
+    detached (set, reps) objects built from the written values, ready for to_dict.
+
+    Under READ COMMITTED two concurrent inserts can read the same MAX, so the
+    caller holds the workout's row lock (SELECT ... FOR UPDATE) first; the
+    unique (workout_id, set_number) index turns a missing lock into an error
+    rather than a duplicate number.
+    """
+    now = datetime.utcnow()
+    if REP_STORAGE == 'packed' and can_pack_reps(reps_data):
+        values = dict(values, rep_data=pack_reps(
+            PackedRep(i + 1, i + 1, r.get('depth'), r.get('time_seconds'), r.get('velocity'), r.get('quality'))
+            for i, r in enumerate(reps_data)
+        ))
+        reps_data = []
+    next_set_number = db.select(db.func.coalesce(db.func.max(Set.set_number), 0) + 1)\
+        .where(Set.workout_id == workout_id).scalar_subquery()
+
+    set_id, set_number = db.session.execute(
+        db.insert(Set)
+        .values(workout_id=workout_id, set_number=next_set_number, created_at=now, **values)
+        .returning(Set.id, Set.set_number)
+    ).one()
+    new_set = Set(id=set_id, workout_id=workout_id, set_number=set_number, created_at=now, **values)
+
+    rep_rows = [{
+        'set_id': set_id,
+        'rep_number': i + 1,
+        'depth': rep_data.get('depth'),
+        'time_seconds': rep_data.get('time_seconds'),
+        'velocity': rep_data.get('velocity'),
+        'quality': rep_data.get('quality'),
+        'created_at': now
+    } for i, rep_data in enumerate(reps_data)]
+
+    reps = []
+    if rep_rows:
+        # RETURNING rows aren't guaranteed to follow parameter order, so match on rep_number
+        rep_ids = dict((rep_number, rep_id) for rep_id, rep_number in db.session.execute(
+            db.insert(Rep).returning(Rep.id, Rep.rep_number), rep_rows
+        ))
+        reps = [Rep(id=rep_ids[row['rep_number']], **row) for row in rep_rows]
+
+    return new_set, reps
+
+
+def serialize_workouts(workouts):
+    """Serialize a list of workouts with their sets and reps in a fixed number of queries"""
+    sets_by_workout, reps_by_set = load_set_trees([w.id for w in workouts if w.archived_at is None])
+    archived_sets = read_archived_sets([w.id for w in workouts if w.archived_at is not None])
+    return [w.to_dict(sets=sets_by_workout.get(w.id), reps_by_set=reps_by_set, archived_sets=archived_sets.get(w.id))
+            for w in workouts]
+
+
 # ========== Program Models ==========
 
 class Program(db.Model):
     """A training program created by a coach for an athlete, or by a user for themselves"""
     id = db.Column(db.Integer, primary_key=True)
-    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Null if self-created
-    athlete_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)  # Null if self-created
+    athlete_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     start_date = db.Column(db.DateTime, nullable=True)
     end_date = db.Column(db.DateTime, nullable=True)
     is_active = db.Column(db.Boolean, default=True)
+    deleted_at = db.Column(db.DateTime, nullable=True)  # Soft-deleted; purged in the background
+    revision = db.Column(db.Integer, default=0, nullable=False)  # Bumped by writes to days/exercises; part of the ETag
 
     # Relationships
     coach = db.relationship('User', foreign_keys=[coach_id], backref='programs_created')
     athlete = db.relationship('User', foreign_keys=[athlete_id], backref='programs_assigned')
-    days = db.relationship('ProgramDay', backref='program', lazy='dynamic', order_by='ProgramDay.day_number', cascade='all, delete-orphan')
+    days = db.relationship('ProgramDay', backref='program', lazy='dynamic', order_by='ProgramDay.day_number',
+                           cascade='all, delete-orphan', passive_deletes=True)
+
+    __table_args__ = (
+        db.Index('ix_program_athlete_created', 'athlete_id', 'created_at'),
+        db.Index('ix_program_coach_created', 'coach_id', 'created_at'),
+        db.Index('ix_program_deleted_at', 'deleted_at', postgresql_where=db.text('deleted_at IS NOT NULL'),
+                 sqlite_where=db.text('deleted_at IS NOT NULL')),
+    )
 
-    def to_dict(self, include_days=True):
+    def to_dict(self, include_days=True, include_logs=False, tree=None):
+        # tree comes from load_program_trees(); when omitted it is loaded here
+        # in a fixed number of queries instead of one per day and exercise
         result = {
             'id': self.id,
             'coach_id': self.coach_id,
@@ -194,21 +875,29 @@ class Program(db.Model):
             'is_active': self.is_active
         }
         if include_days:
-            result['days'] = [d.to_dict() for d in self.days]
+            if tree is None:
+                tree = load_program_trees([self.id], include_logs=include_logs)
+            result['days'] = [d.to_dict(exercises=tree.exercises_by_day[d.id], logs_by_exercise=tree.logs_by_exercise)
+                              for d in tree.days_by_program[self.id]]
         return result
 
 
 class ProgramDay(db.Model):
     """A single day/session within a program"""
     id = db.Column(db.Integer, primary_key=True)
-    program_id = db.Column(db.Integer, db.ForeignKey('program.id'), nullable=False)
+    program_id = db.Column(db.Integer, db.ForeignKey('program.id', ondelete='CASCADE'), nullable=False)
     day_number = db.Column(db.Integer, nullable=False)  # 1, 2, 3, etc.
     name = db.Column(db.String(100), nullable=True)  # e.g., "Lower Body", "Upper Body"
     notes = db.Column(db.Text, nullable=True)
 
-    exercises = db.relationship('ProgramExercise', backref='day', lazy='dynamic', order_by='ProgramExercise.order', cascade='all, delete-orphan')
+    exercises = db.relationship('ProgramExercise', backref='day', lazy='dynamic', order_by='ProgramExercise.order',
+                                cascade='all, delete-orphan', passive_deletes=True)
 
-    def to_dict(self, include_exercises=True):
+    __table_args__ = (
+        db.Index('ix_program_day_program_number', 'program_id', 'day_number'),
+    )
+
+    def to_dict(self, include_exercises=True, exercises=None, logs_by_exercise=None):
         result = {
             'id': self.id,
             'program_id': self.program_id,
@@ -217,14 +906,17 @@ class ProgramDay(db.Model):
             'notes': self.notes
         }
         if include_exercises:
-            result['exercises'] = [e.to_dict() for e in self.exercises]
+            if exercises is None:
+                exercises = self.exercises
+            result['exercises'] = [e.to_dict(logs=logs_by_exercise.get(e.id) if logs_by_exercise is not None else None)
+                                   for e in exercises]
         return result
 
 
 class ProgramExercise(db.Model):
     """An exercise within a program day"""
     id = db.Column(db.Integer, primary_key=True)
-    program_day_id = db.Column(db.Integer, db.ForeignKey('program_day.id'), nullable=False)
+    program_day_id = db.Column(db.Integer, db.ForeignKey('program_day.id', ondelete='CASCADE'), nullable=False)
     name = db.Column(db.String(100), nullable=False)
     video_url = db.Column(db.String(500), nullable=True)  # Only coaches can set this
     sets_prescribed = db.Column(db.Integer, default=3)
@@ -234,9 +926,15 @@ class ProgramExercise(db.Model):
     order = db.Column(db.Integer, default=0)
     exercise_type = db.Column(db.String(50), default='standard')  # 'standard', 'squat_velocity'
 
-    set_logs = db.relationship('ProgramSetLog', backref='exercise', lazy='dynamic', cascade='all, delete-orphan')
+    set_logs = db.relationship('ProgramSetLog', backref='exercise', lazy='dynamic',
+                               cascade='all, delete-orphan', passive_deletes=True)
 
-    def to_dict(self, include_logs=False):
+    __table_args__ = (
+        db.Index('ix_program_exercise_day_order', 'program_day_id', 'order'),
+    )
+
+    def to_dict(self, include_logs=False, logs=None):
+        # logs are already-serialized set log dicts (see serialize_set_logs)
         result = {
             'id': self.id,
             'program_day_id': self.program_day_id,
@@ -249,16 +947,18 @@ class ProgramExercise(db.Model):
             'order': self.order,
             'exercise_type': self.exercise_type
         }
-        if include_logs:
-            result['set_logs'] = [l.to_dict() for l in self.set_logs.order_by(ProgramSetLog.created_at.desc()).limit(20)]
+        if logs is None and include_logs:
+            logs = serialize_set_logs(self.set_logs.order_by(ProgramSetLog.created_at.desc()).limit(PROGRAM_LOG_LIMIT).all())
+        if logs is not None:
+            result['set_logs'] = logs
         return result
 
 
 class ProgramSetLog(db.Model):
     """Logged performance for a set in a program exercise"""
     id = db.Column(db.Integer, primary_key=True)
-    program_exercise_id = db.Column(db.Integer, db.ForeignKey('program_exercise.id'), nullable=False)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    program_exercise_id = db.Column(db.Integer, db.ForeignKey('program_exercise.id', ondelete='CASCADE'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     set_number = db.Column(db.Integer, nullable=False)
     reps_completed = db.Column(db.Integer, nullable=True)
     weight = db.Column(db.Float, nullable=True)  # Weight in lbs
@@ -268,16 +968,26 @@ class ProgramSetLog(db.Model):
 
     # Velocity tracking link
     velocity_tracked = db.Column(db.Boolean, default=False)
-    workout_set_id = db.Column(db.Integer, db.ForeignKey('set.id'), nullable=True)
+    workout_set_id = db.Column(db.Integer, db.ForeignKey('set.id', ondelete='SET NULL'), nullable=True)
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     user = db.relationship('User', backref='program_logs')
-    workout_set = db.relationship('Set', backref='program_log')
+    workout_set = db.relationship('Set', backref=db.backref('program_log', passive_deletes=True))
+
+    __table_args__ = (
+        # Athlete views: per-user logs of an exercise, newest first
+        db.Index('ix_program_set_log_user_exercise_created', 'user_id', 'program_exercise_id', 'created_at'),
+        # Coach views: every log of an exercise, newest first
+        db.Index('ix_program_set_log_exercise_created', 'program_exercise_id', 'created_at'),
+        db.Index('ix_program_set_log_workout_set', 'workout_set_id'),
+    )
 
-    def to_dict(self):
+    def to_dict(self, sets_by_id=None, reps_by_set=None):
+        # sets_by_id/reps_by_set come from serialize_set_logs(); when omitted the
+        # linked set and its reps are lazy-loaded
         result = {
             'id': self.id,
             'program_exercise_id': self.program_exercise_id,
@@ -294,26 +1004,98 @@ class ProgramSetLog(db.Model):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None
         }
         # Include velocity data if tracked
-        if self.velocity_tracked and self.workout_set:
-            result['velocity_data'] = self.workout_set.to_dict()
+        if self.velocity_tracked and self.workout_set_id:
+            if sets_by_id is None:
+                workout_set, reps = self.workout_set, None
+            else:
+                workout_set = sets_by_id.get(self.workout_set_id)
+                reps = reps_by_set.get(self.workout_set_id, [])
+            if workout_set:
+                result['velocity_data'] = workout_set.to_dict(reps=reps)
         return result
 
 
+PROGRAM_LOG_LIMIT = 20  # Latest logs shown per exercise in a program tree
+
+
+def serialize_set_logs(logs):
+    """Serialize set logs, loading all linked velocity sets and their reps in two queries"""
+    set_ids = {log.workout_set_id for log in logs if log.velocity_tracked and log.workout_set_id}
+    sets_by_id = {}
+    if set_ids:
+        sets_by_id = {s.id: s for s in Set.query.filter(Set.id.in_(set_ids)).all()}
+    row_sets = [s for s in sets_by_id.values() if s.rep_data is None]
+    reps_by_set = load_reps([s.id for s in row_sets], since=rep_partition_floor(row_sets))
+    return [log.to_dict(sets_by_id=sets_by_id, reps_by_set=reps_by_set) for log in logs]
+
+ProgramTree = namedtuple('ProgramTree', ['days_by_program', 'exercises_by_day', 'logs_by_exercise'])
+
+
+def load_program_trees(program_ids, include_logs=False, log_limit=PROGRAM_LOG_LIMIT):
+    """Fetch days, exercises and optionally the latest logs per exercise for programs.
+
+    Uses one query per level (three with logs) regardless of program size; the
+    latest-N logs come from a ROW_NUMBER() window partitioned by exercise.
+    logs_by_exercise holds serialized log dicts, or is None when include_logs is False.
+    """
+    days_by_program = {program_id: [] for program_id in program_ids}
+    exercises_by_day = {}
+    logs_by_exercise = {} if include_logs else None
+    if not program_ids:
+        return ProgramTree(days_by_program, exercises_by_day, logs_by_exercise)
+
+    days = ProgramDay.query.filter(ProgramDay.program_id.in_(program_ids))\
+        .order_by(ProgramDay.program_id, ProgramDay.day_number).all()
+    for day in days:
+        days_by_program[day.program_id].append(day)
+        exercises_by_day[day.id] = []
+
+    exercises = []
+    if exercises_by_day:
+        exercises = ProgramExercise.query.filter(ProgramExercise.program_day_id.in_(list(exercises_by_day)))\
+            .order_by(ProgramExercise.program_day_id, ProgramExercise.order).all()
+        for exercise in exercises:
+            exercises_by_day[exercise.program_day_id].append(exercise)
+
+    if include_logs and exercises:
+        exercise_ids = [exercise.id for exercise in exercises]
+        logs_by_exercise.update((exercise_id, []) for exercise_id in exercise_ids)
+        ranked = db.session.query(
+            ProgramSetLog.id.label('id'),
+            db.func.row_number().over(
+                partition_by=ProgramSetLog.program_exercise_id,
+                order_by=(ProgramSetLog.created_at.desc(), ProgramSetLog.id.desc())
+            ).label('position')
+        ).filter(ProgramSetLog.program_exercise_id.in_(exercise_ids)).subquery()
+        logs = ProgramSetLog.query.join(ranked, ranked.c.id == ProgramSetLog.id)\
+            .filter(ranked.c.position <= log_limit)\
+            .order_by(ProgramSetLog.program_exercise_id, ranked.c.position).all()
+        for log, log_dict in zip(logs, serialize_set_logs(logs)):
+            logs_by_exercise[log.program_exercise_id].append(log_dict)
+
+    return ProgramTree(days_by_program, exercises_by_day, logs_by_exercise)
+
+
 class CoachInvite(db.Model):
     """Invitation from a coach to an athlete"""
     id = db.Column(db.Integer, primary_key=True)
-    coach_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    coach_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), nullable=False)
     email = db.Column(db.String(120), nullable=False)  # Email to invite
     token = db.Column(db.String(64), unique=True, nullable=False)  # Unique invite token
     status = db.Column(db.String(20), default='pending')  # pending, accepted, expired
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     accepted_at = db.Column(db.DateTime, nullable=True)
-    athlete_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # Set when accepted
+    athlete_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='SET NULL'), nullable=True)  # Set when accepted
 
     # Relationships
     coach = db.relationship('User', foreign_keys=[coach_id], backref='invites_sent')
     athlete = db.relationship('User', foreign_keys=[athlete_id], backref='invite_accepted')
 
+    __table_args__ = (
+        db.Index('ix_coach_invite_coach_email_status', 'coach_id', 'email', 'status'),
+        db.Index('ix_coach_invite_coach_created', 'coach_id', 'created_at'),
+    )
+
     def to_dict(self):
         return {
             'id': self.id,
@@ -325,13 +1107,1768 @@ class CoachInvite(db.Model):
         }
 
 
-# Create tables
-with app.app_context():
-    db.create_all()
+# ========== Stats Rollups ==========
+
+RECENT_VELOCITY_WINDOW = 10  # Sets kept in the rolling velocity window
+
+
+class UserStats(db.Model):
+    """Per-user workout totals, maintained incrementally by the write routes"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id', ondelete='CASCADE'), primary_key=True)
+    total_workouts = db.Column(db.Integer, default=0, nullable=False)
+    total_sets = db.Column(db.Integer, default=0, nullable=False)
+    total_reps = db.Column(db.Integer, default=0, nullable=False)
+    # JSON list of [set_id, avg_velocity] for the most recent sets, newest first
+    recent_sets = db.Column(db.Text, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def get_recent_sets(self):
+        if self.recent_sets:
+            try:
+                return json.loads(self.recent_sets)
+            except ValueError:
+                return []
+        return []
+
+    def set_recent_sets(self, recent):
+        self.recent_sets = json.dumps(recent[:RECENT_VELOCITY_WINDOW])
+
+    def avg_recent_velocity(self, limit=RECENT_VELOCITY_WINDOW):
+        velocities = [v for _, v in self.get_recent_sets()[:limit] if v]
+        return sum(velocities) / len(velocities) if velocities else None
+
+    def record(self, workouts=0, sets=0, reps=0):
+        """Apply deltas as SQL increments so concurrent writers don't lose updates"""
+        if workouts:
+            self.total_workouts = UserStats.total_workouts + workouts
+        if sets:
+            self.total_sets = UserStats.total_sets + sets
+        if reps:
+            self.total_reps = UserStats.total_reps + reps
+
+    def push_recent_set(self, workout_set):
+        self.set_recent_sets([[workout_set.id, workout_set.avg_velocity]] + self.get_recent_sets())
+
+    def update_recent_set(self, workout_set):
+        recent = self.get_recent_sets()
+        for entry in recent:
+            if entry[0] == workout_set.id:
+                entry[1] = workout_set.avg_velocity
+                self.set_recent_sets(recent)
+                return
+
+    def has_recent_set(self, set_id):
+        return any(entry[0] == set_id for entry in self.get_recent_sets())
+
+    def refresh_recent_sets(self):
+        """Reload the window from the database (after a set inside it was deleted)"""
+        rows = db.session.query(Set.id, Set.avg_velocity).join(Workout)\
+            .filter(Workout.user_id == self.user_id)\
+            .order_by(Set.created_at.desc(), Set.id.desc())\
+            .limit(RECENT_VELOCITY_WINDOW).all()
+        self.set_recent_sets([[set_id, velocity] for set_id, velocity in rows])
+
+    def to_dict(self):
+        avg_velocity = self.avg_recent_velocity()
+        return {
+            'total_workouts': self.total_workouts,
+            'total_sets': self.total_sets,
+            'total_reps': self.total_reps,
+            'avg_velocity': round(avg_velocity) if avg_velocity else None
+        }
+
+
+def compute_user_stats(user_ids):
+    """Recompute rollup values for many users with three grouped queries"""
+    results = {user_id: {'total_workouts': 0, 'total_sets': 0, 'total_reps': 0, 'recent_sets': []}
+               for user_id in user_ids}
+    if not user_ids:
+        return results
+
+    workout_counts = db.session.query(
+        Workout.user_id,
+        db.func.count(Workout.id),
+        db.func.coalesce(db.func.sum(Workout.archived_set_count), 0),
+        db.func.coalesce(db.func.sum(Workout.archived_rep_count), 0)
+    ).filter(Workout.user_id.in_(user_ids))\
+        .group_by(Workout.user_id).all()
+    for user_id, total_workouts, archived_sets, archived_reps in workout_counts:
+        results[user_id]['total_workouts'] = total_workouts
+        results[user_id]['total_sets'] = int(archived_sets)
+        results[user_id]['total_reps'] = int(archived_reps)
+
+    set_totals = db.session.query(
+        Workout.user_id,
+        db.func.count(Set.id),
+        db.func.coalesce(db.func.sum(Set.reps_completed), 0)
+    ).join(Set, Set.workout_id == Workout.id)\
+        .filter(Workout.user_id.in_(user_ids))\
+        .group_by(Workout.user_id).all()
+    for user_id, total_sets, total_reps in set_totals:
+        results[user_id]['total_sets'] += total_sets
+        results[user_id]['total_reps'] += int(total_reps)
+
+    ranked_sets = db.session.query(
+        Workout.user_id.label('user_id'),
+        Set.id.label('set_id'),
+        Set.avg_velocity.label('avg_velocity'),
+        db.func.row_number().over(
+            partition_by=Workout.user_id,
+            order_by=(Set.created_at.desc(), Set.id.desc())
+        ).label('position')
+    ).join(Set, Set.workout_id == Workout.id)\
+        .filter(Workout.user_id.in_(user_ids)).subquery()
+    recent = db.session.query(ranked_sets.c.user_id, ranked_sets.c.set_id, ranked_sets.c.avg_velocity)\
+        .filter(ranked_sets.c.position <= RECENT_VELOCITY_WINDOW)\
+        .order_by(ranked_sets.c.user_id, ranked_sets.c.position).all()
+    for user_id, set_id, avg_velocity in recent:
+        results[user_id]['recent_sets'].append([set_id, avg_velocity])
+
+    return results
+
+
+def rebuild_user_stats(user_ids):
+    """Overwrite (or create) the rollup rows for the given users. Caller commits."""
+    rows = {s.user_id: s for s in UserStats.query.filter(UserStats.user_id.in_(user_ids)).all()}
+    for user_id, values in compute_user_stats(list(user_ids)).items():
+        stats = rows.get(user_id)
+        if stats is None:
+            stats = rows[user_id] = UserStats(user_id=user_id)
+            db.session.add(stats)
+        stats.total_workouts = values['total_workouts']
+        stats.total_sets = values['total_sets']
+        stats.total_reps = values['total_reps']
+        stats.set_recent_sets(values['recent_sets'])
+    return rows
+
+
+def user_stats_for(user_id):
+    """Get a user's rollup row, building it on first access.
+
+    Call this before mutating the user's workouts so a freshly built row
+    reflects the state the subsequent record() deltas apply to.
+    """
+    stats = db.session.get(UserStats, user_id)
+    if stats is None:
+        stats = rebuild_user_stats([user_id])[user_id]
+        db.session.flush()  # record() emits UPDATE increments, so the row must exist
+    return stats
+
+
+def rebuild_stats_in_batches(user_ids=None, batch_size=500):
+    """Rebuild the given users' rollups (everyone's by default), committing per batch"""
+    if not user_ids:
+        user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), batch_size):
+        rebuild_user_stats(user_ids[start:start + batch_size])
+        db.session.commit()
+    return len(user_ids)
+
+
+@app.cli.group('stats')
+def stats_cli():
+    """Maintain the per-user stats rollups"""
+
+
+@stats_cli.command('rebuild')
+@click.option('--user-id', 'user_ids', type=int, multiple=True, help='Only rebuild these users')
+@click.option('--batch-size', default=500, show_default=True)
+def rebuild_stats_command(user_ids, batch_size):
+    """Recompute user_stats rows in bulk from the workout tables"""
+    rebuilt = rebuild_stats_in_batches(user_ids, batch_size)
+    print(f"✅ Rebuilt stats for {rebuilt} users")
+
+
+@app.cli.group('reps')
+def reps_cli():
+    """Convert sets between Rep rows and packed rep storage"""
+
+
+@reps_cli.command('pack')
+@click.option('--batch-size', default=500, show_default=True)
+def pack_reps_command(batch_size):
+    """Move existing Rep rows into packed Set.rep_data blobs"""
+    packed = skipped = 0
+    last_id = 0
+    while True:
+        set_ids = db.session.scalars(
+            db.select(Set.id).where(Set.rep_data.is_(None), Set.id > last_id).order_by(Set.id).limit(batch_size)
+        ).all()
+        if not set_ids:
+            break
+        last_id = set_ids[-1]
+        rows = [{'id': set_id, 'rep_data': pack_reps(reps)}
+                for set_id, reps in load_reps(set_ids).items()
+                if all(r.quality in REP_QUALITY_CODES for r in reps)]
+        skipped += len(set_ids) - len(rows)
+        if rows:
+            db.session.execute(db.update(Set), rows)
+            db.session.execute(db.delete(Rep).where(Rep.set_id.in_([row['id'] for row in rows])))
+        db.session.commit()
+        packed += len(rows)
+    print(f"✅ Packed reps for {packed} sets ({skipped} left as rows for unknown rep quality)")
+
+
+@reps_cli.command('unpack')
+@click.option('--batch-size', default=500, show_default=True)
+def unpack_reps_command(batch_size):
+    """Move packed Set.rep_data blobs back into Rep rows"""
+    unpacked = 0
+    while True:
+        sets = Set.query.filter(Set.rep_data.isnot(None)).order_by(Set.id).limit(batch_size).all()
+        if not sets:
+            break
+        # The rows get new ids; packed ids are only unique within their set
+        rep_rows = [dict(zip(PackedRep._fields[1:], r[1:]), set_id=s.id, created_at=s.created_at)
+                    for s in sets for r in unpack_reps(s.rep_data)]
+        if rep_rows:
+            db.session.execute(db.insert(Rep), rep_rows)
+        db.session.execute(db.update(Set), [{'id': s.id, 'rep_data': None} for s in sets])
+        db.session.commit()
+        unpacked += len(sets)
+    print(f"✅ Unpacked reps for {unpacked} sets")
+
+
+# ========== Postgres Partitioning ==========
+# Optional monthly range partitioning of the append-only tables on created_at.
+# Postgres requires the partition key in the primary key, so the tables get a
+# (id, created_at) key; the ORM keeps mapping id as the key. A plain id foreign
+# key can't reference a partitioned table, so only leaf tables are partitioned:
+# set stays whole, and rep's and program_set_log's foreign keys to it (with
+# their ON DELETE actions) are recreated after the rebuild.
+
+PARTITIONED_TABLES = ('rep', 'program_set_log')  # Nothing references these
+# Value for legacy NULL created_at rows, which a partition key can't hold. Reps
+# get "now" so they are never older than their set (see rep_partition_floor).
+PARTITION_NULL_CREATED_AT = {
+    'rep': "timezone('utc', now())",
+    'program_set_log': "TIMESTAMP '1970-01-01'",
+}
+
+
+def add_months(month, count):
+    """First day of the month `count` months after `month`"""
+    years, month_index = divmod(month.month - 1 + count, 12)
+    return datetime(month.year + years, month_index + 1, 1)
+
+
+def month_partition_name(table, month):
+    return f'{table}_p{month:%Y_%m}'
+
+
+def create_month_partitions(conn, table, first_month, last_month):
+    """Create the monthly partitions of a table from first_month to last_month inclusive"""
+    quote = conn.dialect.identifier_preparer.quote
+    month = datetime(first_month.year, first_month.month, 1)
+    created = []
+    while month <= last_month:
+        name = month_partition_name(table, month)
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {quote(name)} PARTITION OF {quote(table)} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{add_months(month, 1):%Y-%m-%d}')"
+        )
+        created.append(name)
+        month = add_months(month, 1)
+    return created
+
+
+def is_partitioned(conn, table):
+    return conn.exec_driver_sql(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%(name)s)",
+        {'name': conn.dialect.identifier_preparer.quote(table)}
+    ).first() is not None
+
+
+def not_a_partition(obj, name, type_, reflected, compare_to):
+    """Autogenerate filter: monthly partitions and their indexes aren't in the models but belong there,
+    and the partition key is NOT NULL where the models allow legacy NULLs"""
+    if type_ == 'column' and name == 'created_at' and obj.table.name in PARTITIONED_TABLES:
+        return False
+    table = obj if type_ == 'table' else getattr(obj, 'table', None)
+    if reflected and table is not None and compare_to is None:
+        return not any(table.name.startswith(f'{parent}_p') for parent in PARTITIONED_TABLES)
+    return True
+
+
+def partition_table(conn, table, months_ahead):
+    """Rebuild one table as a monthly range-partitioned table, copying its rows"""
+    quote = conn.dialect.identifier_preparer.quote
+    name, legacy = quote(table), quote(f'{table}_unpartitioned')
+    model_table = db.metadata.tables[table]
+    conn.exec_driver_sql('SET LOCAL statement_timeout = 0')  # the copy outlasts the request timeout
+
+    referencing = conn.exec_driver_sql(
+        "SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%(name)s)", {'name': name}
+    ).scalars().all()
+    if referencing:
+        # Refuse rather than drop them: partitioning must not cost referential integrity
+        raise click.ClickException(f"{table} is referenced by {', '.join(referencing)} and can't be partitioned")
+
+    sequence = conn.exec_driver_sql("SELECT pg_get_serial_sequence(%(name)s, 'id')", {'name': name}).scalar()
+    conn.exec_driver_sql(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+    conn.exec_driver_sql(f'ALTER TABLE {name} RENAME TO {legacy}')
+    conn.exec_driver_sql(
+        f'UPDATE {legacy} SET created_at = {PARTITION_NULL_CREATED_AT[table]} WHERE created_at IS NULL'
+    )
+
+    conn.exec_driver_sql(f'CREATE TABLE {name} (LIKE {legacy} INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)')
+    conn.exec_driver_sql(f'ALTER TABLE {name} ALTER COLUMN created_at SET NOT NULL')
+    oldest = conn.exec_driver_sql(f'SELECT min(created_at) FROM {legacy} WHERE created_at > %(epoch)s',
+                                  {'epoch': datetime(1970, 1, 1)}).scalar()
+    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    create_month_partitions(conn, table, oldest or current_month, add_months(current_month, months_ahead))
+    conn.exec_driver_sql(f'CREATE TABLE {quote(table + "_pdefault")} PARTITION OF {name} DEFAULT')
+
+    conn.exec_driver_sql(f'INSERT INTO {name} SELECT * FROM {legacy}')
+    conn.exec_driver_sql(f'DROP TABLE {legacy}')
+    conn.exec_driver_sql(f'ALTER SEQUENCE {sequence} OWNED BY {name}.id')
+
+    # Keys and indexes go on after the copy, once the legacy names are free
+    conn.exec_driver_sql(f'ALTER TABLE {name} ADD PRIMARY KEY (id, created_at)')
+    for index in model_table.indexes:
+        index.create(conn)
+    for constraint in model_table.foreign_key_constraints:
+        conn.execute(AddConstraint(constraint))
+
+
+def require_postgres():
+    if db.engine.dialect.name != 'postgresql':
+        raise click.ClickException('Partitioning needs Postgres; SQLite keeps the plain tables')
+
+
+@app.cli.group('partitions')
+def partitions_cli():
+    """Manage monthly partitions of rep and program_set_log (Postgres only)"""
+
+
+@partitions_cli.command('enable')
+@click.option('--months-ahead', default=3, show_default=True, help='Future monthly partitions to create')
+def enable_partitions_command(months_ahead):
+    """Convert the tables to monthly range partitions on created_at.
+
+    Each table is rebuilt and its rows copied inside one transaction, holding an
+    exclusive lock, so run it in a maintenance window. Set DB_PARTITIONING=monthly
+    afterwards.
+    """
+    require_postgres()
+    for table in PARTITIONED_TABLES:
+        with db.engine.begin() as conn:
+            if is_partitioned(conn, table):
+                print(f"✅ {table} is already partitioned")
+                continue
+            partition_table(conn, table, months_ahead)
+        print(f"✅ Partitioned {table} by month")
+
+
+@partitions_cli.command('maintain')
+@click.option('--months-ahead', default=3, show_default=True, help='Future monthly partitions to keep ready')
+@click.option('--retain-months', type=int, default=None,
+              help='Detach partitions older than this many months (default: keep all)')
+def maintain_partitions_command(months_ahead, retain_months):
+    """Create upcoming monthly partitions and detach old ones.
+
+    Detached partitions stay behind as standalone tables to archive or drop.
+    """
+    require_postgres()
+    current_month = datetime.utcnow().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    for table in PARTITIONED_TABLES:
+        with db.engine.begin() as conn:
+            if not is_partitioned(conn, table):
+                raise click.ClickException(f'{table} is not partitioned; run `flask partitions enable` first')
+            created = create_month_partitions(conn, table, current_month, add_months(current_month, months_ahead))
+            print(f"✅ {table}: partitions ready through {created[-1]}")
+            if retain_months is None:
+                continue
+            quote = conn.dialect.identifier_preparer.quote
+            cutoff = month_partition_name(table, add_months(current_month, -retain_months))
+            attached = conn.exec_driver_sql(
+                "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                "WHERE i.inhparent = to_regclass(%(name)s) ORDER BY c.relname",
+                {'name': quote(table)}
+            ).scalars().all()
+            # Month partition names sort chronologically; the default partition is kept
+            for partition in attached:
+                if partition != f'{table}_pdefault' and partition < cutoff:
+                    conn.exec_driver_sql(f'ALTER TABLE {quote(table)} DETACH PARTITION {quote(partition)}')
+                    print(f"✅ Detached {partition}")
+
+
+# ========== Cold Storage Archive ==========
+# Workouts older than ARCHIVE_AFTER_DAYS can move their sets and reps out of
+# the hot set/rep tables into archived_workout: one row per workout holding its
+# serialized sets as gzip-compressed JSON. The Workout row stays as the summary
+# (archived_at and the set/rep counts), so history pagination and the stats
+# rollup don't change, and reads fetch just the page's archived rows and splice
+# their sets back in.
+
+ARCHIVE_AFTER_DAYS = int(os.getenv('ARCHIVE_AFTER_DAYS', 365))
+
+
+class ArchivedWorkout(db.Model):
+    """The serialized sets of one archived workout"""
+    workout_id = db.Column(db.Integer, db.ForeignKey('workout.id', ondelete='CASCADE'), primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)  # gzip-compressed JSON list of set dicts
+
+    @staticmethod
+    def pack(sets):
+        return gzip.compress(json.dumps(sets, separators=(',', ':')).encode(), compresslevel=6)
+
+    def unpack(self):
+        return json.loads(gzip.decompress(self.data))
+
+
+def read_archived_sets(workout_ids):
+    """Serialized sets of archived workouts, keyed by workout id"""
+    rows = ArchivedWorkout.query.filter(ArchivedWorkout.workout_id.in_(workout_ids)).all() if workout_ids else []
+    archived = {row.workout_id: row.unpack() for row in rows}
+    return {workout_id: archived.get(workout_id, []) for workout_id in workout_ids}
+
+
+def archive_workouts(user_id, workouts):
+    """Move one user's workouts' sets and reps into archived_workout rows. Caller commits."""
+    sets_by_workout, reps_by_set = load_set_trees([w.id for w in workouts])
+    records = [{'workout_id': w.id, 'sets': [s.to_dict(reps=reps_by_set.get(s.id)) for s in sets_by_workout[w.id]]}
+               for w in workouts]
+    db.session.add_all([ArchivedWorkout(workout_id=record['workout_id'], data=ArchivedWorkout.pack(record['sets']))
+                        for record in records])
+
+    set_ids = [s.id for sets in sets_by_workout.values() for s in sets]
+    if set_ids:
+        db.session.execute(db.delete(Rep).where(Rep.set_id.in_(set_ids)).execution_options(synchronize_session=False))
+        db.session.execute(db.delete(Set).where(Set.id.in_(set_ids)).execution_options(synchronize_session=False))
+    now = datetime.utcnow()
+    for workout, record in zip(workouts, records):
+        workout.archived_at = now
+        workout.archived_set_count = len(record['sets'])
+        workout.archived_rep_count = sum(s['reps_completed'] or 0 for s in record['sets'])
+
+    stats = db.session.get(UserStats, user_id)
+    if stats and any(stats.has_recent_set(set_id) for set_id in set_ids):
+        stats.refresh_recent_sets()
+
+
+def archive_old_workouts(older_than_days, batch_size=200):
+    """Archive unlinked workouts older than the cutoff, a batch per transaction; returns how many"""
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+    linked = db.select(Set.workout_id).join(ProgramSetLog, ProgramSetLog.workout_set_id == Set.id)
+    archived = 0
+    while True:
+        workouts = Workout.query.filter(
+            Workout.archived_at.is_(None),
+            Workout.created_at < cutoff,
+            Workout.id.notin_(linked)
+        ).order_by(Workout.user_id, Workout.id).limit(batch_size).all()
+        if not workouts:
+            break
+        for user_id in sorted({w.user_id for w in workouts}):
+            archive_workouts(user_id, [w for w in workouts if w.user_id == user_id])
+        db.session.commit()
+        archived += len(workouts)
+    return archived
+
+
+@app.cli.group('archive')
+def archive_cli():
+    """Move old workouts' sets out of the hot tables"""
+
+
+@archive_cli.command('run')
+@click.option('--older-than-days', default=ARCHIVE_AFTER_DAYS, show_default=True)
+@click.option('--batch-size', default=200, show_default=True, help='Workouts per transaction')
+def archive_run_command(older_than_days, batch_size):
+    """Archive workouts created more than --older-than-days ago.
+
+    Workouts with a set linked from a program set log stay in the database so
+    the log's velocity data and lift stats keep working.
+    """
+    archived = archive_old_workouts(older_than_days, batch_size)
+    print(f"✅ Archived {archived} workouts older than {older_than_days} days")
+
+
+# ========== Soft Delete & Purge ==========
+# Deleting a workout, program or account only stamps deleted_at. The row drops
+# out of every ORM query at once (hide_soft_deleted), and a background purge
+# removes it and everything under it in chunked bulk DELETEs, children first,
+# so no request loads or deletes a whole tree. The ON DELETE foreign keys cover
+# deletes made outside the app; the app never relies on them (SQLite here runs
+# without foreign key enforcement).
+
+PURGE_BATCH_SIZE = int(os.getenv('PURGE_BATCH_SIZE', 1000))
+PURGE_IN_BACKGROUND = os.getenv('PURGE_IN_BACKGROUND', '1') == '1'  # Else schedule `flask purge run`
+SOFT_DELETE_MODELS = (User, Workout, Program)
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def hide_soft_deleted(execute_state):
+    if execute_state.is_select and not execute_state.is_column_load \
+            and not execute_state.execution_options.get('include_deleted', False):
+        execute_state.statement = execute_state.statement.options(*[
+            with_loader_criteria(model, model.deleted_at.is_(None), include_aliases=True)
+            for model in SOFT_DELETE_MODELS
+        ])
+
+
+def subtree_steps(model, ids):
+    """Bulk steps that clear everything under the given rows, children first.
+
+    Each step is (model, criterion, values): values None deletes the matching
+    rows, a dict updates them instead (nullable references into the subtree).
+    ids may be a list or a select of ids.
+    """
+    if model is Workout:
+        set_ids = db.select(Set.id).where(Set.workout_id.in_(ids))
+        return subtree_steps(Set, set_ids) + [(Set, Set.workout_id.in_(ids), None),
+                                              (ArchivedWorkout, ArchivedWorkout.workout_id.in_(ids), None)]
+    if model is Set:
+        return [(Rep, Rep.set_id.in_(ids), None),
+                (ProgramSetLog, ProgramSetLog.workout_set_id.in_(ids), {'workout_set_id': None})]
+    if model is Program:
+        day_ids = db.select(ProgramDay.id).where(ProgramDay.program_id.in_(ids))
+        return subtree_steps(ProgramDay, day_ids) + [(ProgramDay, ProgramDay.program_id.in_(ids), None)]
+    if model is ProgramDay:
+        exercise_ids = db.select(ProgramExercise.id).where(ProgramExercise.program_day_id.in_(ids))
+        return subtree_steps(ProgramExercise, exercise_ids) + \
+            [(ProgramExercise, ProgramExercise.program_day_id.in_(ids), None)]
+    if model is ProgramExercise:
+        return [(ProgramSetLog, ProgramSetLog.program_exercise_id.in_(ids), None)]
+    return []
+
+
+def delete_subtree(model, ids):
+    """Clear everything under the given rows with one statement per step (the rows themselves stay)"""
+    for child, criterion, values in subtree_steps(model, ids):
+        statement = db.delete(child) if values is None else db.update(child).values(**values)
+        db.session.execute(statement.where(criterion).execution_options(synchronize_session=False))
+
+
+def purge_in_chunks(model, criterion, values=None, batch_size=None):
+    """Delete (or update with values) matching rows batch_size at a time, committing each chunk"""
+    key = model.__mapper__.primary_key[0]
+    total = 0
+    while True:
+        ids = db.session.scalars(
+            db.select(key).where(criterion).limit(batch_size or PURGE_BATCH_SIZE)
+            .execution_options(include_deleted=True)
+        ).all()
+        if not ids:
+            return total
+        statement = db.delete(model) if values is None else db.update(model).values(**values)
+        db.session.execute(statement.where(key.in_(ids)).execution_options(synchronize_session=False))
+        db.session.commit()
+        total += len(ids)
+
+
+def purge_deleted(batch_size=None):
+    """Remove soft-deleted accounts, workouts and programs and everything under them"""
+    deleted_users = db.select(User.id).where(User.deleted_at.isnot(None))
+    user_ids = db.session.scalars(deleted_users.execution_options(include_deleted=True)).all()
+    coached_athlete_ids = []
+    if user_ids:
+        # An account's own workouts and programs go through the purges below;
+        # references from other users' rows are cleared
+        coached_athlete_ids = db.session.scalars(
+            db.select(Program.athlete_id).where(Program.coach_id.in_(user_ids)).distinct()
+        ).all()
+        now = datetime.utcnow()
+        for statement in (
+            db.update(Workout).where(Workout.user_id.in_(user_ids), Workout.deleted_at.is_(None)).values(deleted_at=now),
+            db.update(Program).where(Program.athlete_id.in_(user_ids), Program.deleted_at.is_(None)).values(deleted_at=now),
+            db.update(Program).where(Program.coach_id.in_(user_ids)).values(coach_id=None),
+            db.update(User).where(User.coach_id.in_(user_ids)).values(coach_id=None),
+            db.update(CoachInvite).where(CoachInvite.athlete_id.in_(user_ids)).values(athlete_id=None),
+        ):
+            db.session.execute(statement.execution_options(synchronize_session=False))
+        db.session.commit()
+        purge_in_chunks(ProgramSetLog, ProgramSetLog.user_id.in_(user_ids), batch_size=batch_size)
+        purge_in_chunks(CoachInvite, CoachInvite.coach_id.in_(user_ids), batch_size=batch_size)
+        purge_in_chunks(UserStats, UserStats.user_id.in_(user_ids), batch_size=batch_size)
+
+    # A deleted program's logs count toward lift stats until they're purged, and
+    # a deleted workout's sets show in program logs until the links are cleared
+    athlete_ids = db.session.scalars(
+        db.union(db.select(Program.athlete_id).where(Program.deleted_at.isnot(None)),
+                 db.select(Workout.user_id).where(Workout.deleted_at.isnot(None)))
+        .execution_options(include_deleted=True)
+    ).all() + coached_athlete_ids
+
+    purged = {}
+    for model in (Workout, Program):
+        deleted = db.select(model.id).where(model.deleted_at.isnot(None))
+        for child, criterion, values in subtree_steps(model, deleted):
+            purge_in_chunks(child, criterion, values, batch_size=batch_size)
+        purged[model.__tablename__] = purge_in_chunks(model, model.deleted_at.isnot(None), batch_size=batch_size)
+    if athlete_ids:
+        bump_data_version(*athlete_ids)
+        db.session.commit()
+
+    purged['user'] = purge_in_chunks(User, User.id.in_(user_ids), batch_size=batch_size) if user_ids else 0
+    return purged
+
+
+def purge_account(user):
+    """Remove one soft-deleted account and everything it owns in the caller's transaction.
+
+    purge_deleted() does this for every deleted account in committed chunks;
+    this is for callers that must not commit partway, like a Stripe event.
+    """
+    user_id = user.id
+    coached_athlete_ids = db.session.scalars(
+        db.select(Program.athlete_id).where(Program.coach_id == user_id).distinct()
+        .execution_options(include_deleted=True)
+    ).all()
+    delete_subtree(Workout, db.select(Workout.id).where(Workout.user_id == user_id))
+    delete_subtree(Program, db.select(Program.id).where(Program.athlete_id == user_id))
+    for statement in (
+        db.delete(Workout).where(Workout.user_id == user_id),
+        db.delete(Program).where(Program.athlete_id == user_id),
+        db.update(Program).where(Program.coach_id == user_id).values(coach_id=None),
+        db.update(User).where(User.coach_id == user_id).values(coach_id=None),
+        db.update(CoachInvite).where(CoachInvite.athlete_id == user_id).values(athlete_id=None),
+        db.delete(ProgramSetLog).where(ProgramSetLog.user_id == user_id),
+        db.delete(CoachInvite).where(CoachInvite.coach_id == user_id),
+        db.delete(UserStats).where(UserStats.user_id == user_id),
+        db.delete(User).where(User.id == user_id),
+    ):
+        db.session.execute(statement.execution_options(synchronize_session=False))
+    db.session.expunge(user)
+    if coached_athlete_ids:
+        bump_data_version(*coached_athlete_ids)
+
+
+purge_requested = threading.Event()
+purge_thread = None
+purge_thread_lock = threading.Lock()
+
+
+def purge_worker():
+    while True:
+        purge_requested.wait()
+        purge_requested.clear()
+        try:
+            with app.app_context():
+                purge_deleted()
+        except Exception as e:
+            print(f"❌ Purge error: {e}")
+
+
+def request_purge():
+    """Wake this process's purge thread, starting it on first use"""
+    global purge_thread
+    if not PURGE_IN_BACKGROUND:
+        return
+    with purge_thread_lock:
+        if purge_thread is None or not purge_thread.is_alive():
+            purge_thread = threading.Thread(target=purge_worker, name='purge', daemon=True)
+            purge_thread.start()
+    purge_requested.set()
+
+
+@app.cli.group('purge')
+def purge_cli():
+    """Remove soft-deleted rows"""
+
+
+@purge_cli.command('run')
+@click.option('--batch-size', default=PURGE_BATCH_SIZE, show_default=True, help='Rows per DELETE')
+def purge_run_command(batch_size):
+    """Purge soft-deleted accounts, workouts and programs (also left over after a restart)"""
+    purged = purge_deleted(batch_size)
+    print(f"✅ Purged {purged['workout']} workouts, {purged['program']} programs and {purged['user']} accounts")
+
+
+@app.cli.group('accounts')
+def accounts_cli():
+    """Manage user accounts"""
+
+
+@accounts_cli.command('delete')
+@click.argument('email')
+def delete_account_command(email):
+    """Soft-delete an account; `flask purge run` removes its data"""
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f'No account for {email}')
+    user.deleted_at = datetime.utcnow()
+    db.session.commit()
+    print(f"✅ Deleted account {email}")
+
+
+# ========== Stripe Event Queue ==========
+# The webhook only verifies the signature and stores the raw event, keyed by
+# Stripe's event id so redeliveries are dropped. A worker thread drains due
+# events in batches; a failed event is retried with exponential backoff and
+# given up after STRIPE_EVENT_MAX_ATTEMPTS (its last_error is kept). Retries
+# can apply a customer's events out of order, so each user remembers when the
+# last one applied to them was created and older ones are skipped.
+
+STRIPE_EVENT_BATCH_SIZE = int(os.getenv('STRIPE_EVENT_BATCH_SIZE', 50))
+STRIPE_EVENT_MAX_ATTEMPTS = int(os.getenv('STRIPE_EVENT_MAX_ATTEMPTS', 8))
+STRIPE_EVENT_RETRY_SECONDS = int(os.getenv('STRIPE_EVENT_RETRY_SECONDS', 30))  # Doubles per attempt, capped at an hour
+STRIPE_EVENT_LEASE_SECONDS = int(os.getenv('STRIPE_EVENT_LEASE_SECONDS', 300))  # Claimed events return after this if a worker dies
+STRIPE_EVENTS_IN_BACKGROUND = os.getenv('STRIPE_EVENTS_IN_BACKGROUND', '1') == '1'  # Else schedule `flask stripe-events process`
+
+
+class StripeEvent(db.Model):
+    """A verified Stripe webhook event, stored before it is processed"""
+    id = db.Column(db.String(255), primary_key=True)  # Stripe's event id
+    type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # Raw request body
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    next_attempt_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)  # None once processed or given up
+    processed_at = db.Column(db.DateTime, nullable=True)
+    last_error = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_stripe_event_due', 'next_attempt_at', postgresql_where=db.text('next_attempt_at IS NOT NULL'),
+                 sqlite_where=db.text('next_attempt_at IS NOT NULL')),
+    )
+
+
+def stale_stripe_event(user, event):
+    """True if a newer event was already applied to this user; else records this one"""
+    created = datetime.utcfromtimestamp(event['created'])
+    if user.subscription_event_at is not None and created < user.subscription_event_at:
+        print(f"✅ Skipped {event['type']} {event['id']} for {user.email}: a newer event was applied")
+        return True
+    user.subscription_event_at = created
+    return False
+
+
+def handle_stripe_event(event):
+    """Apply one event to the database without committing; returns the user it changed"""
+    # Handle successful payment
+    if event['type'] == 'checkout.session.completed':
+        session_obj = event['data']['object']
+        email = session_obj['customer_details']['email'].lower()
+        customer_id = session_obj.get('customer')
+        
+        # Get subscription details
+        subscription_id = session_obj.get('subscription')
+        subscription_type = 'monthly'  # Default
+        
+        if subscription_id:
+            subscription = stripe_client.Subscription.retrieve(subscription_id)
+            # Determine if monthly or annual based on price
+            if subscription['items']['data']:
+                price = subscription['items']['data'][0]['price']
+                if price['recurring']['interval'] == 'year':
+                    subscription_type = 'annual'
+        
+        # Check if user exists
+        user = User.query.filter_by(email=email).execution_options(include_deleted=True).first()
+        if user is not None and user.deleted_at is not None:
+            # A deleted account not purged yet still holds the email; remove it with the
+            # event so the customer gets a fresh account instead of a unique violation
+            purge_account(user)
+            user = None
+        
+        if user:
+            if stale_stripe_event(user, event):
+                return user
+            # Existing user - just update subscription
+            user.subscribed = True
+            user.stripe_customer_id = customer_id
+            user.subscription_type = subscription_type
+            print(f"✅ Subscription activated for existing user {email} ({subscription_type})")
+        else:
+            # New user - create account with temporary password
+            user = User(
+                email=email,
+                subscribed=True,
+                stripe_customer_id=customer_id,
+                subscription_type=subscription_type,
+                needs_password_setup=True,  # Flag them to set password
+                subscription_event_at=datetime.utcfromtimestamp(event['created'])
+            )
+            # Set a temporary random password
+            user.set_password(os.urandom(24).hex())
+            db.session.add(user)
+            print(f"✅ New user created for {email} ({subscription_type}) - needs password setup")
+        
+        db.session.flush()
+        
+        # Update Stripe session to redirect to our success page with email
+        # Note: You'll need to configure this in your Stripe Payment Link settings
+        # or use the Stripe API to create sessions programmatically
+        return user
+    
+    # Handle subscription cancellation
+    elif event['type'] == 'customer.subscription.deleted':
+        subscription = event['data']['object']
+        customer_id = subscription['customer']
+        
+        user = User.query.filter_by(stripe_customer_id=customer_id).first()
+        if user and not stale_stripe_event(user, event):
+            user.subscribed = False
+            user.subscription_end_date = datetime.utcnow()
+            print(f"✅ Subscription cancelled for {user.email}")
+        return user
+    
+    # Handle subscription updates
+    elif event['type'] == 'customer.subscription.updated':
+        subscription = event['data']['object']
+        customer_id = subscription['customer']
+        
+        user = User.query.filter_by(stripe_customer_id=customer_id).first()
+        if user and not stale_stripe_event(user, event):
+            # Update subscription status based on current status
+            user.subscribed = subscription['status'] == 'active'
+            print(f"✅ Subscription updated for {user.email}")
+        return user
+    
+    return None
+
+
+def retry_delay(attempts):
+    return timedelta(seconds=min(STRIPE_EVENT_RETRY_SECONDS * 2 ** (attempts - 1), 3600))
+
+
+def run_stripe_event(stripe_event):
+    """Claim one queued event and apply it; None if another worker holds it, else whether it succeeded"""
+    # Claim it for a lease so other workers skip it
+    claimed = db.session.execute(
+        db.update(StripeEvent)
+        .where(StripeEvent.id == stripe_event.id, StripeEvent.next_attempt_at == stripe_event.next_attempt_at)
+        .values(next_attempt_at=datetime.utcnow() + timedelta(seconds=STRIPE_EVENT_LEASE_SECONDS))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return None
+
+    try:
+        user = handle_stripe_event(json.loads(stripe_event.payload))
+        stripe_event.attempts += 1
+        stripe_event.processed_at = datetime.utcnow()
+        stripe_event.next_attempt_at = None
+        stripe_event.last_error = None
+        db.session.commit()
+        if user is not None:
+            forget_users(user.id)
+        return True
+    except Exception as e:
+        db.session.rollback()
+        stripe_event.attempts += 1
+        stripe_event.last_error = str(e)
+        if stripe_event.attempts < STRIPE_EVENT_MAX_ATTEMPTS:
+            stripe_event.next_attempt_at = datetime.utcnow() + retry_delay(stripe_event.attempts)
+        else:
+            stripe_event.next_attempt_at = None
+        db.session.commit()
+        print(f"❌ Stripe event {stripe_event.id} failed (attempt {stripe_event.attempts}): {e}")
+        return False
+
+
+def process_stripe_events(batch_size=None):
+    """Process due events oldest first until none are due; returns (processed, failed)"""
+    processed = failed = 0
+    while True:
+        due = StripeEvent.query.filter(StripeEvent.next_attempt_at <= datetime.utcnow())\
+            .order_by(StripeEvent.received_at).limit(batch_size or STRIPE_EVENT_BATCH_SIZE).all()
+        if not due:
+            return processed, failed
+
+        for stripe_event in due:
+            succeeded = run_stripe_event(stripe_event)
+            if succeeded:
+                processed += 1
+            elif succeeded is False:
+                failed += 1
+
+
+stripe_events_requested = threading.Event()
+stripe_events_thread = None
+stripe_events_thread_lock = threading.Lock()
+
+
+def stripe_events_worker():
+    while True:
+        # Also wakes for retries that came due without a new event
+        stripe_events_requested.wait(timeout=max(STRIPE_EVENT_RETRY_SECONDS, 1))
+        stripe_events_requested.clear()
+        try:
+            with app.app_context():
+                process_stripe_events()
+        except Exception as e:
+            print(f"❌ Stripe event queue error: {e}")
+
+
+def request_stripe_processing():
+    """Wake this process's Stripe event thread, starting it on first use"""
+    global stripe_events_thread
+    if not STRIPE_EVENTS_IN_BACKGROUND:
+        return
+    with stripe_events_thread_lock:
+        if stripe_events_thread is None or not stripe_events_thread.is_alive():
+            stripe_events_thread = threading.Thread(target=stripe_events_worker, name='stripe-events', daemon=True)
+            stripe_events_thread.start()
+    stripe_events_requested.set()
+
+
+@app.cli.group('stripe-events')
+def stripe_events_cli():
+    """Process queued Stripe webhook events"""
+
+
+@stripe_events_cli.command('process')
+@click.option('--batch-size', default=STRIPE_EVENT_BATCH_SIZE, show_default=True, help='Events per batch')
+@click.option('--keep-days', default=30, show_default=True, help='Delete processed events older than this')
+def process_stripe_events_command(batch_size, keep_days):
+    """Process due events (also left over after a restart) and prune old ones"""
+    processed, failed = process_stripe_events(batch_size)
+    pruned = StripeEvent.query.filter(StripeEvent.processed_at < datetime.utcnow() - timedelta(days=keep_days))\
+        .delete(synchronize_session=False)
+    db.session.commit()
+    print(f"✅ Processed {processed} Stripe events ({failed} failed), pruned {pruned}")
+
+
+# ========== Background Jobs ==========
+# Maintenance that shouldn't run inside a request goes through the job table
+# and `flask jobs run` (the 'worker' process group in fly.toml). Recurring
+# jobs are declared with @job(name, every=seconds) and get one row each,
+# rescheduled after every run. One-off jobs are added with enqueue_job() in
+# the caller's transaction, so they exist only if its write commits. A worker
+# picks a due row with FOR UPDATE SKIP LOCKED on Postgres (SQLite has no row
+# locks and drops the clause), then takes a lease on it with a conditional
+# UPDATE as the Stripe event queue does, so a job never runs twice at once.
+# Each run's duration is added to its row and to the process's latency stats.
+
+JOB_POLL_SECONDS = float(os.getenv('JOB_POLL_SECONDS', 5))
+JOB_LEASE_SECONDS = int(os.getenv('JOB_LEASE_SECONDS', 900))  # Longer than any run; a dead worker's job returns after this
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 5))  # One-off jobs; recurring ones keep their schedule
+JOB_RETRY_SECONDS = int(os.getenv('JOB_RETRY_SECONDS', 30))  # Doubles per failure, capped at an hour
+JOB_KEEP_DAYS = int(os.getenv('JOB_KEEP_DAYS', 7))  # Finished one-off jobs and processed Stripe events
+INVITE_EXPIRY_DAYS = int(os.getenv('INVITE_EXPIRY_DAYS', 14))
+STALE_WORKOUT_HOURS = int(os.getenv('STALE_WORKOUT_HOURS', 12))  # Open workouts with no new set for this long
+
+JOBS = {}  # name -> (function, every seconds or None)
+
+
+class Job(db.Model):
+    """A recurring or one-off background job and the timing of its runs"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)  # Key of JOBS
+    args = db.Column(db.Text, nullable=False, default='{}')  # JSON keyword arguments
+    every_seconds = db.Column(db.Integer, nullable=True)  # Set for recurring jobs
+    run_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)  # Next due; None once done or given up
+    attempts = db.Column(db.Integer, default=0, nullable=False)  # Failures since the last success
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime, nullable=True)  # Last successful run
+    runs = db.Column(db.Integer, default=0, nullable=False)
+    total_ms = db.Column(db.Float, default=0, nullable=False)
+    last_ms = db.Column(db.Float, nullable=True)
+    max_ms = db.Column(db.Float, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_job_due', 'run_at', postgresql_where=db.text('run_at IS NOT NULL'),
+                 sqlite_where=db.text('run_at IS NOT NULL')),
+        # One row per recurring job, however many workers register the schedule
+        db.Index('ux_job_recurring_name', 'name', unique=True,
+                 postgresql_where=db.text('every_seconds IS NOT NULL'),
+                 sqlite_where=db.text('every_seconds IS NOT NULL')),
+    )
+
+
+def job(name, every=None):
+    """Decorator to register a job function; every (seconds) makes it recurring"""
+    def decorator(f):
+        JOBS[name] = (f, every)
+        return f
+    return decorator
+
+
+def enqueue_job(name, run_at=None, **kwargs):
+    """Add a one-off run of a registered job to the caller's transaction"""
+    if name not in JOBS:
+        raise ValueError(f'No job named {name}')
+    new_job = Job(name=name, args=json.dumps(kwargs), run_at=run_at or datetime.utcnow())
+    db.session.add(new_job)
+    return new_job
+
+
+def schedule_recurring_jobs():
+    """Give every recurring job in JOBS its row and drop rows of jobs no longer declared"""
+    rows = {row.name: row for row in Job.query.filter(Job.every_seconds.isnot(None))}
+    for name, (function, every) in JOBS.items():
+        if every is None:
+            continue
+        if name in rows:
+            rows[name].every_seconds = every
+            if rows[name].run_at is None:
+                rows[name].run_at = datetime.utcnow()
+        else:
+            db.session.add(Job(name=name, every_seconds=every))
+    for name, row in rows.items():
+        if JOBS.get(name, (None, None))[1] is None:
+            db.session.delete(row)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()  # Another worker registered them first
+
+
+def claim_due_job():
+    """Lease the oldest due job to this worker; None when nothing is due"""
+    while True:
+        now = datetime.utcnow()
+        candidate = Job.query.filter(Job.run_at <= now).order_by(Job.run_at, Job.id)\
+            .with_for_update(skip_locked=True).first()
+        if candidate is None:
+            db.session.commit()
+            return None
+        claimed = db.session.execute(
+            db.update(Job).where(Job.id == candidate.id, Job.run_at == candidate.run_at)
+            .values(run_at=now + timedelta(seconds=JOB_LEASE_SECONDS))
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return candidate
+
+
+def run_job(claimed_job):
+    """Run a claimed job, then record its timing and reschedule, retry or finish it"""
+    function = JOBS.get(claimed_job.name, (None, None))[0]
+    start = time.perf_counter()
+    try:
+        if function is None:
+            raise LookupError(f'No job named {claimed_job.name}')
+        result = function(**json.loads(claimed_job.args))
+        db.session.commit()
+        error = None
+    except Exception as e:
+        db.session.rollback()
+        result, error = None, e
+    elapsed = time.perf_counter() - start
+    record_latency(f'job:{claimed_job.name}', elapsed)
+
+    elapsed_ms = elapsed * 1000
+    now = datetime.utcnow()
+    claimed_job.runs += 1
+    claimed_job.total_ms += elapsed_ms
+    claimed_job.last_ms = elapsed_ms
+    claimed_job.max_ms = max(claimed_job.max_ms or 0, elapsed_ms)
+    if error is None:
+        claimed_job.attempts = 0
+        claimed_job.last_error = None
+        claimed_job.finished_at = now
+        claimed_job.run_at = now + timedelta(seconds=claimed_job.every_seconds) if claimed_job.every_seconds else None
+        print(f"✅ Job {claimed_job.name} finished in {elapsed_ms:.0f} ms" + (f": {result}" if result else ''))
+    else:
+        claimed_job.attempts += 1
+        claimed_job.last_error = str(error)
+        delay = min(JOB_RETRY_SECONDS * 2 ** (claimed_job.attempts - 1), 3600)
+        if claimed_job.every_seconds:
+            claimed_job.run_at = now + timedelta(seconds=min(delay, claimed_job.every_seconds))
+        elif claimed_job.attempts < JOB_MAX_ATTEMPTS:
+            claimed_job.run_at = now + timedelta(seconds=delay)
+        else:
+            claimed_job.run_at = None
+        print(f"❌ Job {claimed_job.name} failed after {elapsed_ms:.0f} ms (attempt {claimed_job.attempts}): {error}")
+    db.session.commit()
+    return error is None
+
+
+def run_due_jobs(stop=None):
+    """Run jobs until none are due (or stop is set); returns (succeeded, failed)"""
+    succeeded = failed = 0
+    while stop is None or not stop.is_set():
+        claimed_job = claim_due_job()
+        if claimed_job is None:
+            break
+        if run_job(claimed_job):
+            succeeded += 1
+        else:
+            failed += 1
+    return succeeded, failed
+
+
+@job('stripe-events', every=60)
+def stripe_events_job():
+    """Retry failed webhook events, and pick up any a restarted web worker left behind"""
+    processed, failed = process_stripe_events()
+    return f'{processed} processed, {failed} failed' if processed or failed else None
+
+
+@job('purge', every=600)
+def purge_job():
+    purged = purge_deleted()
+    return ', '.join(f'{count} {table}' for table, count in purged.items() if count) or None
+
+
+@job('expire-invites', every=3600)
+def expire_invites_job():
+    """Expire pending coach invites older than INVITE_EXPIRY_DAYS"""
+    expired = CoachInvite.query.filter(
+        CoachInvite.status == 'pending',
+        CoachInvite.created_at < datetime.utcnow() - timedelta(days=INVITE_EXPIRY_DAYS)
+    ).update({'status': 'expired'}, synchronize_session=False)
+    return f'{expired} invites expired' if expired else None
+
+
+@job('close-stale-workouts', every=3600)
+def close_stale_workouts_job(batch_size=500):
+    """Complete open workouts with no new set for STALE_WORKOUT_HOURS, as of their last set"""
+    cutoff = datetime.utcnow() - timedelta(hours=STALE_WORKOUT_HOURS)
+    last_activity = db.func.coalesce(
+        db.select(db.func.max(Set.created_at)).where(Set.workout_id == Workout.id).scalar_subquery(),
+        Workout.created_at
+    )
+    closed = 0
+    while True:
+        stale = db.session.query(Workout.id, Workout.user_id).filter(
+            Workout.completed_at.is_(None),
+            Workout.archived_at.is_(None),
+            Workout.created_at < cutoff,
+            last_activity < cutoff
+        ).limit(batch_size).all()
+        if not stale:
+            return f'{closed} workouts closed' if closed else None
+        db.session.execute(
+            db.update(Workout).where(Workout.id.in_([row.id for row in stale]))
+            .values(completed_at=last_activity, revision=Workout.revision + 1)
+            .execution_options(synchronize_session=False)
+        )
+        bump_data_version(*{row.user_id for row in stale})
+        db.session.commit()
+        closed += len(stale)
+
+
+@job('prune-queues', every=86400)
+def prune_queues_job():
+    """Delete processed Stripe events and finished one-off jobs older than JOB_KEEP_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=JOB_KEEP_DAYS)
+    events = StripeEvent.query.filter(StripeEvent.processed_at < cutoff).delete(synchronize_session=False)
+    jobs = Job.query.filter(Job.every_seconds.is_(None), Job.run_at.is_(None), Job.created_at < cutoff)\
+        .delete(synchronize_session=False)
+    return f'{events} Stripe events and {jobs} jobs pruned' if events or jobs else None
+
+
+@job('rebuild-stats')
+def rebuild_stats_job(user_ids=None):
+    return f'{rebuild_stats_in_batches(user_ids)} users rebuilt'
+
+
+@job('archive', every=86400)
+def archive_job():
+    archived = archive_old_workouts(ARCHIVE_AFTER_DAYS)
+    return f'{archived} workouts archived' if archived else None
+
+
+@app.cli.group('jobs')
+def jobs_cli():
+    """Run and inspect background jobs"""
+
+
+@jobs_cli.command('run')
+@click.option('--once', is_flag=True, help='Run what is due now and exit, e.g. from cron')
+@click.option('--poll-seconds', default=JOB_POLL_SECONDS, show_default=True)
+def run_jobs_command(once, poll_seconds):
+    """Run due jobs until stopped (SIGTERM/SIGINT finish the current job first)"""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda signum, frame: stop.set())
+    schedule_recurring_jobs()
+    print(f"✅ Job worker started: {', '.join(sorted(JOBS))}")
+    while not stop.is_set():
+        try:
+            run_due_jobs(stop)
+        except Exception as e:
+            db.session.rollback()
+            print(f"❌ Job worker error: {e}")
+        if once:
+            break
+        stop.wait(poll_seconds)
+
+
+@jobs_cli.command('enqueue')
+@click.argument('name')
+@click.option('--args', 'args_json', default='{}', help='Keyword arguments as JSON')
+@click.option('--in-seconds', default=0, show_default=True, help='Delay before it is due')
+def enqueue_job_command(name, args_json, in_seconds):
+    """Add a one-off run of a job"""
+    try:
+        new_job = enqueue_job(name, run_at=datetime.utcnow() + timedelta(seconds=in_seconds), **json.loads(args_json))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    db.session.commit()
+    print(f"✅ Enqueued {name} as job {new_job.id}")
+
+
+@jobs_cli.command('status')
+def jobs_status_command():
+    """Run counts, timings and next run of every job"""
+    rows = db.session.query(
+        Job.name, db.func.sum(Job.runs), db.func.sum(Job.total_ms), db.func.max(Job.max_ms),
+        db.func.min(Job.run_at), db.func.max(Job.attempts)
+    ).group_by(Job.name).order_by(Job.name).all()
+    print(f"{'job':<22} {'runs':>6} {'avg ms':>8} {'max ms':>8} {'failing':>8}  next run")
+    for name, runs, total_ms, max_ms, run_at, attempts in rows:
+        average = f'{total_ms / runs:.0f}' if runs else '-'
+        print(f"{name:<22} {runs:>6} {average:>8} {max_ms or 0:>8.0f} {attempts:>8}  {run_at or '-'}")
+
+
+# ========== User Cache ==========
+# Every authenticated request (each dashboard poll included) loads current_user.
+# The loader hands out a read-only snapshot of the user's columns, cached per
+# process for USER_CACHE_TTL_SECONDS. Views that change the signed-in user take
+# @mutates_user and work on the real row; writes to other users' rows call
+# forget_users(). Other processes see such changes once their entry expires.
+# Subscriptions change in whichever process applies the Stripe event, often
+# the jobs worker on another machine, so @subscription_required checks the
+# database instead of the snapshot.
+
+USER_CACHE_TTL_SECONDS = float(os.getenv('USER_CACHE_TTL_SECONDS', 30))  # 0 disables
+USER_CACHE_MAX_ENTRIES = int(os.getenv('USER_CACHE_MAX_ENTRIES', 10000))
+
+user_cache = OrderedDict()  # user_id -> (expires_at, UserSnapshot)
+user_cache_lock = threading.Lock()
+user_cache_generation = 0  # Bumped by forget_users so an in-flight load can't store a stale row
+
+
+class UserSnapshot(UserMixin):
+    """Detached, read-only copy of a User's columns"""
+    get_dashboard_metrics = User.get_dashboard_metrics
+    get_display_name = User.get_display_name
+    check_password = User.check_password
+
+    def __init__(self, user):
+        object.__setattr__(self, 'values', {attr.key: getattr(user, attr.key) for attr in User.__mapper__.column_attrs})
+
+    def __getattr__(self, name):
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"current_user is read-only; decorate the view with @mutates_user to set {name}")
+
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    with user_cache_lock:
+        entry = user_cache.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            user_cache.move_to_end(user_id)
+            return entry[1]
+        generation = user_cache_generation
+
+    user = db.session.get(User, user_id)
+    if user is None:
+        return None
+    snapshot = UserSnapshot(user)
+    with user_cache_lock:
+        if generation == user_cache_generation:
+            user_cache[user_id] = (time.monotonic() + USER_CACHE_TTL_SECONDS, snapshot)
+            user_cache.move_to_end(user_id)
+            while len(user_cache) > USER_CACHE_MAX_ENTRIES:
+                user_cache.popitem(last=False)
+    return snapshot
+
+
+def forget_users(*user_ids):
+    """Drop cached snapshots after writing to these users' rows"""
+    global user_cache_generation
+    with user_cache_lock:
+        user_cache_generation += 1
+        for user_id in user_ids:
+            user_cache.pop(user_id, None)
+
+
+def mutates_user(f):
+    """Decorator for views that change current_user: they get the database row instead of the snapshot"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            return f(*args, **kwargs)
+        user_id = current_user.id
+        g._login_user = db.session.get(User, user_id)  # Where flask-login keeps the request's user
+        try:
+            return f(*args, **kwargs)
+        finally:
+            forget_users(user_id)
+    return decorated_function
+
+
+def subscription_required(f):
+    """Decorator for views that need an active subscription; use after @login_required"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not db.session.query(User.subscribed).filter_by(id=current_user.id).scalar():
+            return redirect(url_for('subscribe'))
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def replica_reads(f):
+    """Decorator to serve a read-only view from the replica database.
+
+    A user who wrote recently stays on the primary for REPLICA_STICKY_SECONDS
+    so they read their own writes (see mark_primary_sticky).
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g.use_replica = 'replica' in db.engines and session.get('primary_until', 0) < time.time()
+        try:
+            return f(*args, **kwargs)
+        finally:
+            g.use_replica = False
+    return decorated_function
+
+
+@app.before_request
+def reset_write_marker():
+    g.pop('wrote_to_primary', None)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def record_write(db_session, flush_context):
+    if has_app_context():
+        g.wrote_to_primary = True
+
+
+@app.after_request
+def mark_primary_sticky(response):
+    if g.pop('wrote_to_primary', False) and 'replica' in db.engines:
+        session['primary_until'] = time.time() + REPLICA_STICKY_SECONDS
+    return response
+
+
+# ========== Admission Control ==========
+# Every request takes tokens from its user's bucket (its IP's when signed
+# out), weighted by RATE_LIMIT_COSTS, and the expensive endpoints also from a
+# bucket of their own shared by all users. The buckets live in a SQLite file
+# on /dev/shm, so every gunicorn worker on the machine draws from the same
+# ones and a decision is one short local transaction. The same file counts the
+# requests in flight on the machine, which stay under RATE_LIMIT_MAX_IN_FLIGHT.
+# Anything over a limit gets a 429 with Retry-After.
+
+RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'sqlite')  # 'sqlite', 'memory' (per process) or 'none'
+RATE_LIMIT_STORE = os.getenv('RATE_LIMIT_STORE', os.path.join(
+    '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'chronicle-rate-limits.db'))
+RATE_LIMIT_PER_SECOND = float(os.getenv('RATE_LIMIT_PER_SECOND', 5))  # Tokens each user regains per second
+RATE_LIMIT_BURST = float(os.getenv('RATE_LIMIT_BURST', 60))
+RATE_LIMIT_ENDPOINT_PER_SECOND = float(os.getenv('RATE_LIMIT_ENDPOINT_PER_SECOND', 40))  # Per expensive endpoint
+RATE_LIMIT_ENDPOINT_BURST = float(os.getenv('RATE_LIMIT_ENDPOINT_BURST', 200))
+# Per machine; 0 = no cap. A gunicorn worker only takes a request when it has a
+# free thread, so under gunicorn.conf.py (which exports WEB_CONCURRENCY and
+# GUNICORN_THREADS) the default leaves one thread per worker to answer 429s
+# quickly rather than letting requests wait in the listen backlog. Run any
+# other way, the process's capacity is unknown and nothing is capped.
+RATE_LIMIT_MAX_IN_FLIGHT = int(os.getenv('RATE_LIMIT_MAX_IN_FLIGHT', int(os.getenv('WEB_CONCURRENCY', 0)) * max(
+    1, int(os.getenv('GUNICORN_THREADS', 1)) - 1)))
+RATE_LIMIT_COSTS = {  # Tokens per request; everything else costs 1
+    'get_coach_athletes': 10,
+    'get_athlete_details': 5,
+    'get_lift_stats': 10,
+    'get_dashboard_metrics': 5,
+    'get_exercise_logs': 3,
+    'login': 5,  # The password KDF
+    'register': 5,
+}
+RATE_LIMIT_EXEMPT = {'static', 'metrics', 'stripe_webhook'}  # Stripe retries on its own schedule
+RATE_LIMIT_PRUNE_EVERY = 1000  # Decisions between sweeps of idle buckets
+
+admission_rejections = {'rate_limit': 0, 'in_flight': 0}
+
+
+def settle_buckets(charges, states, now):
+    """Apply charges [(key, cost, rate, burst)] to bucket states {key: (tokens, updated)}.
+
+    Returns (seconds until every charge would fit, new states). Either all
+    charges are taken or none are, in which case the new states are empty.
+    """
+    levels = {}
+    wait = 0
+    for key, cost, rate, burst in charges:
+        cost = min(cost, burst)
+        tokens, updated = states.get(key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - updated) * rate)
+        levels[key] = tokens - cost
+        if tokens < cost:
+            wait = max(wait, (cost - tokens) / rate)
+    if wait:
+        return wait, {}
+    return 0, {key: (level, now) for key, level in levels.items()}
+
+
+def bucket_idle_seconds():
+    """After this long untouched a bucket is full again, the same as no row"""
+    return max(RATE_LIMIT_BURST / RATE_LIMIT_PER_SECOND, RATE_LIMIT_ENDPOINT_BURST / RATE_LIMIT_ENDPOINT_PER_SECOND)
+
+
+class MemoryBuckets:
+    """Token buckets and the in-flight count of this process only"""
+
+    def __init__(self):
+        self.states = {}
+        self.decisions = 0
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def enter(self, limit):
+        with self.lock:
+            if self.in_flight >= limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def leave(self):
+        with self.lock:
+            self.in_flight -= 1
+
+    def take(self, charges, now):
+        with self.lock:
+            wait, changes = settle_buckets(charges, self.states, now)
+            self.states.update(changes)
+            self.decisions += 1
+            if self.decisions % RATE_LIMIT_PRUNE_EVERY == 0:
+                cutoff = now - bucket_idle_seconds()
+                self.states = {key: state for key, state in self.states.items() if state[1] >= cutoff}
+        return wait
+
+
+class SQLiteBuckets:
+    """Token buckets shared by every process on the machine through a SQLite file.
+
+    Each thread keeps its own connection. The file only holds throttling
+    state, so it skips fsync and lives on tmpfs where there is one. In-flight
+    requests are counted per process id, so a worker that dies mid-request
+    (a timeout kill) has its count dropped once the machine fills up.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1, isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            conn.execute('CREATE TABLE IF NOT EXISTS bucket '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID')
+            conn.execute('CREATE TABLE IF NOT EXISTS in_flight (pid INTEGER PRIMARY KEY, requests INTEGER NOT NULL)')
+            self.local.conn = conn
+            self.local.decisions = 0
+        return conn
+
+    def take(self, charges, now):
+        conn = self.connection()
+        keys = [charge[0] for charge in charges]
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute(f"SELECT key, tokens, updated FROM bucket WHERE key IN ({', '.join('?' * len(keys))})",
+                                keys)
+            wait, changes = settle_buckets(charges, {key: (tokens, updated) for key, tokens, updated in rows}, now)
+            conn.executemany('INSERT OR REPLACE INTO bucket (key, tokens, updated) VALUES (?, ?, ?)',
+                             [(key, tokens, updated) for key, (tokens, updated) in changes.items()])
+            self.local.decisions += 1
+            if self.local.decisions % RATE_LIMIT_PRUNE_EVERY == 0:
+                conn.execute('DELETE FROM bucket WHERE updated < ?', (now - bucket_idle_seconds(),))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return wait
+
+    def enter(self, limit):
+        """Count a request in flight unless limit already are on this machine"""
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            counts = dict(conn.execute('SELECT pid, requests FROM in_flight'))
+            if sum(counts.values()) >= limit:
+                dead = [pid for pid in counts if pid != os.getpid() and not process_alive(pid)]
+                conn.executemany('DELETE FROM in_flight WHERE pid = ?', [(pid,) for pid in dead])
+                for pid in dead:
+                    del counts[pid]
+            admitted = sum(counts.values()) < limit
+            if admitted:
+                conn.execute('INSERT INTO in_flight (pid, requests) VALUES (?, 1) '
+                             'ON CONFLICT (pid) DO UPDATE SET requests = requests + 1', (os.getpid(),))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return admitted
+
+    def leave(self):
+        self.connection().execute('UPDATE in_flight SET requests = requests - 1 WHERE pid = ?', (os.getpid(),))
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def make_rate_limit_buckets(backend):
+    if backend == 'sqlite':
+        return SQLiteBuckets(RATE_LIMIT_STORE)
+    if backend == 'memory':
+        return MemoryBuckets()
+    return None
+
+
+rate_limit_buckets = make_rate_limit_buckets(RATE_LIMIT_BACKEND)
+in_flight_requests = rate_limit_buckets or MemoryBuckets()  # Still capped, per process, without a store
+
+
+def too_many_requests(wait_seconds):
+    response = jsonify({'error': 'Too many requests, please slow down'})
+    response.headers['Retry-After'] = str(max(1, math.ceil(wait_seconds)))
+    return response, 429
+
+
+def rate_limit_charges(endpoint):
+    """The buckets a request to endpoint draws from, as (key, cost, rate, burst)"""
+    if current_user.is_authenticated:
+        client = f'user:{current_user.get_id()}'
+    else:
+        client = f"ip:{request.headers.get('Fly-Client-IP', request.remote_addr)}"  # Set by Fly's proxy
+    cost = RATE_LIMIT_COSTS.get(endpoint, 1)
+    charges = [(client, cost, RATE_LIMIT_PER_SECOND, RATE_LIMIT_BURST)]
+    if cost > 1:
+        charges.append((f'endpoint:{endpoint}', cost, RATE_LIMIT_ENDPOINT_PER_SECOND, RATE_LIMIT_ENDPOINT_BURST))
+    return charges
+
+
+@app.before_request
+def admit_request():
+    if request.endpoint in RATE_LIMIT_EXEMPT:
+        return None
+    try:
+        if RATE_LIMIT_MAX_IN_FLIGHT:
+            if not in_flight_requests.enter(RATE_LIMIT_MAX_IN_FLIGHT):
+                admission_rejections['in_flight'] += 1
+                return too_many_requests(1)
+            g.in_flight = in_flight_requests
+        if rate_limit_buckets is None:
+            return None
+        wait = rate_limit_buckets.take(rate_limit_charges(request.endpoint), time.time())
+    except sqlite3.Error as e:
+        print(f"❌ Rate limit store unavailable, admitting request: {e}")
+        return None
+    if wait:
+        admission_rejections['rate_limit'] += 1
+        return too_many_requests(wait)
+    return None
+
+
+@app.teardown_request
+def release_in_flight_slot(exc):
+    in_flight = g.pop('in_flight', None)
+    if in_flight is None:
+        return
+    try:
+        in_flight.leave()
+    except sqlite3.Error as e:
+        print(f"❌ Rate limit store unavailable, in-flight count not released: {e}")
+
+
+# ========== Response Cache ==========
+# Dashboard GETs are cached per user under (user_id, endpoint, query args,
+# data_version). Writes bump the user's data_version, so stale entries are
+# never read again and simply age out; CACHE_TTL_SECONDS bounds anything a
+# bump can't see (CLI maintenance, replica lag).
+
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'lru')  # 'lru', 'redis' or 'none'
+CACHE_MAX_BYTES = int(os.getenv('CACHE_MAX_BYTES', 16 * 1024 * 1024))  # Per process, lru only
+CACHE_TTL_SECONDS = int(os.getenv('CACHE_TTL_SECONDS', 300))
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL', 'redis://localhost:6379/0')
+
+
+class LRUCache:
+    """In-process cache evicting least recently used bodies past a byte budget"""
+
+    def __init__(self, max_bytes, ttl):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, body)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, body):
+        if len(body) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            self.entries[key] = (time.monotonic() + self.ttl, body)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        self.size -= len(self.entries.pop(key)[1])
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'bytes': self.size}
+
+
+class RedisCache:
+    """Cache shared by every worker in a Redis server; needs the redis package"""
+
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+
+    def get(self, key):
+        body = self.client.get(f'cache:{key}')
+        self.client.incr('cache:hits' if body is not None else 'cache:misses')
+        return body
+
+    def set(self, key, body):
+        self.client.set(f'cache:{key}', body, ex=self.ttl)
+
+    def stats(self):
+        hits, misses = self.client.mget('cache:hits', 'cache:misses')
+        return {'hits': int(hits or 0), 'misses': int(misses or 0)}
+
+
+def make_response_cache(backend):
+    if backend == 'lru':
+        return LRUCache(CACHE_MAX_BYTES, CACHE_TTL_SECONDS)
+    if backend == 'redis':
+        return RedisCache(CACHE_REDIS_URL, CACHE_TTL_SECONDS)
+    return None
+
+
+response_cache = make_response_cache(CACHE_BACKEND)
+
+
+def bump_data_version(*user_ids):
+    """Invalidate the users' cached responses. Runs in the caller's transaction."""
+    db.session.execute(
+        db.update(User).where(User.id.in_(set(user_ids) - {None})).values(data_version=User.data_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def cached_response(f):
+    """Decorator to serve a per-user GET view from the response cache.
+
+    Only 200 responses are stored. The X-Cache header says whether this one was.
+    Goes under @replica_reads, so the data_version in the key is read from the
+    database the body comes from, before the body: a lagging replica's response
+    is stored under the replica's older version, never the primary's.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if response_cache is None:
+            return f(*args, **kwargs)
+        # data_version is read from the database: the current_user snapshot may predate the last write
+        key = '|'.join([str(current_user.id), request.endpoint,
+                        json.dumps(sorted(request.args.items(multi=True))), str(user_data_stamp())])
+        body = response_cache.get(key)
+        if body is not None:
+            response = app.response_class(body, mimetype='application/json')
+            response.headers['X-Cache'] = 'HIT'
+            return response
+        response = app.make_response(f(*args, **kwargs))
+        if response.status_code == 200:
+            response_cache.set(key, response.get_data())
+        response.headers['X-Cache'] = 'MISS'
+        return response
+    return decorated_function
+
+
+# ========== Conditional Requests ==========
+# Workout, program and roster reads carry a strong ETag derived from version
+# stamps (Workout.revision, Program.revision, User.data_version) instead of a
+# hash of the body. The stamp is one indexed lookup, so a matching
+# If-None-Match gets its 304 without running the serialization queries.
+
+def bump_revision(model, *ids):
+    """Change the ETag of the given workouts or programs. Runs in the caller's transaction."""
+    db.session.execute(
+        db.update(model).where(model.id.in_(set(ids))).values(revision=model.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def etag_response(stamp):
+    """Decorator to answer a GET with 304 while the client's copy is current.
+
+    stamp(**view_args) returns the version stamps the response is built from,
+    or None to let the view answer (not found / access denied).
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            version = stamp(*args, **kwargs)
+            if version is None:
+                return f(*args, **kwargs)
+            key = json.dumps([request.endpoint, kwargs, sorted(request.args.items(multi=True)),
+                              current_user.id, version], default=str)
+            tag = hashlib.sha1(key.encode()).hexdigest()
+            if request.if_none_match.contains(tag):
+                response = app.response_class(status=304)
+            else:
+                response = app.make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(tag)
+            response.headers['Cache-Control'] = 'private, no-cache'  # Store, but revalidate every time
+            return response
+        return decorated_function
+    return decorator
+
+
+def user_data_stamp():
+    return db.session.query(User.data_version).filter_by(id=current_user.id).scalar()
+
+
+def workout_stamp(workout_id):
+    return db.session.query(Workout.revision).filter_by(id=workout_id, user_id=current_user.id).scalar()
+
+
+def program_stamp(program_id):
+    # Logs and their velocity sets belong to the athlete, so they are covered by the athlete's data_version
+    row = db.session.query(Program.revision, User.data_version).join(User, User.id == Program.athlete_id)\
+        .filter(Program.id == program_id,
+                db.or_(Program.athlete_id == current_user.id, Program.coach_id == current_user.id)).first()
+    if row is None:
+        return None
+    return [row.revision, row.data_version] if request.args.get('include_logs', 0, type=int) == 1 else row.revision
+
+
+def roster_stamp():
+    return [list(row) for row in db.session.query(User.id, User.data_version, User.last_login)
+            .filter_by(coach_id=current_user.id).order_by(User.id)]
+
+
+def athlete_stamp(athlete_id):
+    row = db.session.query(User.data_version, User.last_login)\
+        .filter_by(id=athlete_id, coach_id=current_user.id).first()
+    return list(row) if row else None
 
 
 def coach_required(f):
@@ -368,6 +2905,7 @@ def login():
         return redirect(url_for('tracker') if current_user.subscribed else url_for('subscribe'))
 
     if request.method == 'POST':
+        start = time.perf_counter()
         data = request.get_json()
         email = data.get('email', '').lower().strip()
         password = data.get('password', '')
@@ -380,7 +2918,10 @@ def login():
         if user and user.check_password(password):
             login_user(user, remember=True)
             user.last_login = datetime.utcnow()
+            if password_needs_rehash(user.password_hash):
+                user.set_password(password)  # Stored with older hashing parameters
             db.session.commit()
+            record_latency('login', time.perf_counter() - start)
 
             # Redirect coaches to coach dashboard
             if user.is_coach:
@@ -389,6 +2930,7 @@ def login():
                 redirect_url = url_for('dashboard') if user.subscribed else url_for('subscribe')
             return jsonify({'success': True, 'redirect': redirect_url})
         else:
+            record_latency('login', time.perf_counter() - start)
             return jsonify({'error': 'Invalid email or password'}), 401
 
     return render_template('login.html')
@@ -409,8 +2951,13 @@ def register():
         if len(password) < 8:
             return jsonify({'error': 'Password must be at least 8 characters'}), 400
         
-        # Check if user already exists
-        if User.query.filter_by(email=email).first():
+        # Check if user already exists, deleted accounts included: one not purged yet still holds the email
+        existing = User.query.filter_by(email=email).execution_options(include_deleted=True).first()
+        if existing and existing.deleted_at is not None:
+            request_purge()
+            return jsonify({'error': 'An account with this email was just deleted and is still being removed. '
+                                     'Please try again in a few minutes.'}), 400
+        if existing:
             return jsonify({'error': 'Email already registered'}), 400
         
         # Create new user
@@ -439,9 +2986,8 @@ def subscribe():
 
 @app.route('/tracker')
 @login_required
+@subscription_required
 def tracker():
-    if not current_user.subscribed:
-        return redirect(url_for('subscribe'))
     exercise_type = request.args.get('exercise', 'squat')
     valid_exercises = {
         'squat': 'Squat',
@@ -472,6 +3018,7 @@ def tracker():
 
 @app.route("/set_height", methods= ['POST'])
 @login_required
+@mutates_user
 def set_height():
     data = request.get_json()
     height = data.get('height')
@@ -480,6 +3027,7 @@ def set_height():
         return jsonify({'error': 'Valid height required'}), 400
     
     current_user.height = height
+    bump_data_version(current_user.id)
     db.session.commit()
     
     return jsonify({'success': True, 'height': current_user.height})
@@ -489,6 +3037,7 @@ def set_height():
 
 @app.route('/code', methods=['GET', 'POST'])
 @login_required
+@mutates_user
 def access_code():
     # If user is already subscribed and not a coach trying coach code, redirect
     if current_user.subscribed and current_user.is_coach:
@@ -527,6 +3076,7 @@ def access_code():
     # GET request - render the code page
     return render_template('code.html')
 @app.route('/setup-password', methods=['GET', 'POST'])
+@mutates_user
 def setup_password():
     # If user doesn't need password setup, redirect them
     if not current_user.needs_password_setup:
@@ -564,11 +3114,20 @@ def payment_success():
     
     try:
         # Retrieve the checkout session from Stripe to get customer email
-        checkout_session = stripe.checkout.Session.retrieve(session_id)
+        checkout_session = stripe_client.checkout.Session.retrieve(session_id)
         email = checkout_session['customer_details']['email'].lower()
         
         # Check if user exists
         user = User.query.filter_by(email=email).first()
+        if user is None:
+            # The webhook may still be queued behind others; apply it now
+            pending = StripeEvent.query.filter(
+                StripeEvent.type == 'checkout.session.completed',
+                StripeEvent.processed_at.is_(None),
+                StripeEvent.payload.contains(f'"{checkout_session["id"]}"')
+            ).first()
+            if pending is not None and run_stripe_event(pending):
+                user = User.query.filter_by(email=email).first()
         
         if user:
             # Check if they need to set up a password
@@ -580,7 +3139,10 @@ def payment_success():
                 return redirect(url_for('tracker'))
             else:
                 return redirect(url_for('login'))
-    except stripe.error.StripeError as e:
+        # Stripe hasn't told us about the payment yet
+        return render_template('payment_success.html', pending=True,
+                               message="Payment successful! We're finishing setting up your account...")
+    except stripe_client.error.StripeError as e:
         print(f"Error retrieving checkout session: {e}")
         return render_template('payment_success.html',
                              show_login=True,
@@ -592,7 +3154,7 @@ def stripe_webhook():
     sig_header = request.headers.get('Stripe-Signature')
     
     try:
-        event = stripe.Webhook.construct_event(
+        event = stripe_client.Webhook.construct_event(
             payload, 
             sig_header, 
             WEBHOOK_SECRET
@@ -600,91 +3162,28 @@ def stripe_webhook():
     except Exception as e:
         print(f"Webhook signature verification failed: {e}")
         return jsonify({'error': 'Invalid signature'}), 400
-    
+
+    # Stored and acknowledged right away; the queue worker does the work.
+    # Stripe redelivers until it gets a 2xx, so a known event id is a duplicate.
+    db.session.add(StripeEvent(id=event['id'], type=event['type'], payload=payload.decode()))
     try:
-        # Handle successful payment
-        if event['type'] == 'checkout.session.completed':
-            session_obj = event['data']['object']
-            email = session_obj['customer_details']['email'].lower()
-            customer_id = session_obj.get('customer')
-            
-            # Get subscription details
-            subscription_id = session_obj.get('subscription')
-            subscription_type = 'monthly'  # Default
-            
-            if subscription_id:
-                subscription = stripe.Subscription.retrieve(subscription_id)
-                # Determine if monthly or annual based on price
-                if subscription['items']['data']:
-                    price = subscription['items']['data'][0]['price']
-                    if price['recurring']['interval'] == 'year':
-                        subscription_type = 'annual'
-            
-            # Check if user exists
-            user = User.query.filter_by(email=email).first()
-            
-            if user:
-                # Existing user - just update subscription
-                user.subscribed = True
-                user.stripe_customer_id = customer_id
-                user.subscription_type = subscription_type
-                print(f"✅ Subscription activated for existing user {email} ({subscription_type})")
-            else:
-                # New user - create account with temporary password
-                user = User(
-                    email=email,
-                    subscribed=True,
-                    stripe_customer_id=customer_id,
-                    subscription_type=subscription_type,
-                    needs_password_setup=True  # Flag them to set password
-                )
-                # Set a temporary random password
-                user.set_password(os.urandom(24).hex())
-                db.session.add(user)
-                print(f"✅ New user created for {email} ({subscription_type}) - needs password setup")
-            
-            db.session.commit()
-            
-            # Update Stripe session to redirect to our success page with email
-            # Note: You'll need to configure this in your Stripe Payment Link settings
-            # or use the Stripe API to create sessions programmatically
-        
-        # Handle subscription cancellation
-        elif event['type'] == 'customer.subscription.deleted':
-            subscription = event['data']['object']
-            customer_id = subscription['customer']
-            
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
-            if user:
-                user.subscribed = False
-                user.subscription_end_date = datetime.utcnow()
-                db.session.commit()
-                print(f"✅ Subscription cancelled for {user.email}")
-        
-        # Handle subscription updates
-        elif event['type'] == 'customer.subscription.updated':
-            subscription = event['data']['object']
-            customer_id = subscription['customer']
-            
-            user = User.query.filter_by(stripe_customer_id=customer_id).first()
-            if user:
-                # Update subscription status based on current status
-                user.subscribed = subscription['status'] == 'active'
-                db.session.commit()
-                print(f"✅ Subscription updated for {user.email}")
-        
-        return jsonify({'success': True}), 200
-        
-    except Exception as e:
-        print(f"❌ Webhook error: {e}")
-        return jsonify({'error': str(e)}), 400
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': True, 'duplicate': True}), 200
+
+    request_stripe_processing()
+    return jsonify({'success': True}), 200
 
 @app.route('/api/subscription-status', methods=['GET'])
 @login_required
 def subscription_status():
+    # From the database: the cached snapshot can predate a cancellation applied by the jobs worker
+    subscribed, subscription_type = db.session.query(User.subscribed, User.subscription_type)\
+        .filter_by(id=current_user.id).one()
     return jsonify({
-        'subscribed': current_user.subscribed,
-        'subscription_type': current_user.subscription_type,
+        'subscribed': subscribed,
+        'subscription_type': subscription_type,
         'email': current_user.email
     })
 
@@ -693,37 +3192,82 @@ def subscription_status():
 
 @app.route('/dashboard')
 @login_required
+@subscription_required
 def dashboard():
-    if not current_user.subscribed:
-        return redirect(url_for('subscribe'))
     return render_template('dashboard.html')
 
 
 @app.route('/api/workouts', methods=['GET'])
 @login_required
+@replica_reads
+@etag_response(user_data_stamp)
 def get_workouts():
-    """Get all workouts for the current user"""
-    page = request.args.get('page', 1, type=int)
+    """Get all workouts for the current user.
+
+    Passing ?after=<created_at,id> (empty for the first page) switches to keyset
+    pagination, which stays constant-time at any depth; the total is then only
+    included with ?include_total=1 and comes from the user_stats rollup.
+    """
     per_page = request.args.get('per_page', 10, type=int)
 
+    if 'after' in request.args:
+        return get_workouts_after(request.args.get('after', ''), per_page)
+
+    page = request.args.get('page', 1, type=int)
     workouts = Workout.query.filter_by(user_id=current_user.id)\
         .order_by(Workout.created_at.desc())\
         .paginate(page=page, per_page=per_page, error_out=False)
 
     return jsonify({
         'success': True,
-        'workouts': [w.to_dict() for w in workouts.items],
+        'workouts': serialize_workouts(workouts.items),
         'total': workouts.total,
         'pages': workouts.pages,
         'current_page': page
     })
 
 
+def parse_cursor(cursor):
+    """Parse a '<created_at>,<id>' cursor; returns None for an empty cursor"""
+    if not cursor:
+        return None
+    created_at, _, workout_id = cursor.rpartition(',')
+    return datetime.fromisoformat(created_at), int(workout_id)
+
+
+def get_workouts_after(cursor, per_page):
+    try:
+        position = parse_cursor(cursor)
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+
+    per_page = max(1, min(per_page, 100))
+    query = Workout.query.filter_by(user_id=current_user.id)
+    if position:
+        query = query.filter(db.tuple_(Workout.created_at, Workout.id) < position)
+    workouts = query.order_by(Workout.created_at.desc(), Workout.id.desc())\
+        .limit(per_page + 1).all()
+
+    has_more = len(workouts) > per_page
+    workouts = workouts[:per_page]
+    result = {
+        'success': True,
+        'workouts': serialize_workouts(workouts),
+        'has_more': has_more,
+        'next_cursor': workouts[-1].history_cursor() if has_more else None
+    }
+    if request.args.get('include_total', type=int):
+        result['total'] = user_stats_for(current_user.id).total_workouts
+        db.session.commit()
+    return jsonify(result)
+
+
 @app.route('/api/workouts', methods=['POST'])
 @login_required
 def create_workout():
     """Create a new workout session"""
     data = request.get_json() or {}
+    stats = user_stats_for(current_user.id)
 
     workout = Workout(
         user_id=current_user.id,
@@ -732,6 +3276,8 @@ def create_workout():
         notes=data.get('notes')
     )
     db.session.add(workout)
+    stats.record(workouts=1)
+    bump_data_version(current_user.id)
     db.session.commit()
 
     print(f"✅ Workout created for {current_user.email}: {workout.name}")
@@ -740,6 +3286,8 @@ def create_workout():
 
 @app.route('/api/workouts/<int:workout_id>', methods=['GET'])
 @login_required
+@replica_reads
+@etag_response(workout_stamp)
 def get_workout(workout_id):
     """Get a specific workout with all sets and reps"""
     workout = Workout.query.filter_by(id=workout_id, user_id=current_user.id).first()
@@ -766,6 +3314,8 @@ def update_workout(workout_id):
     if data.get('complete'):
         workout.completed_at = datetime.utcnow()
 
+    bump_data_version(current_user.id)
+    bump_revision(Workout, workout.id)
     db.session.commit()
     return jsonify({'success': True, 'workout': workout.to_dict()})
 
@@ -778,8 +3328,22 @@ def delete_workout(workout_id):
     if not workout:
         return jsonify({'error': 'Workout not found'}), 404
 
-    db.session.delete(workout)
+    stats = user_stats_for(current_user.id)
+    if workout.archived_at is not None:
+        set_count, rep_count = workout.archived_set_count or 0, workout.archived_rep_count or 0
+    else:
+        set_count, rep_count = db.session.query(
+            db.func.count(Set.id), db.func.coalesce(db.func.sum(Set.reps_completed), 0)
+        ).filter(Set.workout_id == workout.id).one()
+
+    workout.deleted_at = datetime.utcnow()
+    db.session.flush()
+    stats.record(workouts=-1, sets=-set_count, reps=-int(rep_count))
+    if set_count:
+        stats.refresh_recent_sets()
+    bump_data_version(current_user.id)
     db.session.commit()
+    request_purge()
 
     print(f"✅ Workout deleted for {current_user.email}: {workout.name}")
     return jsonify({'success': True})
@@ -789,52 +3353,35 @@ def delete_workout(workout_id):
 @login_required
 def add_set(workout_id):
     """Add a completed set to a workout"""
-    workout = Workout.query.filter_by(id=workout_id, user_id=current_user.id).first()
+    # Locked until commit so concurrent adds take set numbers one after another
+    workout = Workout.query.filter_by(id=workout_id, user_id=current_user.id).with_for_update().first()
     if not workout:
         return jsonify({'error': 'Workout not found'}), 404
+    if workout.archived_at is not None:
+        return jsonify({'error': 'Workout is archived'}), 400
 
     data = request.get_json()
     if not data:
         return jsonify({'error': 'Set data required'}), 400
 
-    # Get the next set number
-    last_set = Set.query.filter_by(workout_id=workout_id).order_by(Set.set_number.desc()).first()
-    set_number = (last_set.set_number + 1) if last_set else 1
+    stats = user_stats_for(current_user.id)
 
     # Calculate metrics from reps data
     reps_data = data.get('reps', [])
-    velocities = [r.get('velocity') for r in reps_data if r.get('velocity')]
-    depths = [r.get('depth') for r in reps_data if r.get('depth')]
-
-    new_set = Set(
-        workout_id=workout_id,
-        set_number=set_number,
+    new_set, reps = insert_set_with_reps(workout_id, reps_data, dict(
+        rep_aggregates(reps_data),
         reps_completed=data.get('reps_completed', len(reps_data)),
-        avg_depth=sum(depths) / len(depths) if depths else None,
-        avg_velocity=sum(velocities) / len(velocities) if velocities else None,
-        min_velocity=min(velocities) if velocities else None,
-        max_velocity=max(velocities) if velocities else None,
         fatigue_drop=data.get('fatigue_drop')
-    )
-    db.session.add(new_set)
-    db.session.flush()  # Get the set ID
-
-    # Add individual reps
-    for i, rep_data in enumerate(reps_data):
-        rep = Rep(
-            set_id=new_set.id,
-            rep_number=i + 1,
-            depth=rep_data.get('depth'),
-            time_seconds=rep_data.get('time_seconds'),
-            velocity=rep_data.get('velocity'),
-            quality=rep_data.get('quality')
-        )
-        db.session.add(rep)
+    ))
 
+    stats.record(sets=1, reps=new_set.reps_completed or 0)
+    stats.push_recent_set(new_set)
+    bump_data_version(current_user.id)
+    bump_revision(Workout, workout.id)
     db.session.commit()
 
-    print(f"✅ Set {set_number} added to workout for {current_user.email}: {new_set.reps_completed} reps")
-    return jsonify({'success': True, 'set': new_set.to_dict()}), 201
+    print(f"✅ Set {new_set.set_number} added to workout for {current_user.email}: {new_set.reps_completed} reps")
+    return jsonify({'success': True, 'set': new_set.to_dict(reps=reps)}), 201
 
 
 @app.route('/api/workouts/<int:workout_id>/sets/<int:set_id>', methods=['DELETE'])
@@ -849,7 +3396,17 @@ def delete_set(workout_id, set_id):
     if not set_to_delete:
         return jsonify({'error': 'Set not found'}), 404
 
+    stats = user_stats_for(current_user.id)
+    was_recent = stats.has_recent_set(set_to_delete.id)
+
+    delete_subtree(Set, [set_to_delete.id])
     db.session.delete(set_to_delete)
+    db.session.flush()
+    stats.record(sets=-1, reps=-(set_to_delete.reps_completed or 0))
+    if was_recent:
+        stats.refresh_recent_sets()
+    bump_data_version(current_user.id)
+    bump_revision(Workout, workout.id)
     db.session.commit()
 
     return jsonify({'success': True})
@@ -857,11 +3414,14 @@ def delete_set(workout_id, set_id):
 
 @app.route('/api/workouts/current', methods=['GET'])
 @login_required
+@replica_reads
+@cached_response
 def get_current_workout():
     """Get the most recent incomplete workout, or create a new one"""
     workout = Workout.query.filter_by(
         user_id=current_user.id,
-        completed_at=None
+        completed_at=None,
+        archived_at=None
     ).order_by(Workout.created_at.desc()).first()
 
     if workout:
@@ -872,33 +3432,20 @@ def get_current_workout():
 
 @app.route('/api/stats', methods=['GET'])
 @login_required
+@replica_reads
+@cached_response
 def get_stats():
     """Get user's overall workout statistics"""
-    total_workouts = Workout.query.filter_by(user_id=current_user.id).count()
-    total_sets = db.session.query(Set).join(Workout).filter(Workout.user_id == current_user.id).count()
-    total_reps = db.session.query(db.func.sum(Set.reps_completed)).join(Workout).filter(Workout.user_id == current_user.id).scalar() or 0
-
-    # Get recent velocity trend (last 10 sets)
-    recent_sets = db.session.query(Set).join(Workout)\
-        .filter(Workout.user_id == current_user.id)\
-        .order_by(Set.created_at.desc())\
-        .limit(10).all()
-
-    avg_velocity = None
-    if recent_sets:
-        velocities = [s.avg_velocity for s in recent_sets if s.avg_velocity]
-        if velocities:
-            avg_velocity = sum(velocities) / len(velocities)
+    stats = db.session.get(UserStats, current_user.id)
+    if stats is None:
+        # No rollup row yet. This view may be on the replica, so compute it
+        # without storing it; the user's next write builds the row (user_stats_for)
+        values = compute_user_stats([current_user.id])[current_user.id]
+        stats = UserStats(user_id=current_user.id, total_workouts=values['total_workouts'],
+                          total_sets=values['total_sets'], total_reps=values['total_reps'])
+        stats.set_recent_sets(values['recent_sets'])
 
-    return jsonify({
-        'success': True,
-        'stats': {
-            'total_workouts': total_workouts,
-            'total_sets': total_sets,
-            'total_reps': total_reps,
-            'avg_velocity': round(avg_velocity) if avg_velocity else None
-        }
-    })
+    return jsonify({'success': True, 'stats': stats.to_dict()})
 
 
 # ========== Coach Dashboard & Routes ==========
@@ -915,41 +3462,82 @@ def coach_dashboard():
 @app.route('/api/coach/athletes', methods=['GET'])
 @login_required
 @coach_required
+@replica_reads
+@etag_response(roster_stamp)
 def get_coach_athletes():
     """Get all athletes assigned to this coach"""
-    athletes = User.query.filter_by(coach_id=current_user.id).all()
-    athlete_data = []
-    for athlete in athletes:
-        # Get athlete stats
-        total_workouts = Workout.query.filter_by(user_id=athlete.id).count()
-        total_sets = db.session.query(Set).join(Workout).filter(Workout.user_id == athlete.id).count()
-
-        # Recent velocity
-        recent_sets = db.session.query(Set).join(Workout)\
-            .filter(Workout.user_id == athlete.id)\
-            .order_by(Set.created_at.desc()).limit(5).all()
-        avg_velocity = None
-        if recent_sets:
-            velocities = [s.avg_velocity for s in recent_sets if s.avg_velocity]
-            if velocities:
-                avg_velocity = sum(velocities) / len(velocities)
-
-        athlete_data.append({
-            'id': athlete.id,
-            'email': athlete.email,
-            'name': athlete.get_display_name(),
-            'total_workouts': total_workouts,
-            'total_sets': total_sets,
-            'avg_velocity': round(avg_velocity) if avg_velocity else None,
-            'last_login': athlete.last_login.isoformat() if athlete.last_login else None
-        })
+    return jsonify({'success': True, 'athletes': coach_roster_stats(current_user.id)})
 
-    return jsonify({'success': True, 'athletes': athlete_data})
+
+def coach_roster_stats(coach_id, recent_sets=5):
+    """Aggregate workout/set totals and recent velocity for every athlete of a coach.
+
+    Runs as a single statement: per-athlete counts come from grouped subqueries and
+    the recent velocity from a ROW_NUMBER() window over each athlete's sets (Postgres,
+    and SQLite 3.25+).
+    """
+    workout_counts = db.session.query(
+        Workout.user_id.label('user_id'),
+        db.func.count(Workout.id).label('total_workouts'),
+        # Archived workouts' sets are in archived_workout, not the set table
+        db.func.sum(db.func.coalesce(Workout.archived_set_count, 0)).label('archived_sets')
+    ).join(User, User.id == Workout.user_id)\
+        .filter(User.coach_id == coach_id)\
+        .group_by(Workout.user_id).subquery()
+
+    set_counts = db.session.query(
+        Workout.user_id.label('user_id'),
+        db.func.count(Set.id).label('total_sets')
+    ).join(Set, Set.workout_id == Workout.id)\
+        .join(User, User.id == Workout.user_id)\
+        .filter(User.coach_id == coach_id)\
+        .group_by(Workout.user_id).subquery()
+
+    ranked_sets = db.session.query(
+        Workout.user_id.label('user_id'),
+        Set.avg_velocity.label('avg_velocity'),
+        db.func.row_number().over(
+            partition_by=Workout.user_id,
+            order_by=(Set.created_at.desc(), Set.id.desc())
+        ).label('position')
+    ).join(Set, Set.workout_id == Workout.id)\
+        .join(User, User.id == Workout.user_id)\
+        .filter(User.coach_id == coach_id).subquery()
+
+    recent_velocity = db.session.query(
+        ranked_sets.c.user_id,
+        db.func.avg(ranked_sets.c.avg_velocity).label('avg_velocity')
+    ).filter(ranked_sets.c.position <= recent_sets)\
+        .group_by(ranked_sets.c.user_id).subquery()
+
+    rows = db.session.query(
+        User,
+        workout_counts.c.total_workouts,
+        workout_counts.c.archived_sets,
+        set_counts.c.total_sets,
+        recent_velocity.c.avg_velocity
+    ).outerjoin(workout_counts, workout_counts.c.user_id == User.id)\
+        .outerjoin(set_counts, set_counts.c.user_id == User.id)\
+        .outerjoin(recent_velocity, recent_velocity.c.user_id == User.id)\
+        .filter(User.coach_id == coach_id)\
+        .order_by(User.id).all()
+
+    return [{
+        'id': athlete.id,
+        'email': athlete.email,
+        'name': athlete.get_display_name(),
+        'total_workouts': total_workouts or 0,
+        'total_sets': (total_sets or 0) + (archived_sets or 0),
+        'avg_velocity': round(avg_velocity) if avg_velocity else None,
+        'last_login': athlete.last_login.isoformat() if athlete.last_login else None
+    } for athlete, total_workouts, archived_sets, total_sets, avg_velocity in rows]
 
 
 @app.route('/api/coach/athletes/<int:athlete_id>', methods=['GET'])
 @login_required
 @coach_required
+@replica_reads
+@etag_response(athlete_stamp)
 def get_athlete_details(athlete_id):
     """Get detailed info for a specific athlete"""
     athlete = User.query.filter_by(id=athlete_id, coach_id=current_user.id).first()
@@ -974,7 +3562,7 @@ def get_athlete_details(athlete_id):
             'created_at': athlete.created_at.isoformat() if athlete.created_at else None,
             'last_login': athlete.last_login.isoformat() if athlete.last_login else None
         },
-        'workouts': [w.to_dict() for w in workouts],
+        'workouts': serialize_workouts(workouts),
         'programs': [p.to_dict(include_days=False) for p in programs]
     })
 
@@ -1002,6 +3590,7 @@ def add_athlete():
 
     athlete.coach_id = current_user.id
     db.session.commit()
+    forget_users(athlete.id)
 
     print(f"✅ Athlete {email} added to coach {current_user.email}")
     return jsonify({'success': True, 'message': f'{athlete.get_display_name()} added as athlete'})
@@ -1018,6 +3607,7 @@ def remove_athlete(athlete_id):
 
     athlete.coach_id = None
     db.session.commit()
+    forget_users(athlete.id)
 
     return jsonify({'success': True})
 
@@ -1143,6 +3733,7 @@ def process_join_invite(token):
         existing_user.subscribed = True
         existing_user.subscription_type = 'coach'
         db.session.commit()
+        forget_users(existing_user.id)
 
         # Update invite
         invite.status = 'accepted'
@@ -1187,6 +3778,8 @@ def programs_page():
 
 @app.route('/api/programs', methods=['GET'])
 @login_required
+@replica_reads
+@etag_response(user_data_stamp)
 def get_programs():
     """Get programs for the current user (as athlete or coach-created)"""
     if current_user.is_coach:
@@ -1233,6 +3826,7 @@ def create_program():
         )
 
     db.session.add(program)
+    bump_data_version(program.athlete_id, program.coach_id)  # Both see it in their program list
     db.session.commit()
 
     print(f"✅ Program '{program.name}' created by {current_user.email}")
@@ -1241,6 +3835,8 @@ def create_program():
 
 @app.route('/api/programs/<int:program_id>', methods=['GET'])
 @login_required
+@replica_reads
+@etag_response(program_stamp)
 def get_program(program_id):
     """Get a specific program with all details"""
     program = Program.query.get(program_id)
@@ -1251,7 +3847,8 @@ def get_program(program_id):
     if program.athlete_id != current_user.id and program.coach_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
 
-    return jsonify({'success': True, 'program': program.to_dict()})
+    include_logs = request.args.get('include_logs', 0, type=int) == 1
+    return jsonify({'success': True, 'program': program.to_dict(include_logs=include_logs)})
 
 
 @app.route('/api/programs/<int:program_id>', methods=['PUT'])
@@ -1276,6 +3873,8 @@ def update_program(program_id):
     if 'is_active' in data:
         program.is_active = data['is_active']
 
+    bump_data_version(program.athlete_id, program.coach_id)
+    bump_revision(Program, program.id)
     db.session.commit()
     return jsonify({'success': True, 'program': program.to_dict()})
 
@@ -1294,13 +3893,35 @@ def delete_program(program_id):
     if not program.coach_id and program.athlete_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
 
-    db.session.delete(program)
+    program.deleted_at = datetime.utcnow()
+    bump_data_version(program.athlete_id, program.coach_id)
     db.session.commit()
+    request_purge()
     return jsonify({'success': True})
 
 
 # ========== Program Day Routes ==========
 
+def program_access():
+    """Filter for live programs the current user is the athlete or coach of"""
+    return db.and_(Program.deleted_at.is_(None),
+                   db.or_(Program.athlete_id == current_user.id, Program.coach_id == current_user.id))
+
+
+def owned_program_day(day_id):
+    """(day, program) for a day of one of the current user's programs; None if it isn't theirs or was deleted"""
+    return db.session.query(ProgramDay, Program).join(Program, Program.id == ProgramDay.program_id)\
+        .filter(ProgramDay.id == day_id, program_access()).first()
+
+
+def owned_program_exercise(exercise_id):
+    """(exercise, program) for an exercise of one of the current user's programs; None like owned_program_day"""
+    return db.session.query(ProgramExercise, Program)\
+        .join(ProgramDay, ProgramDay.id == ProgramExercise.program_day_id)\
+        .join(Program, Program.id == ProgramDay.program_id)\
+        .filter(ProgramExercise.id == exercise_id, program_access()).first()
+
+
 @app.route('/api/programs/<int:program_id>/days', methods=['POST'])
 @login_required
 def add_program_day(program_id):
@@ -1327,6 +3948,7 @@ def add_program_day(program_id):
         notes=data.get('notes')
     )
     db.session.add(day)
+    bump_revision(Program, program.id)
     db.session.commit()
 
     return jsonify({'success': True, 'day': day.to_dict()}), 201
@@ -1336,11 +3958,11 @@ def add_program_day(program_id):
 @login_required
 def update_program_day(program_id, day_id):
     """Update a program day"""
-    day = ProgramDay.query.filter_by(id=day_id, program_id=program_id).first()
-    if not day:
+    owned = owned_program_day(day_id)
+    if not owned or owned[0].program_id != program_id:
         return jsonify({'error': 'Day not found'}), 404
 
-    program = day.program
+    day, program = owned
     can_edit = (program.coach_id == current_user.id) or \
                (not program.coach_id and program.athlete_id == current_user.id)
     if not can_edit:
@@ -1352,6 +3974,7 @@ def update_program_day(program_id, day_id):
     if 'notes' in data:
         day.notes = data['notes']
 
+    bump_revision(Program, program.id)
     db.session.commit()
     return jsonify({'success': True, 'day': day.to_dict()})
 
@@ -1360,17 +3983,20 @@ def update_program_day(program_id, day_id):
 @login_required
 def delete_program_day(program_id, day_id):
     """Delete a program day"""
-    day = ProgramDay.query.filter_by(id=day_id, program_id=program_id).first()
-    if not day:
+    owned = owned_program_day(day_id)
+    if not owned or owned[0].program_id != program_id:
         return jsonify({'error': 'Day not found'}), 404
 
-    program = day.program
+    day, program = owned
     can_edit = (program.coach_id == current_user.id) or \
                (not program.coach_id and program.athlete_id == current_user.id)
     if not can_edit:
         return jsonify({'error': 'Access denied'}), 403
 
+    delete_subtree(ProgramDay, [day.id])
     db.session.delete(day)
+    bump_data_version(program.athlete_id)
+    bump_revision(Program, program.id)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -1381,11 +4007,11 @@ def delete_program_day(program_id, day_id):
 @login_required
 def add_exercise(day_id):
     """Add an exercise to a program day"""
-    day = ProgramDay.query.get(day_id)
-    if not day:
+    owned = owned_program_day(day_id)
+    if not owned:
         return jsonify({'error': 'Day not found'}), 404
 
-    program = day.program
+    day, program = owned
     can_edit = (program.coach_id == current_user.id) or \
                (not program.coach_id and program.athlete_id == current_user.id)
     if not can_edit:
@@ -1412,6 +4038,7 @@ def add_exercise(day_id):
         exercise.video_url = data['video_url']
 
     db.session.add(exercise)
+    bump_revision(Program, program.id)
     db.session.commit()
 
     return jsonify({'success': True, 'exercise': exercise.to_dict()}), 201
@@ -1421,11 +4048,11 @@ def add_exercise(day_id):
 @login_required
 def update_exercise(exercise_id):
     """Update an exercise"""
-    exercise = ProgramExercise.query.get(exercise_id)
-    if not exercise:
+    owned = owned_program_exercise(exercise_id)
+    if not owned:
         return jsonify({'error': 'Exercise not found'}), 404
 
-    program = exercise.day.program
+    exercise, program = owned
     can_edit = (program.coach_id == current_user.id) or \
                (not program.coach_id and program.athlete_id == current_user.id)
     if not can_edit:
@@ -1440,6 +4067,8 @@ def update_exercise(exercise_id):
     if current_user.is_coach and 'video_url' in data:
         exercise.video_url = data['video_url']
 
+    bump_data_version(program.athlete_id)  # Exercise names key the lift stats
+    bump_revision(Program, program.id)
     db.session.commit()
     return jsonify({'success': True, 'exercise': exercise.to_dict()})
 
@@ -1448,17 +4077,20 @@ def update_exercise(exercise_id):
 @login_required
 def delete_exercise(exercise_id):
     """Delete an exercise"""
-    exercise = ProgramExercise.query.get(exercise_id)
-    if not exercise:
+    owned = owned_program_exercise(exercise_id)
+    if not owned:
         return jsonify({'error': 'Exercise not found'}), 404
 
-    program = exercise.day.program
+    exercise, program = owned
     can_edit = (program.coach_id == current_user.id) or \
                (not program.coach_id and program.athlete_id == current_user.id)
     if not can_edit:
         return jsonify({'error': 'Access denied'}), 403
 
+    delete_subtree(ProgramExercise, [exercise.id])
     db.session.delete(exercise)
+    bump_data_version(program.athlete_id)
+    bump_revision(Program, program.id)
     db.session.commit()
     return jsonify({'success': True})
 
@@ -1469,11 +4101,11 @@ def delete_exercise(exercise_id):
 @login_required
 def log_set(exercise_id):
     """Log a completed set for an exercise"""
-    exercise = ProgramExercise.query.get(exercise_id)
-    if not exercise:
+    owned = owned_program_exercise(exercise_id)
+    if not owned:
         return jsonify({'error': 'Exercise not found'}), 404
 
-    program = exercise.day.program
+    exercise, program = owned
     # Only the athlete can log sets
     if program.athlete_id != current_user.id:
         return jsonify({'error': 'Only the athlete can log sets'}), 403
@@ -1500,6 +4132,7 @@ def log_set(exercise_id):
         workout_set_id=data.get('workout_set_id')
     )
     db.session.add(log)
+    bump_data_version(current_user.id)
     db.session.commit()
 
     return jsonify({'success': True, 'log': log.to_dict()}), 201
@@ -1521,6 +4154,7 @@ def update_set_log(exercise_id, log_id):
         if field in data:
             setattr(log, field, data[field])
 
+    bump_data_version(current_user.id)
     db.session.commit()
     return jsonify({'success': True, 'log': log.to_dict()})
 
@@ -1537,78 +4171,93 @@ def delete_set_log(exercise_id, log_id):
         return jsonify({'error': 'Access denied'}), 403
 
     db.session.delete(log)
+    bump_data_version(current_user.id)
     db.session.commit()
     return jsonify({'success': True})
 
 
 @app.route('/api/exercises/<int:exercise_id>/logs', methods=['GET'])
 @login_required
+@replica_reads
 def get_exercise_logs(exercise_id):
-    """Get all logs for an exercise"""
-    exercise = ProgramExercise.query.get(exercise_id)
-    if not exercise:
+    """Get logs for an exercise, newest first.
+
+    Returns at most ?limit= logs (default 50, max 200); pass the returned
+    next_cursor back as ?after= to fetch the next page.
+    """
+    owned = owned_program_exercise(exercise_id)
+    if not owned:
         return jsonify({'error': 'Exercise not found'}), 404
 
-    program = exercise.day.program
-    # Check access
-    if program.athlete_id != current_user.id and program.coach_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    try:
+        position = parse_cursor(request.args.get('after', ''))
+    except ValueError:
+        return jsonify({'error': 'Invalid cursor'}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
 
     # Filter by user if athlete, show all if coach
-    if current_user.is_coach:
-        logs = ProgramSetLog.query.filter_by(program_exercise_id=exercise_id)\
-            .order_by(ProgramSetLog.created_at.desc()).all()
-    else:
-        logs = ProgramSetLog.query.filter_by(
-            program_exercise_id=exercise_id,
-            user_id=current_user.id
-        ).order_by(ProgramSetLog.created_at.desc()).all()
-
-    return jsonify({'success': True, 'logs': [l.to_dict() for l in logs]})
+    query = ProgramSetLog.query.filter_by(program_exercise_id=exercise_id)
+    if not current_user.is_coach:
+        query = query.filter_by(user_id=current_user.id)
+    if position:
+        query = query.filter(db.tuple_(ProgramSetLog.created_at, ProgramSetLog.id) < position)
+    logs = query.order_by(ProgramSetLog.created_at.desc(), ProgramSetLog.id.desc())\
+        .limit(limit + 1).all()
+
+    has_more = len(logs) > limit
+    logs = logs[:limit]
+    return jsonify({
+        'success': True,
+        'logs': serialize_set_logs(logs),
+        'has_more': has_more,
+        'next_cursor': f"{logs[-1].created_at.isoformat()},{logs[-1].id}" if has_more else None
+    })
 
 
 # ========== Velocity Tracked Set Management ==========
 
+def owned_set(set_id):
+    """(set, workout) for one of the current user's sets; None if it isn't theirs or its workout was deleted"""
+    return db.session.query(Set, Workout).join(Workout, Workout.id == Set.workout_id)\
+        .filter(Set.id == set_id, Workout.user_id == current_user.id, Workout.deleted_at.is_(None)).first()
+
+
 @app.route('/api/sets/<int:set_id>/reps', methods=['POST'])
 @login_required
 def add_rep_to_set(set_id):
     """Add a rep to an existing set (non-velocity)"""
-    workout_set = Set.query.get(set_id)
-    if not workout_set:
+    row = owned_set(set_id)
+    if not row:
         return jsonify({'error': 'Set not found'}), 404
-
-    workout = workout_set.workout
-    if workout.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
+    workout_set, workout = row
 
     data = request.get_json()
-
-    # Get next rep number
-    last_rep = Rep.query.filter_by(set_id=set_id).order_by(Rep.rep_number.desc()).first()
-    rep_number = (last_rep.rep_number + 1) if last_rep else 1
+    stats = user_stats_for(workout.user_id)
 
     # Add rep without velocity (velocity must come from tracker)
-    rep = Rep(
-        set_id=set_id,
-        rep_number=rep_number,
-        depth=data.get('depth'),
-        quality=data.get('quality')
-        # Note: time_seconds and velocity are NOT settable manually
-    )
-    db.session.add(rep)
+    if workout_set.rep_data is not None:
+        if data.get('quality') not in REP_QUALITY_CODES:
+            return jsonify({'error': 'Unsupported rep quality'}), 400
+        rep_id = next_packed_rep_id(workout_set.rep_data)
+        rep = PackedRep(rep_id, (workout_set.rep_count or 0) + 1, data.get('depth'), None, None, data.get('quality'))
+        workout_set.rep_data = pack_reps(unpack_reps(workout_set.rep_data) + [rep], next_id=rep_id + 1)
+    else:
+        rep = Rep(
+            set_id=set_id,
+            rep_number=(workout_set.rep_count or 0) + 1,
+            depth=data.get('depth'),
+            quality=data.get('quality')
+            # Note: time_seconds and velocity are NOT settable manually
+        )
+        db.session.add(rep)
 
     # Update set stats
-    workout_set.reps_completed = workout_set.reps.count() + 1
-    db.session.commit()
-
-    # Recalculate averages
-    reps = workout_set.reps.all()
-    depths = [r.depth for r in reps if r.depth]
-    velocities = [r.velocity for r in reps if r.velocity]
-    workout_set.avg_depth = sum(depths) / len(depths) if depths else None
-    workout_set.avg_velocity = sum(velocities) / len(velocities) if velocities else None
-    workout_set.min_velocity = min(velocities) if velocities else None
-    workout_set.max_velocity = max(velocities) if velocities else None
+    workout_set.append_rep(rep)
+    workout_set.reps_completed = (workout_set.reps_completed or 0) + 1
+    stats.record(reps=1)
+    stats.update_recent_set(workout_set)
+    bump_data_version(workout.user_id)
+    bump_revision(Workout, workout.id)
     db.session.commit()
 
     return jsonify({'success': True, 'rep': rep.to_dict(), 'set': workout_set.to_dict()}), 201
@@ -1618,55 +4267,48 @@ def add_rep_to_set(set_id):
 @login_required
 def delete_rep_from_set(set_id, rep_id):
     """Delete a rep from a set"""
-    workout_set = Set.query.get(set_id)
-    if not workout_set:
+    row = owned_set(set_id)
+    if not row:
         return jsonify({'error': 'Set not found'}), 404
-
-    workout = workout_set.workout
-    if workout.user_id != current_user.id:
-        return jsonify({'error': 'Access denied'}), 403
-
-    rep = Rep.query.filter_by(id=rep_id, set_id=set_id).first()
-    if not rep:
-        return jsonify({'error': 'Rep not found'}), 404
-
-    db.session.delete(rep)
-
-    # Update set stats
-    workout_set.reps_completed = max(0, workout_set.reps_completed - 1)
-    db.session.commit()
-
-    # Recalculate averages and renumber reps
-    reps = workout_set.reps.all()
-    if reps:
-        # Renumber reps sequentially after deletion
-        for i, r in enumerate(reps):
-            r.rep_number = i + 1
-
-        depths = [r.depth for r in reps if r.depth]
-        velocities = [r.velocity for r in reps if r.velocity]
-        workout_set.avg_depth = sum(depths) / len(depths) if depths else None
-        workout_set.avg_velocity = sum(velocities) / len(velocities) if velocities else None
-        workout_set.min_velocity = min(velocities) if velocities else None
-        workout_set.max_velocity = max(velocities) if velocities else None
-
-        # Recalculate fatigue drop
-        if len(velocities) >= 2:
-            first_velocity = reps[0].velocity
-            last_velocity = reps[-1].velocity
-            if first_velocity and last_velocity and first_velocity > 0:
-                workout_set.fatigue_drop = round(((first_velocity - last_velocity) / first_velocity) * 100, 1)
-            else:
-                workout_set.fatigue_drop = None
-        else:
-            workout_set.fatigue_drop = None
+    workout_set, workout = row
+
+    if workout_set.rep_data is not None:
+        # The reps after it move up a position but keep their ids
+        packed = unpack_reps(workout_set.rep_data)
+        rep = next((r for r in packed if r.id == rep_id), None)
+        if rep is None:
+            return jsonify({'error': 'Rep not found'}), 404
+        packed.remove(rep)
+        workout_set.rep_data = pack_reps(packed, next_id=next_packed_rep_id(workout_set.rep_data))
     else:
-        workout_set.avg_depth = None
-        workout_set.avg_velocity = None
-        workout_set.min_velocity = None
-        workout_set.max_velocity = None
-        workout_set.fatigue_drop = None
+        rep = Rep.query.filter_by(id=rep_id, set_id=set_id).first()
+        if not rep:
+            return jsonify({'error': 'Rep not found'}), 404
+
+    stats = user_stats_for(workout.user_id)
+    previous_reps = workout_set.reps_completed or 0
+
+    if isinstance(rep, Rep):
+        db.session.delete(rep)
+        db.session.flush()
+
+        # Renumber the following reps in one statement
+        db.session.execute(
+            db.update(Rep)
+            .where(Rep.set_id == set_id, Rep.rep_number > rep.rep_number)
+            .values(rep_number=Rep.rep_number - 1)
+            .execution_options(synchronize_session=False)
+        )
 
+    # Update set stats
+    if workout_set.remove_rep(rep):
+        workout_set.reload_velocity_bounds()
+    workout_set.refresh_fatigue_drop()
+    workout_set.reps_completed = max(0, previous_reps - 1)
+    stats.record(reps=workout_set.reps_completed - previous_reps)
+    stats.update_recent_set(workout_set)
+    bump_data_version(workout.user_id)
+    bump_revision(Workout, workout.id)
     db.session.commit()
 
     return jsonify({'success': True, 'set': workout_set.to_dict()})
@@ -1676,6 +4318,8 @@ def delete_rep_from_set(set_id, rep_id):
 
 @app.route('/api/dashboard/metrics', methods=['GET'])
 @login_required
+@replica_reads
+@cached_response
 def get_dashboard_metrics():
     """Get customizable dashboard metrics for the user"""
     metrics = current_user.get_dashboard_metrics()
@@ -1703,6 +4347,7 @@ def get_dashboard_metrics():
 
 @app.route('/api/dashboard/metrics', methods=['PUT'])
 @login_required
+@mutates_user
 def update_dashboard_metrics():
     """Update the user's dashboard metrics selection"""
     data = request.get_json()
@@ -1717,6 +4362,7 @@ def update_dashboard_metrics():
         return jsonify({'error': 'Maximum 6 metrics allowed'}), 400
 
     current_user.set_dashboard_metrics(metrics)
+    bump_data_version(current_user.id)
     db.session.commit()
 
     return jsonify({'success': True, 'metrics': current_user.get_dashboard_metrics()})
@@ -1724,40 +4370,21 @@ def update_dashboard_metrics():
 
 @app.route('/api/dashboard/lift-stats', methods=['GET'])
 @login_required
+@replica_reads
+@cached_response
 def get_lift_stats():
     """Get comprehensive lift statistics for dashboard"""
     stats = {}
 
-    # Get all exercises the user has logged
-    exercise_names = db.session.query(ProgramExercise.name)\
-        .join(ProgramSetLog, ProgramExercise.id == ProgramSetLog.program_exercise_id)\
-        .filter(ProgramSetLog.user_id == current_user.id)\
-        .distinct().all()
-
-    for (name,) in exercise_names:
-        # Get logs for this exercise
-        logs = ProgramSetLog.query.join(ProgramExercise)\
-            .filter(
-                ProgramExercise.name == name,
-                ProgramSetLog.user_id == current_user.id
-            ).order_by(ProgramSetLog.created_at.desc()).all()
-
-        if logs:
-            weights = [l.weight for l in logs if l.weight]
-            velocities = []
-            for l in logs:
-                if l.velocity_tracked and l.workout_set:
-                    if l.workout_set.avg_velocity:
-                        velocities.append(l.workout_set.avg_velocity)
-
-            stats[name.lower()] = {
-                'name': name,
-                'total_sets': len(logs),
-                'max_weight': max(weights) if weights else None,
-                'recent_weight': weights[0] if weights else None,
-                'avg_velocity': round(sum(velocities) / len(velocities)) if velocities else None,
-                'last_logged': logs[0].created_at.isoformat() if logs else None
-            }
+    for row in lift_stats_rows(current_user.id):
+        stats[row.name.lower()] = {
+            'name': row.name,
+            'total_sets': row.total_sets,
+            'max_weight': row.max_weight,
+            'recent_weight': row.recent_weight,
+            'avg_velocity': round(row.avg_velocity) if row.avg_velocity else None,
+            'last_logged': row.last_logged.isoformat() if row.last_logged else None
+        }
 
     # Add squat velocity from workouts if not in programs
     if 'squat' not in stats:
@@ -1779,8 +4406,57 @@ def get_lift_stats():
     return jsonify({'success': True, 'stats': stats})
 
 
+def lift_stats_rows(user_id):
+    """Per-exercise log aggregates for a user, grouped by exercise name in one statement.
+
+    Each row has name, total_sets, max_weight, recent_weight (latest non-empty
+    weight), avg_velocity (mean of the linked sets' avg_velocity) and last_logged.
+    """
+    has_weight = db.and_(ProgramSetLog.weight.isnot(None), ProgramSetLog.weight != 0)
+
+    ranked_weights = db.session.query(
+        ProgramExercise.name.label('name'),
+        ProgramSetLog.weight.label('weight'),
+        db.func.row_number().over(
+            partition_by=ProgramExercise.name,
+            order_by=(ProgramSetLog.created_at.desc(), ProgramSetLog.id.desc())
+        ).label('position')
+    ).join(ProgramSetLog, ProgramExercise.id == ProgramSetLog.program_exercise_id)\
+        .filter(ProgramSetLog.user_id == user_id, has_weight).subquery()
+
+    recent_weights = db.session.query(ranked_weights.c.name, ranked_weights.c.weight)\
+        .filter(ranked_weights.c.position == 1).subquery()
+
+    tracked_velocity = db.case(
+        (db.and_(ProgramSetLog.velocity_tracked.is_(True), Set.avg_velocity != 0), Set.avg_velocity),
+        else_=None
+    )
+
+    totals = db.session.query(
+        ProgramExercise.name.label('name'),
+        db.func.count(ProgramSetLog.id).label('total_sets'),
+        db.func.max(db.case((has_weight, ProgramSetLog.weight), else_=None)).label('max_weight'),
+        db.func.avg(tracked_velocity).label('avg_velocity'),
+        db.func.max(ProgramSetLog.created_at).label('last_logged')
+    ).join(ProgramSetLog, ProgramExercise.id == ProgramSetLog.program_exercise_id)\
+        .outerjoin(Set, Set.id == ProgramSetLog.workout_set_id)\
+        .filter(ProgramSetLog.user_id == user_id)\
+        .group_by(ProgramExercise.name).subquery()
+
+    return db.session.query(
+        totals.c.name,
+        totals.c.total_sets,
+        totals.c.max_weight,
+        recent_weights.c.weight.label('recent_weight'),
+        totals.c.avg_velocity,
+        totals.c.last_logged
+    ).outerjoin(recent_weights, recent_weights.c.name == totals.c.name)\
+        .order_by(totals.c.name).all()
+
+
 @app.route('/api/user/profile', methods=['PUT'])
 @login_required
+@mutates_user
 def update_profile():
     """Update user profile"""
     data = request.get_json()
@@ -1790,6 +4466,7 @@ def update_profile():
     if 'height' in data:
         current_user.height = data['height']
 
+    bump_data_version(current_user.id)  # Name and height show in the coach's views
     db.session.commit()
     return jsonify({
         'success': True,
@@ -1808,5 +4485,10 @@ def run_tests():
     return app.send_static_file('tests/test-runner.html')
 
 
+init_app()
+
+
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    with app.app_context():
+        db.create_all()  # Local development; deployments run `flask db upgrade`
+    app.run(debug=True)
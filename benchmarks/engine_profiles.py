@@ -0,0 +1,113 @@
+"""Throughput of the set-saving and dashboard endpoints under each engine profile.
+
+Each profile runs in its own process (the engine is configured at import) against
+a fresh database, with several threads hammering the endpoints concurrently:
+
+    python benchmarks/engine_profiles.py                      # SQLite: default vs sqlite
+    python benchmarks/engine_profiles.py --database-url postgresql://... \\
+        --profiles default,postgres,pgbouncer
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DASHBOARD_URLS = ['/api/stats', '/api/workouts?after=&per_page=10', '/api/dashboard/lift-stats',
+                  '/api/workouts/current']
+
+
+def run_profile(threads, iterations):
+    """Runs inside the child process; prints one JSON result line"""
+    sys.path.insert(0, ROOT)
+    from app import app, db, User
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        users = []
+        for i in range(threads):
+            user = User(email=f'bench{i}@example.com', subscribed=True, password_hash='x')
+            db.session.add(user)
+            users.append(user)
+        db.session.commit()
+        user_ids = [u.id for u in users]
+
+    reps = [{'depth': 16.0, 'time_seconds': 0.8, 'velocity': 500 - i, 'quality': 'parallel'} for i in range(8)]
+    timings = {'set_saves': [], 'dashboard': []}
+    errors = []
+    lock = threading.Lock()
+
+    def worker(user_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user_id)
+        workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+        saves, reads, failed = [], [], 0
+        for _ in range(iterations):
+            start = time.perf_counter()
+            response = client.post(f'/api/workouts/{workout_id}/sets', json={'reps': reps})
+            saves.append(time.perf_counter() - start)
+            failed += response.status_code >= 500
+            for url in DASHBOARD_URLS:
+                start = time.perf_counter()
+                response = client.get(url)
+                reads.append(time.perf_counter() - start)
+                failed += response.status_code >= 500
+        with lock:
+            timings['set_saves'].extend(saves)
+            timings['dashboard'].extend(reads)
+            errors.append(failed)
+
+    pool = [threading.Thread(target=worker, args=(user_id,)) for user_id in user_ids]
+    started = time.perf_counter()
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    print(json.dumps({
+        'elapsed': elapsed,
+        'set_saves_per_sec': len(timings['set_saves']) / sum(timings['set_saves']) * threads,
+        'dashboard_per_sec': len(timings['dashboard']) / sum(timings['dashboard']) * threads,
+        'requests_per_sec': (len(timings['set_saves']) + len(timings['dashboard'])) / elapsed,
+        'errors': sum(errors)
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file per profile')
+    parser.add_argument('--profiles', default='default,sqlite')
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args.threads, args.iterations)
+        return
+
+    print(f"{'profile':<10} {'set saves/s':>12} {'dashboard/s':>12} {'total req/s':>12} {'errors':>7}")
+    for profile in args.profiles.split(','):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_PROFILE=profile, GUNICORN_THREADS=str(args.threads),
+                       RATE_LIMIT_BACKEND='none',
+                       DATABASE_URL=args.database_url or f'sqlite:///{tmp}/bench.db')
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', '--threads', str(args.threads),
+                 '--iterations', str(args.iterations)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{profile:<10} {result['set_saves_per_sec']:>12.1f} {result['dashboard_per_sec']:>12.1f} "
+              f"{result['requests_per_sec']:>12.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""Load-test gunicorn configurations against the dashboard's real endpoints.
+
+Seeds a database with one athlete's history, then for each configuration
+starts gunicorn, logs in one session per client thread and cycles through the
+endpoints the dashboard polls for a fixed time:
+
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --configs sync auto --concurrency 32 --duration 30
+    python benchmarks/load_test.py --database-url postgresql://...
+
+'sync' is the previous Dockerfile command (one sync worker), 'auto' is
+gunicorn.conf.py as deployed and 'gevent' is gunicorn.conf.py with
+GUNICORN_WORKER_CLASS=gevent (needs gevent installed).
+"""
+import argparse
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EMAIL, PASSWORD = 'load@example.com', 'password123'
+ENDPOINTS = [
+    '/api/workouts/current',
+    '/api/stats',
+    '/api/workouts?per_page=10',
+    '/api/dashboard/metrics',
+    '/api/dashboard/lift-stats',
+    '/api/programs',
+]
+CONFIGS = {
+    'sync': (['--bind', '{bind}', 'app:app'], {}),
+    'auto': (['--config', os.path.join(ROOT, 'gunicorn.conf.py'), '--bind', '{bind}', 'app:app'], {}),
+    'gevent': (['--config', os.path.join(ROOT, 'gunicorn.conf.py'), '--bind', '{bind}', 'app:app'],
+               {'GUNICORN_WORKER_CLASS': 'gevent'}),
+}
+
+
+def seed(workouts, sets_per_workout, reps_per_set):
+    sys.path.insert(0, ROOT)
+    from app import app, db, User, Workout, insert_set_with_reps, rep_aggregates
+
+    rng = random.Random(1)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(email=EMAIL, subscribed=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.commit()
+        for _ in range(workouts):
+            workout = Workout(user_id=user.id)
+            db.session.add(workout)
+            db.session.flush()
+            for _ in range(sets_per_workout):
+                reps = [{'depth': round(rng.uniform(10, 20), 1), 'time_seconds': round(rng.uniform(0.6, 1.4), 2),
+                         'velocity': rng.randint(300, 700), 'quality': 'parallel'} for _ in range(reps_per_set)]
+                insert_set_with_reps(workout.id, reps, dict(rep_aggregates(reps), reps_completed=len(reps)))
+        db.session.commit()
+
+
+def wait_for(url, process, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError('gunicorn exited during startup')
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f'{url} did not come up')
+
+
+def client_loop(base_url, stop_at, latencies, errors):
+    http = requests.Session()
+    http.post(f'{base_url}/login', json={'email': EMAIL, 'password': PASSWORD}).raise_for_status()
+    position = random.randrange(len(ENDPOINTS))
+    while time.monotonic() < stop_at:
+        endpoint = ENDPOINTS[position % len(ENDPOINTS)]
+        position += 1
+        start = time.perf_counter()
+        try:
+            ok = http.get(base_url + endpoint, timeout=30).status_code == 200
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(endpoint)
+
+
+def run_config(name, env, port, concurrency, duration):
+    args, extra_env = CONFIGS[name]
+    bind = f'127.0.0.1:{port}'
+    base_url = f'http://{bind}'
+    # Started outside the repo so plain `gunicorn` doesn't pick up gunicorn.conf.py on its own
+    with tempfile.TemporaryDirectory() as cwd:
+        process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--chdir', ROOT] + [a.format(bind=bind) for a in args],
+            cwd=cwd, env=dict(env, **extra_env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            wait_for(f'{base_url}/login', process)
+            latencies, errors = [], []
+            stop_at = time.monotonic() + duration
+            clients = [threading.Thread(target=client_loop, args=(base_url, stop_at, latencies, errors))
+                       for _ in range(concurrency)]
+            for client in clients:
+                client.start()
+            for client in clients:
+                client.join()
+        finally:
+            process.terminate()
+            process.wait()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {'rps': len(latencies) / duration, 'p50': quantiles[49] * 1000, 'p95': quantiles[94] * 1000,
+            'p99': quantiles[98] * 1000, 'errors': len(errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--configs', nargs='+', default=['sync', 'auto'], choices=sorted(CONFIGS))
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file')
+    parser.add_argument('--concurrency', type=int, default=16, help='Client threads')
+    parser.add_argument('--duration', type=float, default=15, help='Seconds per configuration')
+    parser.add_argument('--port', type=int, default=8181)
+    parser.add_argument('--workouts', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=args.database_url or f'sqlite:///{tmp}/load.db',
+                   PURGE_IN_BACKGROUND='0', STRIPE_EVENTS_IN_BACKGROUND='0',
+                   RATE_LIMIT_BACKEND='none')  # One user on every thread would only measure 429s
+        os.environ.update(env)
+        seed(args.workouts, sets_per_workout=5, reps_per_set=8)
+
+        print(f"{'config':<8} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'errors':>7}")
+        for name in args.configs:
+            result = run_config(name, env, args.port, args.concurrency, args.duration)
+            print(f"{name:<8} {result['rps']:>8.0f} {result['p50']:>8.1f} {result['p95']:>8.1f} "
+                  f"{result['p99']:>8.1f} {result['errors']:>7}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Cost of one admission decision, with several worker processes sharing the buckets.
+
+Each process stands in for a gunicorn worker and takes tokens for a mix of
+users and one expensive endpoint as fast as it can:
+
+    python benchmarks/rate_limit.py
+    python benchmarks/rate_limit.py --processes 4 --decisions 20000
+
+'memory' keeps buckets per process (nothing shared); 'sqlite' is the deployed
+store, one file on /dev/shm shared by every process.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_worker(decisions, users):
+    """Runs inside the child process; prints one JSON result line"""
+    sys.path.insert(0, ROOT)
+    import app as app_module
+
+    buckets = app_module.rate_limit_buckets
+    charges = [[(f'user:{n}', 1, 1e6, 1e6)] for n in range(users)]
+    charges[0].append(('endpoint:get_lift_stats', 10, 1e6, 1e6))  # Every so often, an expensive one
+    buckets.take(charges[0], time.time())  # Opens the connection
+    latencies = []
+    start = time.perf_counter()
+    for i in range(decisions):
+        before = time.perf_counter()
+        buckets.take(charges[i % users], time.time())
+        latencies.append(time.perf_counter() - before)
+    elapsed = time.perf_counter() - start
+    quantiles = statistics.quantiles(latencies, n=100)
+    print(json.dumps({'per_sec': decisions / elapsed, 'p50_us': quantiles[49] * 1e6, 'p99_us': quantiles[98] * 1e6}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=3)
+    parser.add_argument('--decisions', type=int, default=10000, help='Per process')
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_worker(args.decisions, args.users)
+        return
+
+    print(f"{'backend':<8} {'processes':>9} {'decisions/s':>12} {'p50 us':>7} {'p99 us':>7}")
+    for backend in ('memory', 'sqlite'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, RATE_LIMIT_BACKEND=backend, RATE_LIMIT_STORE=f'{tmp}/rate-limits.db',
+                       DATABASE_URL=f'sqlite:///{tmp}/bench.db')
+            children = [subprocess.Popen([sys.executable, __file__, '--child', '--decisions', str(args.decisions),
+                                          '--users', str(args.users)], env=env, stdout=subprocess.PIPE, text=True)
+                        for _ in range(args.processes)]
+            results = [json.loads(child.communicate()[0].strip().splitlines()[-1]) for child in children]
+        print(f"{backend:<8} {args.processes:>9} {sum(r['per_sec'] for r in results):>12,.0f} "
+              f"{statistics.median(r['p50_us'] for r in results):>7.1f} {max(r['p99_us'] for r in results):>7.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Storage size and read time of Rep rows vs packed rep storage.
+
+Each mode runs in its own process against a fresh database, saves the same
+workouts, then times serializing the whole history the way /api/workouts does:
+
+    python benchmarks/rep_storage.py
+    python benchmarks/rep_storage.py --database-url postgresql://... --workouts 2000
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+QUALITIES = ['deep', 'parallel', 'half', 'shallow']
+
+
+def storage_bytes(conn):
+    """On-disk size of the set and rep tables including their indexes"""
+    if conn.dialect.name == 'postgresql':
+        return conn.exec_driver_sql("SELECT pg_total_relation_size('set') + pg_total_relation_size('rep')").scalar()
+    # SQLite: whole file after VACUUM; the user and workout rows are identical in both modes
+    conn.exec_driver_sql('VACUUM')
+    return conn.exec_driver_sql('PRAGMA page_size').scalar() * conn.exec_driver_sql('PRAGMA page_count').scalar()
+
+
+def run_mode(workouts, sets_per_workout, reps_per_set, reads):
+    """Runs inside the child process; prints one JSON result line"""
+    sys.path.insert(0, ROOT)
+    from app import app, db, User, Workout, insert_set_with_reps, rep_aggregates, serialize_workouts
+
+    rng = random.Random(1)
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(email='bench@example.com', subscribed=True, password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+
+        for _ in range(workouts):
+            workout = Workout(user_id=user.id)
+            db.session.add(workout)
+            db.session.flush()
+            for _ in range(sets_per_workout):
+                reps = [{'depth': round(rng.uniform(10, 20), 1), 'time_seconds': round(rng.uniform(0.6, 1.4), 2),
+                         'velocity': rng.randint(300, 700), 'quality': rng.choice(QUALITIES)}
+                        for _ in range(reps_per_set)]
+                insert_set_with_reps(workout.id, reps, dict(rep_aggregates(reps), reps_completed=len(reps)))
+        db.session.commit()
+
+        with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+            size = storage_bytes(conn)
+
+        history = Workout.query.filter_by(user_id=user.id).order_by(Workout.created_at.desc()).all()
+        timings = []
+        for _ in range(reads):
+            db.session.expire_all()
+            start = time.perf_counter()
+            serialize_workouts(history)
+            timings.append(time.perf_counter() - start)
+
+    print(json.dumps({'bytes': size, 'read_ms': min(timings) * 1000}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file per mode')
+    parser.add_argument('--workouts', type=int, default=500)
+    parser.add_argument('--sets-per-workout', type=int, default=5)
+    parser.add_argument('--reps-per-set', type=int, default=8)
+    parser.add_argument('--reads', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.workouts, args.sets_per_workout, args.reps_per_set, args.reads)
+        return
+
+    results = {}
+    print(f"{'storage':<8} {'bytes':>14} {'history read ms':>16}")
+    for mode in ('rows', 'packed'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, REP_STORAGE=mode,
+                       DATABASE_URL=args.database_url or f'sqlite:///{tmp}/bench.db')
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', '--workouts', str(args.workouts),
+                 '--sets-per-workout', str(args.sets_per_workout), '--reps-per-set', str(args.reps_per_set),
+                 '--reads', str(args.reads)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+        print(f"{mode:<8} {results[mode]['bytes']:>14,} {results[mode]['read_ms']:>16.1f}")
+
+    print(f"packed uses {results['packed']['bytes'] / results['rows']['bytes']:.0%} of the storage "
+          f"and reads in {results['packed']['read_ms'] / results['rows']['read_ms']:.0%} of the time")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Cold-start cost of the app: import time, first request, and import side effects.
+
+Each run is a fresh interpreter, as a machine waking from auto-stop would be:
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --max-import-ms 1000 --max-first-request-ms 1500
+
+With a budget it exits non-zero when the median goes over it, and always when
+importing the app opens a database connection or loads a module that should
+only load on first use (tests/test_startup.py runs it this way).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY_MODULES = ['stripe', 'alembic', 'flask_migrate']  # Only needed by webhooks/payments and `flask db`
+
+
+def run_once():
+    """Runs inside the child process; prints one JSON result line"""
+    import time
+    start = time.perf_counter()
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    connections = []
+    event.listen(Engine, 'connect', lambda dbapi_connection, record: connections.append(1))
+
+    sys.path.insert(0, ROOT)
+    from app import app
+    imported = time.perf_counter()
+
+    response = app.test_client().get('/login')
+    assert response.status_code == 200
+    first_request = time.perf_counter()
+
+    print(json.dumps({
+        'import_ms': (imported - start) * 1000,
+        'first_request_ms': (first_request - start) * 1000,
+        'connections_at_import': len(connections),
+        'lazy_modules_loaded': [m for m in LAZY_MODULES if m in sys.modules],
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-import-ms', type=float, help='Fail when the median import time is above this')
+    parser.add_argument('--max-first-request-ms', type=float, help='Fail when the median time to the first response is above this')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_once()
+        return
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f'sqlite:///{tmp}/startup.db')
+        for _ in range(args.runs):
+            output = subprocess.run([sys.executable, __file__, '--child'], env=env, cwd=tmp,
+                                    capture_output=True, text=True, check=True).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+
+    import_ms = statistics.median(r['import_ms'] for r in results)
+    first_request_ms = statistics.median(r['first_request_ms'] for r in results)
+    connections = max(r['connections_at_import'] for r in results)
+    lazy_loaded = sorted({m for r in results for m in r['lazy_modules_loaded']})
+    print(f"import {import_ms:.0f} ms, first response {first_request_ms:.0f} ms (median of {args.runs}), "
+          f"{connections} connections at import, eagerly loaded: {', '.join(lazy_loaded) or 'none'}")
+
+    failures = []
+    if connections:
+        failures.append('importing the app connected to the database')
+    if lazy_loaded:
+        failures.append(f"importing the app loaded {', '.join(lazy_loaded)}")
+    if args.max_import_ms and import_ms > args.max_import_ms:
+        failures.append(f'import took {import_ms:.0f} ms (budget {args.max_import_ms:.0f} ms)')
+    if args.max_first_request_ms and first_request_ms > args.max_first_request_ms:
+        failures.append(f'first response took {first_request_ms:.0f} ms (budget {args.max_first_request_ms:.0f} ms)')
+    for failure in failures:
+        print(f"❌ Cold start regressed: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""Requests/sec of authenticated polling with and without the user cache.
+
+Each mode runs in its own process against a fresh database and drives the
+endpoints the dashboards poll through Flask's test client, so the numbers
+exclude network and WSGI server overhead:
+
+    python benchmarks/user_loader.py
+    python benchmarks/user_loader.py --database-url postgresql://... --requests 5000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ENDPOINTS = ['/api/subscription-status', '/api/stats', '/api/workouts/current']
+
+
+def run_mode(requests):
+    """Runs inside the child process; prints one JSON result line"""
+    sys.path.insert(0, ROOT)
+    from app import app, db, User
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        user = User(email='bench@example.com', subscribed=True, password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['_user_id'] = str(user_id)
+        sess['_fresh'] = True
+
+    results = {}
+    for endpoint in ENDPOINTS:
+        client.get(endpoint)  # Warm up
+        start = time.perf_counter()
+        for _ in range(requests):
+            assert client.get(endpoint).status_code == 200
+        results[endpoint] = requests / (time.perf_counter() - start)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Defaults to a fresh SQLite file per mode')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_mode(args.requests)
+        return
+
+    results = {}
+    for mode, ttl in (('uncached', '0'), ('cached', '30')):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, USER_CACHE_TTL_SECONDS=ttl, CACHE_BACKEND='none', RATE_LIMIT_BACKEND='none',
+                       DATABASE_URL=args.database_url or f'sqlite:///{tmp}/bench.db')
+            output = subprocess.run(
+                [sys.executable, __file__, '--child', '--requests', str(args.requests)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    print(f"{'endpoint':<28} {'uncached req/s':>15} {'cached req/s':>13} {'speedup':>8}")
+    for endpoint in ENDPOINTS:
+        before, after = results['uncached'][endpoint], results['cached'][endpoint]
+        print(f"{endpoint:<28} {before:>15,.0f} {after:>13,.0f} {after / before:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
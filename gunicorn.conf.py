@@ -0,0 +1,121 @@
+"""Gunicorn settings for production, sized from the machine's CPU and memory.
+
+    gunicorn --config gunicorn.conf.py app:app
+
+Every choice can be pinned with an environment variable: WEB_CONCURRENCY
+(workers), GUNICORN_THREADS, GUNICORN_WORKER_CLASS ('gthread' or 'gevent'),
+GUNICORN_TIMEOUT and GUNICORN_KEEPALIVE. The chosen worker and thread counts
+are exported back to the environment before the app is imported, so
+engine_options() splits the database connection budget to match.
+"""
+import os
+
+PORT = os.getenv('PORT', '8080')
+WORKER_MEMORY_MB = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', 120))  # RSS of one warmed-up worker
+RESERVED_MEMORY_MB = int(os.getenv('GUNICORN_RESERVED_MEMORY_MB', 256))  # Master, background threads, page cache
+HASH_PROCESS_MEMORY_MB = 30  # Interpreter of a password hashing process, before scrypt's buffer
+
+
+def read_first_line(path):
+    try:
+        with open(path) as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def available_cpus():
+    """CPUs this container may use: the cgroup quota if set, else the affinity mask"""
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+    quota = read_first_line('/sys/fs/cgroup/cpu.max')  # cgroup v2: "<quota> <period>" or "max <period>"
+    if quota and not quota.startswith('max'):
+        limit, period = (int(n) for n in quota.split())
+        cpus = min(cpus, max(1, limit // period))
+    return cpus
+
+
+def available_memory_mb():
+    """Memory this container may use: the cgroup limit if set, else MemTotal"""
+    limit = read_first_line('/sys/fs/cgroup/memory.max')
+    if limit and limit.isdigit():
+        return int(limit) // (1024 * 1024)
+    meminfo = read_first_line('/proc/meminfo')  # "MemTotal:  1015812 kB"
+    if meminfo and meminfo.startswith('MemTotal'):
+        return int(meminfo.split()[1]) // 1024
+    return 1024
+
+
+def password_hash_memory_mb():
+    """Peak RSS of one worker's password hashing processes (see app.run_kdf)"""
+    if os.getenv('PASSWORD_HASH_IN_POOL', '1') != '1':
+        return 0
+    name, *params = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1').split(':')
+    buffer_mb = 0
+    if name == 'scrypt':
+        n, r, p = (int(x) for x in params) if params else (2 ** 15, 8, 1)
+        buffer_mb = 128 * n * r * p // (1024 * 1024)
+    return int(os.getenv('PASSWORD_HASH_WORKERS', 1)) * (HASH_PROCESS_MEMORY_MB + buffer_mb)
+
+
+def pick_worker_class():
+    """gthread unless gevent is asked for and installed.
+
+    Requests mostly wait on the database and Stripe, which threads handle
+    without monkeypatching. psycopg2 blocks the whole gevent hub unless
+    psycogreen is set up, so gevent is opt-in rather than detected.
+    """
+    requested = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+    if requested == 'gevent':
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print("❌ GUNICORN_WORKER_CLASS=gevent but gevent is not installed; using gthread")
+            return 'gthread'
+    return requested
+
+
+cpus = available_cpus()
+memory_mb = available_memory_mb()
+
+worker_class = pick_worker_class()
+# Against Postgres a request spends much of its time waiting on the network, so
+# the usual 2 x CPUs + 1 keeps the CPU busy. SQLite queries run on this CPU,
+# where extra processes only contend (see benchmarks/load_test.py); threads
+# still cover slow clients. Either way, only as many as memory allows.
+network_database = not os.getenv('DATABASE_URL', 'sqlite').startswith('sqlite')
+by_cpu = 2 * cpus + 1 if network_database else cpus
+# Each worker also spawns its own password hashing process
+by_memory = (memory_mb - RESERVED_MEMORY_MB) // (WORKER_MEMORY_MB + password_hash_memory_mb())
+workers = int(os.getenv('WEB_CONCURRENCY', max(1, min(by_cpu, by_memory))))
+if worker_class == 'gevent':
+    worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 100))
+    threads = 1
+else:
+    threads = int(os.getenv('GUNICORN_THREADS', 4))
+os.environ['WEB_CONCURRENCY'] = str(workers)
+os.environ['GUNICORN_THREADS'] = str(worker_connections if worker_class == 'gevent' else threads)
+
+bind = f'0.0.0.0:{PORT}'
+# Load the app once in the master so workers fork with it already imported;
+# post_fork drops the database connections they would otherwise share
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))  # Above DB_STATEMENT_TIMEOUT_MS (15s)
+graceful_timeout = 30
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 75))  # Longer than the proxy's, so the proxy closes idle connections
+max_requests = 2000  # Recycle workers to bound slow memory growth
+max_requests_jitter = 200
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None  # Heartbeat file off the container's overlay disk
+accesslog = '-'
+
+
+def post_fork(server, worker):
+    from app import db, app
+    with app.app_context():
+        for engine in db.engines.values():
+            # close=False leaves the master's sockets alone; the worker opens its own
+            engine.dispose(close=False)
+
+
+def when_ready(server):
+    print(f"✅ Gunicorn: {workers} {worker_class} workers x {threads} threads "
+          f"({cpus} CPU, {memory_mb} MB)")
@@ -0,0 +1,180 @@
+"""initial schema
+
+Revision ID: 3f1c9a7d2b10
+Revises: 
+Create Date: 2026-10-19 09:12:44.310512
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b10'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Databases created before migrations were introduced already have these
+    # tables (from db.create_all), so only create what is missing.
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if 'user' not in existing:
+        op.create_table('user',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('password_hash', sa.String(length=255), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=True),
+            sa.Column('subscribed', sa.Boolean(), nullable=True),
+            sa.Column('stripe_customer_id', sa.String(length=255), nullable=True),
+            sa.Column('subscription_type', sa.String(length=50), nullable=True),
+            sa.Column('subscription_end_date', sa.DateTime(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('last_login', sa.DateTime(), nullable=True),
+            sa.Column('height', sa.Integer(), nullable=True),
+            sa.Column('needs_password_setup', sa.Boolean(), nullable=True),
+            sa.Column('is_coach', sa.Boolean(), nullable=True),
+            sa.Column('coach_id', sa.Integer(), nullable=True),
+            sa.Column('dashboard_metrics', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['coach_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+        op.create_index('ix_user_email', 'user', ['email'], unique=True)
+
+    if 'workout' not in existing:
+        op.create_table('workout',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=True),
+            sa.Column('exercise_type', sa.String(length=50), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'set' not in existing:
+        op.create_table('set',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('workout_id', sa.Integer(), nullable=False),
+            sa.Column('set_number', sa.Integer(), nullable=False),
+            sa.Column('reps_completed', sa.Integer(), nullable=True),
+            sa.Column('avg_depth', sa.Float(), nullable=True),
+            sa.Column('avg_velocity', sa.Float(), nullable=True),
+            sa.Column('min_velocity', sa.Float(), nullable=True),
+            sa.Column('max_velocity', sa.Float(), nullable=True),
+            sa.Column('fatigue_drop', sa.Float(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['workout_id'], ['workout.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'rep' not in existing:
+        op.create_table('rep',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('set_id', sa.Integer(), nullable=False),
+            sa.Column('rep_number', sa.Integer(), nullable=False),
+            sa.Column('depth', sa.Float(), nullable=True),
+            sa.Column('time_seconds', sa.Float(), nullable=True),
+            sa.Column('velocity', sa.Float(), nullable=True),
+            sa.Column('quality', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['set_id'], ['set.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'program' not in existing:
+        op.create_table('program',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('coach_id', sa.Integer(), nullable=True),
+            sa.Column('athlete_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=200), nullable=False),
+            sa.Column('description', sa.Text(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('start_date', sa.DateTime(), nullable=True),
+            sa.Column('end_date', sa.DateTime(), nullable=True),
+            sa.Column('is_active', sa.Boolean(), nullable=True),
+            sa.ForeignKeyConstraint(['athlete_id'], ['user.id'], ),
+            sa.ForeignKeyConstraint(['coach_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'program_day' not in existing:
+        op.create_table('program_day',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('program_id', sa.Integer(), nullable=False),
+            sa.Column('day_number', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.ForeignKeyConstraint(['program_id'], ['program.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'program_exercise' not in existing:
+        op.create_table('program_exercise',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('program_day_id', sa.Integer(), nullable=False),
+            sa.Column('name', sa.String(length=100), nullable=False),
+            sa.Column('video_url', sa.String(length=500), nullable=True),
+            sa.Column('sets_prescribed', sa.Integer(), nullable=True),
+            sa.Column('reps_prescribed', sa.String(length=50), nullable=True),
+            sa.Column('weight_prescribed', sa.String(length=100), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('order', sa.Integer(), nullable=True),
+            sa.Column('exercise_type', sa.String(length=50), nullable=True),
+            sa.ForeignKeyConstraint(['program_day_id'], ['program_day.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'program_set_log' not in existing:
+        op.create_table('program_set_log',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('program_exercise_id', sa.Integer(), nullable=False),
+            sa.Column('user_id', sa.Integer(), nullable=False),
+            sa.Column('set_number', sa.Integer(), nullable=False),
+            sa.Column('reps_completed', sa.Integer(), nullable=True),
+            sa.Column('weight', sa.Float(), nullable=True),
+            sa.Column('weight_unit', sa.String(length=10), nullable=True),
+            sa.Column('rpe', sa.Float(), nullable=True),
+            sa.Column('notes', sa.Text(), nullable=True),
+            sa.Column('velocity_tracked', sa.Boolean(), nullable=True),
+            sa.Column('workout_set_id', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('completed_at', sa.DateTime(), nullable=True),
+            sa.ForeignKeyConstraint(['program_exercise_id'], ['program_exercise.id'], ),
+            sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+            sa.ForeignKeyConstraint(['workout_set_id'], ['set.id'], ),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    if 'coach_invite' not in existing:
+        op.create_table('coach_invite',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('coach_id', sa.Integer(), nullable=False),
+            sa.Column('email', sa.String(length=120), nullable=False),
+            sa.Column('token', sa.String(length=64), nullable=False),
+            sa.Column('status', sa.String(length=20), nullable=True),
+            sa.Column('created_at', sa.DateTime(), nullable=True),
+            sa.Column('accepted_at', sa.DateTime(), nullable=True),
+            sa.Column('athlete_id', sa.Integer(), nullable=True),
+            sa.ForeignKeyConstraint(['athlete_id'], ['user.id'], ),
+            sa.ForeignKeyConstraint(['coach_id'], ['user.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+            sa.UniqueConstraint('token')
+        )
+
+
+def downgrade():
+    op.drop_table('coach_invite')
+    op.drop_table('program_set_log')
+    op.drop_table('program_exercise')
+    op.drop_table('program_day')
+    op.drop_table('program')
+    op.drop_table('rep')
+    op.drop_table('set')
+    op.drop_table('workout')
+    op.drop_index('ix_user_email', table_name='user')
+    op.drop_table('user')
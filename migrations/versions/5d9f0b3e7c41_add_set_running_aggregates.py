@@ -0,0 +1,63 @@
+"""add running rep aggregates to set
+
+Revision ID: 5d9f0b3e7c41
+Revises: c4a7e91b5d28
+Create Date: 2026-10-19 11:02:15.927301
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9f0b3e7c41'
+down_revision = 'c4a7e91b5d28'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    sa.Column('rep_count', sa.Integer(), nullable=True),
+    sa.Column('depth_sum', sa.Float(), nullable=True),
+    sa.Column('depth_count', sa.Integer(), nullable=True),
+    sa.Column('velocity_sum', sa.Float(), nullable=True),
+    sa.Column('velocity_count', sa.Integer(), nullable=True),
+    sa.Column('first_velocity', sa.Float(), nullable=True),
+    sa.Column('last_velocity', sa.Float(), nullable=True),
+]
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('set')}
+    with op.batch_alter_table('set') as batch_op:
+        for column in COLUMNS:
+            if column.name not in existing:
+                batch_op.add_column(column.copy())
+
+    # Backfill from the rep table with correlated subqueries
+    set_t = sa.table('set', sa.column('id'), *[sa.column(c.name) for c in COLUMNS])
+    rep = sa.table('rep', sa.column('set_id'), sa.column('rep_number'),
+                   sa.column('depth'), sa.column('velocity'))
+    of_set = rep.c.set_id == set_t.c.id
+    has_depth = sa.and_(of_set, rep.c.depth.isnot(None), rep.c.depth != 0)
+    has_velocity = sa.and_(of_set, rep.c.velocity.isnot(None), rep.c.velocity != 0)
+
+    def scalar(expr, where):
+        return sa.select(expr).where(where).scalar_subquery()
+
+    op.execute(set_t.update().values(
+        rep_count=scalar(sa.func.count(), of_set),
+        depth_sum=scalar(sa.func.coalesce(sa.func.sum(rep.c.depth), 0), has_depth),
+        depth_count=scalar(sa.func.count(), has_depth),
+        velocity_sum=scalar(sa.func.coalesce(sa.func.sum(rep.c.velocity), 0), has_velocity),
+        velocity_count=scalar(sa.func.count(), has_velocity),
+        first_velocity=scalar(rep.c.velocity, sa.and_(of_set, rep.c.rep_number == 1)),
+        last_velocity=sa.select(rep.c.velocity).where(of_set)
+            .order_by(rep.c.rep_number.desc()).limit(1).scalar_subquery()
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table('set') as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
@@ -0,0 +1,73 @@
+"""add soft delete columns and ON DELETE actions on foreign keys
+
+Revision ID: 7c3e5a9d1b62
+Revises: 9a4d2f8c6e15
+Create Date: 2026-10-19 16:48:03.771520
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e5a9d1b62'
+down_revision = '9a4d2f8c6e15'
+branch_labels = None
+depends_on = None
+
+
+SOFT_DELETE_TABLES = ['user', 'workout', 'program']
+
+# (table, column, referred table, ON DELETE action)
+FOREIGN_KEYS = [
+    ('user', 'coach_id', 'user', 'SET NULL'),
+    ('workout', 'user_id', 'user', 'CASCADE'),
+    ('set', 'workout_id', 'workout', 'CASCADE'),
+    ('rep', 'set_id', 'set', 'CASCADE'),
+    ('program', 'coach_id', 'user', 'SET NULL'),
+    ('program', 'athlete_id', 'user', 'CASCADE'),
+    ('program_day', 'program_id', 'program', 'CASCADE'),
+    ('program_exercise', 'program_day_id', 'program_day', 'CASCADE'),
+    ('program_set_log', 'program_exercise_id', 'program_exercise', 'CASCADE'),
+    ('program_set_log', 'user_id', 'user', 'CASCADE'),
+    ('program_set_log', 'workout_set_id', 'set', 'SET NULL'),
+    ('coach_invite', 'coach_id', 'user', 'CASCADE'),
+    ('coach_invite', 'athlete_id', 'user', 'SET NULL'),
+    ('user_stats', 'user_id', 'user', 'CASCADE'),
+]
+
+
+def set_ondelete(actions):
+    # SQLite can only change a foreign key by rebuilding the table, and the app
+    # doesn't rely on it there (no foreign key enforcement), so Postgres only.
+    # Keys missing on partitioned tables (see `flask partitions enable`) are skipped.
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    inspector = sa.inspect(bind)
+    for table, column, referred, ondelete in actions:
+        for fk in inspector.get_foreign_keys(table):
+            if fk['constrained_columns'] == [column] and fk['referred_table'] == referred:
+                op.drop_constraint(fk['name'], table, type_='foreignkey')
+                op.create_foreign_key(fk['name'], table, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in SOFT_DELETE_TABLES:
+        if 'deleted_at' not in {c['name'] for c in inspector.get_columns(table)}:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('deleted_at', sa.DateTime(), nullable=True))
+        # Partial index: the purge looks up the few deleted rows
+        op.create_index(f'ix_{table}_deleted_at', table, ['deleted_at'], if_not_exists=True,
+                        postgresql_where=sa.text('deleted_at IS NOT NULL'),
+                        sqlite_where=sa.text('deleted_at IS NOT NULL'))
+    set_ondelete(FOREIGN_KEYS)
+
+
+def downgrade():
+    set_ondelete([(table, column, referred, None) for table, column, referred, _ in FOREIGN_KEYS])
+    for table in reversed(SOFT_DELETE_TABLES):
+        op.drop_index(f'ix_{table}_deleted_at', table_name=table, if_exists=True)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('deleted_at')
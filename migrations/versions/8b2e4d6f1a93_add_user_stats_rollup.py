@@ -0,0 +1,36 @@
+"""add user_stats rollup
+
+Revision ID: 8b2e4d6f1a93
+Revises: 3f1c9a7d2b10
+Create Date: 2026-10-19 09:14:02.118774
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b2e4d6f1a93'
+down_revision = '3f1c9a7d2b10'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('user_stats'):
+        return
+    op.create_table('user_stats',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('total_workouts', sa.Integer(), nullable=False),
+        sa.Column('total_sets', sa.Integer(), nullable=False),
+        sa.Column('total_reps', sa.Integer(), nullable=False),
+        sa.Column('recent_sets', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+        sa.PrimaryKeyConstraint('user_id')
+    )
+    # Rows are built lazily on first read; run `flask stats rebuild` to backfill
+
+
+def downgrade():
+    op.drop_table('user_stats')
@@ -0,0 +1,47 @@
+"""add archive summary columns to workout and the archived_workout table
+
+Revision ID: 9a4d2f8c6e15
+Revises: e2b8c6a41f07
+Create Date: 2026-10-19 15:12:37.504219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9a4d2f8c6e15'
+down_revision = 'e2b8c6a41f07'
+branch_labels = None
+depends_on = None
+
+
+COLUMNS = [
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_set_count', sa.Integer(), nullable=True),
+    sa.Column('archived_rep_count', sa.Integer(), nullable=True),
+]
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    existing = {c['name'] for c in inspector.get_columns('workout')}
+    with op.batch_alter_table('workout') as batch_op:
+        for column in COLUMNS:
+            if column.name not in existing:
+                batch_op.add_column(column.copy())
+    if not inspector.has_table('archived_workout'):
+        op.create_table(
+            'archived_workout',
+            sa.Column('workout_id', sa.Integer(), nullable=False),
+            sa.Column('data', sa.LargeBinary(), nullable=False),
+            sa.ForeignKeyConstraint(['workout_id'], ['workout.id'], ondelete='CASCADE'),
+            sa.PrimaryKeyConstraint('workout_id'),
+        )
+
+
+def downgrade():
+    op.drop_table('archived_workout')
+    with op.batch_alter_table('workout') as batch_op:
+        for column in reversed(COLUMNS):
+            batch_op.drop_column(column.name)
@@ -0,0 +1,50 @@
+"""add job table for background jobs
+
+Revision ID: a6c2e8f4d391
+Revises: f3b7e2a9c150
+Create Date: 2026-10-19 22:41:07.518302
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6c2e8f4d391'
+down_revision = 'f3b7e2a9c150'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('job'):
+        return
+    op.create_table(
+        'job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('args', sa.Text(), nullable=False, server_default='{}'),
+        sa.Column('every_seconds', sa.Integer(), nullable=True),
+        sa.Column('run_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('runs', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('total_ms', sa.Float(), nullable=False, server_default='0'),
+        sa.Column('last_ms', sa.Float(), nullable=True),
+        sa.Column('max_ms', sa.Float(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_job_due', 'job', ['run_at'],
+                    postgresql_where=sa.text('run_at IS NOT NULL'),
+                    sqlite_where=sa.text('run_at IS NOT NULL'))
+    op.create_index('ux_job_recurring_name', 'job', ['name'], unique=True,
+                    postgresql_where=sa.text('every_seconds IS NOT NULL'),
+                    sqlite_where=sa.text('every_seconds IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ux_job_recurring_name', table_name='job')
+    op.drop_index('ix_job_due', table_name='job')
+    op.drop_table('job')
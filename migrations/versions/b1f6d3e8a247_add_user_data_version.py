@@ -0,0 +1,28 @@
+"""add data_version to user for the response cache
+
+Revision ID: b1f6d3e8a247
+Revises: 7c3e5a9d1b62
+Create Date: 2026-10-19 18:05:44.390127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b1f6d3e8a247'
+down_revision = '7c3e5a9d1b62'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'data_version' not in existing:
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.add_column(sa.Column('data_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('data_version')
@@ -0,0 +1,67 @@
+"""add composite indexes for hot API queries
+
+Revision ID: c4a7e91b5d28
+Revises: 8b2e4d6f1a93
+Create Date: 2026-10-19 09:31:57.604219
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e91b5d28'
+down_revision = '8b2e4d6f1a93'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('ix_user_stripe_customer_id', 'user', ['stripe_customer_id']),
+    ('ix_user_coach_id', 'user', ['coach_id']),
+    ('ix_workout_user_created_id', 'workout', ['user_id', 'created_at', 'id']),
+    ('ix_rep_set_number', 'rep', ['set_id', 'rep_number']),
+    ('ix_program_athlete_created', 'program', ['athlete_id', 'created_at']),
+    ('ix_program_coach_created', 'program', ['coach_id', 'created_at']),
+    ('ix_program_day_program_number', 'program_day', ['program_id', 'day_number']),
+    ('ix_program_exercise_day_order', 'program_exercise', ['program_day_id', 'order']),
+    ('ix_program_set_log_user_exercise_created', 'program_set_log', ['user_id', 'program_exercise_id', 'created_at']),
+    ('ix_program_set_log_exercise_created', 'program_set_log', ['program_exercise_id', 'created_at']),
+    ('ix_program_set_log_workout_set', 'program_set_log', ['workout_set_id']),
+    ('ix_coach_invite_coach_email_status', 'coach_invite', ['coach_id', 'email', 'status']),
+    ('ix_coach_invite_coach_created', 'coach_invite', ['coach_id', 'created_at']),
+]
+
+set_table = sa.table('set', sa.column('id', sa.Integer), sa.column('workout_id', sa.Integer),
+                     sa.column('set_number', sa.Integer), sa.column('created_at', sa.DateTime))
+
+
+def renumber_duplicate_sets(conn):
+    """Number the sets of workouts with a repeated set_number 1..n in their current order"""
+    duplicated = conn.execute(
+        sa.select(set_table.c.workout_id).group_by(set_table.c.workout_id, set_table.c.set_number)
+        .having(sa.func.count() > 1).distinct()
+    ).scalars().all()
+    for workout_id in duplicated:
+        set_ids = conn.execute(
+            sa.select(set_table.c.id).where(set_table.c.workout_id == workout_id)
+            .order_by(set_table.c.set_number, set_table.c.created_at, set_table.c.id)
+        ).scalars().all()
+        for number, set_id in enumerate(set_ids, 1):
+            conn.execute(set_table.update().where(set_table.c.id == set_id).values(set_number=number))
+
+
+def upgrade():
+    # db.create_all() may already have built these on fresh databases
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+    # Unique, so concurrent set inserts can't share a number; add_set used to look
+    # the number up before inserting, so existing data may need renumbering first
+    renumber_duplicate_sets(op.get_bind())
+    op.create_index('ux_set_workout_number', 'set', ['workout_id', 'set_number'], unique=True, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ux_set_workout_number', table_name='set', if_exists=True)
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,32 @@
+"""add revision to workout and program for ETags
+
+Revision ID: d8a1c5f3e924
+Revises: b1f6d3e8a247
+Create Date: 2026-10-19 19:12:08.511203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a1c5f3e924'
+down_revision = 'b1f6d3e8a247'
+branch_labels = None
+depends_on = None
+
+TABLES = ('workout', 'program')
+
+
+def upgrade():
+    inspector = sa.inspect(op.get_bind())
+    for table in TABLES:
+        if 'revision' not in {c['name'] for c in inspector.get_columns(table)}:
+            with op.batch_alter_table(table) as batch_op:
+                batch_op.add_column(sa.Column('revision', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    for table in TABLES:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('revision')
@@ -0,0 +1,30 @@
+"""add packed rep storage to set
+
+Revision ID: e2b8c6a41f07
+Revises: 5d9f0b3e7c41
+Create Date: 2026-10-19 13:40:52.118406
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2b8c6a41f07'
+down_revision = '5d9f0b3e7c41'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Existing sets keep their Rep rows; convert them with `flask reps pack`
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('set')}
+    if 'rep_data' not in existing:
+        with op.batch_alter_table('set') as batch_op:
+            batch_op.add_column(sa.Column('rep_data', sa.LargeBinary(), nullable=True))
+
+
+def downgrade():
+    # Run `flask reps unpack` first or packed reps are lost
+    with op.batch_alter_table('set') as batch_op:
+        batch_op.drop_column('rep_data')
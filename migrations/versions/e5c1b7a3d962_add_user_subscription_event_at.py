@@ -0,0 +1,28 @@
+"""add subscription_event_at to user to order Stripe events
+
+Revision ID: e5c1b7a3d962
+Revises: a6c2e8f4d391
+Create Date: 2026-10-20 00:41:26.738015
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e5c1b7a3d962'
+down_revision = 'a6c2e8f4d391'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = {c['name'] for c in sa.inspect(op.get_bind()).get_columns('user')}
+    if 'subscription_event_at' not in existing:
+        with op.batch_alter_table('user') as batch_op:
+            batch_op.add_column(sa.Column('subscription_event_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('user') as batch_op:
+        batch_op.drop_column('subscription_event_at')
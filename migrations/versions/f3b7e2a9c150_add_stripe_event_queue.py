@@ -0,0 +1,41 @@
+"""add stripe_event queue for webhook processing
+
+Revision ID: f3b7e2a9c150
+Revises: d8a1c5f3e924
+Create Date: 2026-10-19 20:03:51.274610
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3b7e2a9c150'
+down_revision = 'd8a1c5f3e924'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if sa.inspect(op.get_bind()).has_table('stripe_event'):
+        return
+    op.create_table(
+        'stripe_event',
+        sa.Column('id', sa.String(length=255), nullable=False),
+        sa.Column('type', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('received_at', sa.DateTime(), nullable=True),
+        sa.Column('attempts', sa.Integer(), nullable=False, server_default='0'),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=True),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_stripe_event_due', 'stripe_event', ['next_attempt_at'],
+                    postgresql_where=sa.text('next_attempt_at IS NOT NULL'),
+                    sqlite_where=sa.text('next_attempt_at IS NOT NULL'))
+
+
+def downgrade():
+    op.drop_index('ix_stripe_event_due', table_name='stripe_event')
+    op.drop_table('stripe_event')
@@ -3,8 +3,8 @@
 // State
 let currentWorkout = null;
 let workouts = [];
-let currentPage = 1;
-let totalPages = 1;
+let historyCursor = '';
+let hasMoreHistory = false;
 let workoutToDelete = null;
 let selectedMetrics = [];
 let availableMetrics = [];
@@ -74,7 +74,6 @@ function setupEventListeners() {
 
   // Load more history
   loadMoreBtn.addEventListener('click', () => {
-    currentPage++;
     loadWorkoutHistory(true);
   });
 
@@ -282,7 +281,6 @@ async function finishCurrentWorkout() {
   if (data.success) {
     currentWorkout = null;
     showNoActiveWorkout();
-    currentPage = 1;
     await loadWorkoutHistory();
     loadStats();
   }
@@ -318,10 +316,13 @@ async function deleteSet(workoutId, setId) {
 
 // Workout History
 async function loadWorkoutHistory(append = false) {
-  const data = await api(`/api/workouts?page=${currentPage}&per_page=10`);
+  // Keyset pagination: each page continues from the last workout of the previous one
+  const after = append ? historyCursor : '';
+  const data = await api(`/api/workouts?after=${encodeURIComponent(after)}&per_page=10`);
 
   if (data.success) {
-    totalPages = data.pages;
+    historyCursor = data.next_cursor || '';
+    hasMoreHistory = data.has_more;
 
     if (!append) {
       workouts = data.workouts;
@@ -332,7 +333,7 @@ async function loadWorkoutHistory(append = false) {
     renderWorkoutHistory(append);
 
     // Show/hide load more button
-    if (currentPage < totalPages) {
+    if (hasMoreHistory) {
       loadMoreContainerEl.classList.remove('hidden');
     } else {
       loadMoreContainerEl.classList.add('hidden');
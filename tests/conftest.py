@@ -0,0 +1,194 @@
+import os
+
+# Point TEST_DATABASE_URL at a scratch Postgres database to run the suite there
+os.environ['DATABASE_URL'] = os.environ.get('TEST_DATABASE_URL', 'sqlite://')
+os.environ.setdefault('PURGE_IN_BACKGROUND', '0')  # tests run purges explicitly
+os.environ.setdefault('STRIPE_EVENTS_IN_BACKGROUND', '0')  # and drain the Stripe event queue
+os.environ.setdefault('CACHE_BACKEND', 'none')  # tests that cache install their own
+os.environ.setdefault('RATE_LIMIT_BACKEND', 'none')  # and so do tests that rate limit
+os.environ.setdefault('USER_CACHE_TTL_SECONDS', '0')  # user ids repeat across tests
+os.environ.setdefault('PASSWORD_HASH_IN_POOL', '0')  # hash inline,
+os.environ.setdefault('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:1000')  # cheaply
+
+import json
+from types import SimpleNamespace
+
+import pytest
+from flask import g, request_started
+from sqlalchemy import event
+
+import app as app_module
+from app import app as flask_app, db, Program, ProgramDay, ProgramExercise, ProgramSetLog, Rep, Set, User, Workout
+
+
+@pytest.fixture
+def app():
+    flask_app.config['TESTING'] = True
+    # Requests share the test's app context, so g (and flask-login's cached
+    # user in it) would outlive each request; start every request without it
+    forget_login_user = lambda sender, **extra: g.pop('_login_user', None)
+    request_started.connect(forget_login_user, flask_app)
+    with flask_app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield flask_app
+        db.session.remove()
+    request_started.disconnect(forget_login_user, flask_app)
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def _make_user(email='athlete@example.com', **kwargs):
+        user = User(email=email, subscribed=True, **kwargs)
+        user.set_password('password123')
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return _make_user
+
+
+@pytest.fixture
+def login(client):
+    def _login(user):
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(user.id)
+            sess['_fresh'] = True
+    return _login
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+        self.executed = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        self.executed.append((statement, parameters, executemany))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager factory that records every SQL statement sent to the engine"""
+    from contextlib import contextmanager
+
+    @contextmanager
+    def _count():
+        counter = QueryCounter()
+        event.listen(db.engine, 'before_cursor_execute', counter)
+        try:
+            yield counter
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', counter)
+    return _count
+
+
+# Builders shared by several test modules
+
+def add_workouts(user, workouts, sets_per_workout, reps_per_set):
+    for w in range(workouts):
+        workout = Workout(user_id=user.id, name=f'Session {w}')
+        db.session.add(workout)
+        db.session.flush()
+        for s in range(sets_per_workout):
+            workout_set = Set(workout_id=workout.id, set_number=s + 1,
+                              reps_completed=reps_per_set, avg_velocity=500)
+            db.session.add(workout_set)
+            db.session.flush()
+            for r in range(reps_per_set):
+                db.session.add(Rep(set_id=workout_set.id, rep_number=r + 1,
+                                   depth=16.0, time_seconds=0.8, velocity=500, quality='parallel'))
+    db.session.commit()
+
+
+def add_program_logs(user, exercise_names, logs_per_exercise):
+    program = Program(athlete_id=user.id, name='Block')
+    db.session.add(program)
+    db.session.flush()
+    day = ProgramDay(program_id=program.id, day_number=1)
+    db.session.add(day)
+    db.session.flush()
+    workout = Workout(user_id=user.id)
+    db.session.add(workout)
+    db.session.flush()
+    for e, name in enumerate(exercise_names):
+        exercise = ProgramExercise(program_day_id=day.id, name=name)
+        db.session.add(exercise)
+        db.session.flush()
+        for i in range(logs_per_exercise):
+            workout_set = Set(workout_id=workout.id, set_number=e * logs_per_exercise + i + 1, avg_velocity=400 + i)
+            db.session.add(workout_set)
+            db.session.flush()
+            db.session.add(ProgramSetLog(
+                program_exercise_id=exercise.id, user_id=user.id, set_number=i + 1,
+                weight=100 + i, velocity_tracked=True, workout_set_id=workout_set.id
+            ))
+    db.session.commit()
+
+
+def add_program(user, days, exercises_per_day, logs_per_exercise=0):
+    program = Program(athlete_id=user.id, name='Block')
+    db.session.add(program)
+    db.session.flush()
+    for d in range(days):
+        day = ProgramDay(program_id=program.id, day_number=d + 1)
+        db.session.add(day)
+        db.session.flush()
+        for e in range(exercises_per_day):
+            exercise = ProgramExercise(program_day_id=day.id, name=f'Lift {e}', order=e)
+            db.session.add(exercise)
+            db.session.flush()
+            for i in range(logs_per_exercise):
+                db.session.add(ProgramSetLog(program_exercise_id=exercise.id, user_id=user.id,
+                                             set_number=i + 1, weight=100 + i))
+    db.session.commit()
+    return program
+
+
+class FakeStripe:
+    """Stands in for the stripe module: accepts the 'valid' signature and serves canned subscriptions"""
+
+    def __init__(self):
+        self.subscriptions = {}
+        self.checkout_sessions = {}
+        self.failures = 0  # Subscription lookups to fail before succeeding
+        self.Webhook = SimpleNamespace(construct_event=self.construct_event)
+        self.Subscription = SimpleNamespace(retrieve=self.retrieve_subscription)
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(retrieve=self.checkout_sessions.__getitem__))
+        self.error = SimpleNamespace(StripeError=LookupError)
+
+    def construct_event(self, payload, sig_header, secret):
+        if sig_header != 'valid':
+            raise ValueError('No signatures found matching the expected signature')
+        return json.loads(payload)
+
+    def retrieve_subscription(self, subscription_id):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('Stripe unreachable')
+        return self.subscriptions[subscription_id]
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    fake = FakeStripe()
+    monkeypatch.setattr(app_module, 'stripe_client', fake)
+    return fake
+
+
+def checkout_completed(event_id, email, subscription_id=None, created=1_700_000_000):
+    return {'id': event_id, 'type': 'checkout.session.completed', 'created': created, 'data': {'object': {
+        'id': f'cs_{event_id}', 'customer_details': {'email': email}, 'customer': 'cus_1',
+        'subscription': subscription_id}}}
+
+
+def post_event(client, event, signature='valid'):
+    return client.post('/webhook', data=json.dumps(event), headers={'Stripe-Signature': signature})
@@ -0,0 +1,63 @@
+"""Archived workouts read back unchanged from cold storage and keep the rollup whole"""
+from datetime import datetime, timedelta
+
+from app import ArchivedWorkout, db, purge_deleted, read_archived_sets, Rep, Set, Workout
+
+
+def add_workout(client, name, velocities, days_ago):
+    workout_id = client.post('/api/workouts', json={'name': name}).get_json()['workout']['id']
+    client.post(f'/api/workouts/{workout_id}/sets',
+                json={'reps': [{'depth': 15.5, 'velocity': v, 'quality': 'parallel'} for v in velocities]})
+    db.session.get(Workout, workout_id).created_at = datetime.utcnow() - timedelta(days=days_ago)
+    db.session.commit()
+    return workout_id
+
+
+def totals(client):
+    stats = client.get('/api/stats').get_json()['stats']
+    return stats['total_workouts'], stats['total_sets'], stats['total_reps']
+
+
+def test_archive_is_transparent_to_history(app, client, make_user, login):
+    user = make_user()
+    login(user)
+    old_id = add_workout(client, 'Old', [500, 450, 400], days_ago=400)
+    recent_id = add_workout(client, 'Recent', [600], days_ago=3)
+    before_list = client.get('/api/workouts?per_page=10').get_json()['workouts']
+    before_one = client.get(f'/api/workouts/{old_id}').get_json()['workout']
+    before_totals = totals(client)
+
+    result = app.test_cli_runner().invoke(args=['archive', 'run'])
+    assert 'Archived 1 workouts' in result.output
+    assert Set.query.count() == 1 and Rep.query.count() == 1
+    assert db.session.get(Workout, old_id).archived_set_count == 1
+    assert [row.workout_id for row in ArchivedWorkout.query] == [old_id]
+
+    assert client.get('/api/workouts?per_page=10').get_json()['workouts'] == before_list
+    assert client.get(f'/api/workouts/{old_id}').get_json()['workout'] == before_one
+    assert totals(client) == before_totals
+    app.test_cli_runner().invoke(args=['stats', 'rebuild'])
+    assert totals(client) == before_totals
+
+    assert client.post(f'/api/workouts/{old_id}/sets', json={'reps': []}).status_code == 400
+    client.delete(f'/api/workouts/{old_id}')
+    assert totals(client) == (1, 1, 1)
+    purge_deleted()
+    assert read_archived_sets([old_id, recent_id]) == {old_id: [], recent_id: []}
+    assert ArchivedWorkout.query.count() == 0  # purged with the workout
+
+
+def test_coach_roster_counts_archived_sets(app, client, make_user, login):
+    coach = make_user('coach@example.com', is_coach=True)
+    athlete = make_user(coach_id=coach.id)
+    login(athlete)
+    for days_ago in (400, 400, 500):
+        add_workout(client, 'Old', [500, 450], days_ago=days_ago)
+    assert totals(client)[1] == 3
+
+    app.test_cli_runner().invoke(args=['archive', 'run'])
+    assert Set.query.count() == 0
+    assert totals(client)[1] == 3
+    login(coach)
+    (row,) = client.get('/api/coach/athletes').get_json()['athletes']
+    assert (row['total_workouts'], row['total_sets']) == (3, 3)
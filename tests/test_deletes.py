@@ -0,0 +1,127 @@
+"""Deletes return without touching child rows; the purge removes them in chunks"""
+from app import db, process_stripe_events, purge_deleted, Program, ProgramDay, ProgramExercise, ProgramSetLog, Rep, Set, User, Workout
+from conftest import add_program, add_program_logs, add_workouts, checkout_completed, post_event
+
+
+def test_workout_delete_is_soft_then_purged(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+    add_workouts(user, workouts=2, sets_per_workout=3, reps_per_set=4)
+    doomed, kept = [w.id for w in Workout.query.order_by(Workout.id)]
+    add_program_logs(user, ['Squat'], logs_per_exercise=1)
+    log = ProgramSetLog.query.one()
+    log_id, log.workout_set_id = log.id, Set.query.filter_by(workout_id=doomed).first().id
+    db.session.commit()
+
+    db.session.expire_all()
+    with count_queries() as counter:
+        assert client.delete(f'/api/workouts/{doomed}').get_json()['success']
+    assert not any('FROM rep' in s or 'DELETE FROM "set"' in s or 'DELETE FROM set' in s for s in counter.statements)
+    assert client.get(f'/api/workouts/{doomed}').status_code == 404
+    assert doomed not in [w['id'] for w in client.get('/api/workouts').get_json()['workouts']]
+    assert client.get('/api/stats').get_json()['stats']['total_sets'] == 4  # 3 kept + the program log's set
+
+    purged = purge_deleted(batch_size=2)
+    assert purged['workout'] == 1
+    assert Set.query.filter_by(workout_id=doomed).count() == 0
+    assert Rep.query.count() == 3 * 4
+    assert db.session.get(ProgramSetLog, log_id).workout_set_id is None
+    assert Workout.query.filter_by(id=kept).count() == 1
+
+
+def test_program_delete_is_soft_then_purged(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+    program = add_program(user, days=2, exercises_per_day=3, logs_per_exercise=5)
+
+    db.session.expire_all()
+    with count_queries() as counter:
+        assert client.delete(f'/api/programs/{program.id}').get_json()['success']
+    assert counter.count <= 4  # user, program, UPDATE; nothing below the program
+    assert client.get('/api/programs').get_json()['programs'] == []
+
+    purge_deleted(batch_size=4)
+    for model in (Program, ProgramDay, ProgramExercise, ProgramSetLog):
+        assert model.query.count() == 0
+
+
+def test_account_purge_clears_data_and_links(app, client, make_user, login):
+    coach = make_user('coach@example.com', is_coach=True)
+    athlete = make_user(coach_id=coach.id)
+    add_workouts(coach, workouts=1, sets_per_workout=2, reps_per_set=2)
+    add_program(coach, days=1, exercises_per_day=1, logs_per_exercise=2)
+    Program.query.one().athlete_id = athlete.id  # a program the coach wrote for the athlete
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['accounts', 'delete', 'coach@example.com'])
+    assert result.exit_code == 0, result.output
+    result = app.test_cli_runner().invoke(args=['purge', 'run'])
+    assert 'Purged 1 workouts, 0 programs and 1 accounts' in result.output
+
+    db.session.expire_all()
+    assert User.query.filter_by(email='coach@example.com').execution_options(include_deleted=True).count() == 0
+    assert db.session.get(User, athlete.id).coach_id is None
+    assert Set.query.count() == Rep.query.count() == 0
+    assert ProgramSetLog.query.count() == 0  # logged by the coach
+    assert ProgramExercise.query.count() == 1
+
+
+def test_deleted_accounts_email_before_purge(client, make_user, fake_stripe):
+    user = make_user('gone@example.com')
+    add_workouts(user, workouts=1, sets_per_workout=1, reps_per_set=2)
+    add_program(user, days=1, exercises_per_day=1, logs_per_exercise=1)
+    user.deleted_at = user.created_at
+    other = make_user('other@example.com')
+    add_workouts(other, workouts=1, sets_per_workout=1, reps_per_set=1)
+    Workout.query.filter_by(user_id=other.id).one().deleted_at = user.created_at  # waiting for the purge job
+    db.session.commit()
+
+    response = client.post('/register', json={'email': 'gone@example.com', 'password': 'password123'})
+    assert response.status_code == 400 and 'still being removed' in response.get_json()['error']
+
+    # Paying again with the email purges the old account and starts a fresh one
+    post_event(client, checkout_completed('evt_gone', 'gone@example.com'))
+    assert process_stripe_events() == (1, 0)
+    (account,) = User.query.execution_options(include_deleted=True).filter_by(email='gone@example.com').all()
+    assert account.subscribed and account.needs_password_setup and account.deleted_at is None
+    # Only the old account went, with the event; the purge job still has the rest
+    workouts = Workout.query.execution_options(include_deleted=True).all()
+    assert [w.user_id for w in workouts] == [other.id] and Rep.query.count() == 1
+    assert Program.query.execution_options(include_deleted=True).count() == ProgramSetLog.query.count() == 0
+
+
+def test_rep_routes_ignore_sets_of_deleted_workouts(client, make_user, login):
+    user = make_user()
+    login(user)
+    add_workouts(user, workouts=1, sets_per_workout=1, reps_per_set=2)
+    workout_set = Set.query.one()
+    set_id, rep_id = workout_set.id, Rep.query.first().id
+    assert client.delete(f'/api/workouts/{workout_set.workout_id}').get_json()['success']
+
+    for fresh_session in (False, True):
+        if fresh_session:
+            db.session.remove()
+        assert client.post(f'/api/sets/{set_id}/reps', json={'depth': 15}).status_code == 404
+        assert client.delete(f'/api/sets/{set_id}/reps/{rep_id}').status_code == 404
+    assert Rep.query.filter_by(set_id=set_id).count() == 2
+
+    login(make_user('other@example.com'))
+    assert client.post(f'/api/sets/{set_id}/reps', json={'depth': 15}).status_code == 404
+
+
+def test_program_routes_ignore_deleted_programs(client, make_user, login):
+    user = make_user()
+    login(user)
+    program = add_program(user, days=1, exercises_per_day=1, logs_per_exercise=1)
+    program_id, day_id = program.id, ProgramDay.query.one().id
+    exercise_id = ProgramExercise.query.one().id
+    assert client.delete(f'/api/programs/{program_id}').get_json()['success']
+
+    db.session.remove()
+    assert client.get(f'/api/exercises/{exercise_id}/logs').status_code == 404
+    assert client.put(f'/api/exercises/{exercise_id}', json={'name': 'Bench'}).status_code == 404
+    assert client.post(f'/api/exercises/{exercise_id}/log', json={'reps_completed': 5}).status_code == 404
+    assert client.post(f'/api/program-days/{day_id}/exercises', json={'name': 'Bench'}).status_code == 404
+    assert client.put(f'/api/programs/{program_id}/days/{day_id}', json={'name': 'Heavy'}).status_code == 404
+    assert client.delete(f'/api/exercises/{exercise_id}').status_code == 404
+    assert ProgramExercise.query.count() == 1 and ProgramSetLog.query.count() == 1
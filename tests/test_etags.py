@@ -0,0 +1,65 @@
+"""Workout, program and roster reads answer 304 from version stamps alone"""
+from app import db
+
+
+def revalidate(client, url, tag):
+    return client.get(url, headers={'If-None-Match': f'"{tag}"'})
+
+
+def test_workout_etag_skips_serialization(client, make_user, login, count_queries):
+    login(make_user())
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [{'velocity': 500}]})
+
+    first = client.get(f'/api/workouts/{workout_id}')
+    tag = first.get_etag()[0]
+    db.session.expire_all()
+    with count_queries() as counter:
+        response = revalidate(client, f'/api/workouts/{workout_id}', tag)
+    assert response.status_code == 304 and response.data == b''
+    assert response.get_etag()[0] == tag
+    assert not any('FROM "set"' in s or 'FROM set' in s or 'FROM rep' in s for s in counter.statements)
+
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [{'velocity': 450}]})
+    response = revalidate(client, f'/api/workouts/{workout_id}', tag)
+    assert response.status_code == 200 and response.get_json()['workout']['set_count'] == 2
+    assert revalidate(client, '/api/workouts', client.get('/api/workouts').get_etag()[0]).status_code == 304
+
+
+def test_program_etag_follows_tree_and_logs(client, make_user, login):
+    coach = make_user('coach@example.com', is_coach=True)
+    athlete = make_user(coach_id=coach.id)
+    login(coach)
+    program_id = client.post('/api/programs', json={'athlete_id': athlete.id}).get_json()['program']['id']
+    url = f'/api/programs/{program_id}'
+    tag = client.get(url).get_etag()[0]
+    assert revalidate(client, url, tag).status_code == 304
+
+    day_id = client.post(f'{url}/days', json={'name': 'Lower'}).get_json()['day']['id']
+    response = revalidate(client, url, tag)
+    assert response.status_code == 200 and response.get_json()['program']['days'][0]['name'] == 'Lower'
+
+    exercise_id = client.post(f'/api/program-days/{day_id}/exercises', json={'name': 'Squat'}).get_json()['exercise']['id']
+    tag, logs_tag = client.get(url).get_etag()[0], client.get(f'{url}?include_logs=1').get_etag()[0]
+    assert tag != logs_tag
+    login(athlete)
+    client.post(f'/api/exercises/{exercise_id}/log', json={'reps_completed': 5})
+    assert revalidate(client, url, tag).status_code == 200  # tags are per user
+    login(coach)
+    assert revalidate(client, url, tag).status_code == 304
+    assert revalidate(client, f'{url}?include_logs=1', logs_tag).status_code == 200
+
+
+def test_etags_never_bypass_access_checks(client, make_user, login):
+    owner = make_user('owner@example.com')
+    login(owner)
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    tag = client.get(f'/api/workouts/{workout_id}').get_etag()[0]
+
+    login(make_user('other@example.com'))
+    assert revalidate(client, f'/api/workouts/{workout_id}', tag).status_code == 404
+    assert revalidate(client, f'/api/workouts/{workout_id}', '*').status_code == 404
+
+    login(owner)
+    client.delete(f'/api/workouts/{workout_id}')
+    assert revalidate(client, f'/api/workouts/{workout_id}', tag).status_code == 404
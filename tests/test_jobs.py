@@ -0,0 +1,82 @@
+"""Background jobs: recurring schedules, one-off retries, leases and the maintenance jobs"""
+from datetime import datetime, timedelta
+
+import app as app_module
+from app import claim_due_job, CoachInvite, db, enqueue_job, Job, JOBS, run_due_jobs, schedule_recurring_jobs, \
+    Set, User, Workout
+
+
+def test_recurring_jobs_run_once_per_interval(app):
+    schedule_recurring_jobs()
+    schedule_recurring_jobs()  # a second worker starting up
+    recurring = {name for name, (function, every) in JOBS.items() if every}
+    assert sorted(job.name for job in Job.query) == sorted(recurring)
+
+    assert run_due_jobs() == (len(recurring), 0)
+    assert run_due_jobs() == (0, 0)
+    purge = Job.query.filter_by(name='purge').one()
+    assert purge.runs == 1 and purge.last_ms is not None and purge.total_ms == purge.last_ms
+    assert purge.run_at - purge.finished_at == timedelta(seconds=600)
+
+
+def test_one_off_jobs_retry_then_give_up(app, monkeypatch):
+    calls = []
+
+    def flaky(fail_times):
+        calls.append(1)
+        if len(calls) <= fail_times:
+            raise RuntimeError('not yet')
+        return 'done'
+
+    monkeypatch.setitem(JOBS, 'flaky', (flaky, None))
+    monkeypatch.setattr(app_module, 'JOB_RETRY_SECONDS', 0)
+    monkeypatch.setattr(app_module, 'JOB_MAX_ATTEMPTS', 3)
+    retried = enqueue_job('flaky', fail_times=1)
+    db.session.commit()
+    assert run_due_jobs() == (1, 1)
+    assert (retried.runs, retried.attempts, retried.run_at, retried.last_error) == (2, 0, None, None)
+
+    calls.clear()
+    given_up = enqueue_job('flaky', fail_times=5)
+    db.session.commit()
+    assert run_due_jobs() == (0, 3)
+    assert (given_up.attempts, given_up.run_at, given_up.finished_at) == (3, None, None)
+    assert 'not yet' in given_up.last_error
+
+
+def test_enqueue_joins_the_callers_transaction_and_claims_lease(app):
+    enqueue_job('rebuild-stats')
+    db.session.rollback()
+    assert Job.query.count() == 0
+
+    enqueue_job('rebuild-stats', user_ids=[1])
+    db.session.commit()
+    claimed = claim_due_job()
+    assert claimed.name == 'rebuild-stats'
+    assert claimed.run_at > datetime.utcnow() + timedelta(minutes=5)  # leased
+    assert claim_due_job() is None
+
+
+def test_expire_invites_and_close_stale_workouts(app, make_user):
+    coach, athlete = make_user('coach@example.com', is_coach=True), make_user()
+    long_ago = datetime.utcnow() - timedelta(days=15)
+    old_invite = CoachInvite(coach_id=coach.id, email='a@example.com', token='old', created_at=long_ago)
+    new_invite = CoachInvite(coach_id=coach.id, email='b@example.com', token='new')
+    stale = Workout(user_id=athlete.id, created_at=datetime.utcnow() - timedelta(days=2))
+    active = Workout(user_id=athlete.id, created_at=datetime.utcnow() - timedelta(days=2))
+    db.session.add_all([old_invite, new_invite, stale, active])
+    db.session.flush()
+    last_set_at = datetime.utcnow() - timedelta(days=1)
+    db.session.add_all([Set(workout_id=stale.id, set_number=1, created_at=last_set_at),
+                        Set(workout_id=active.id, set_number=1, created_at=datetime.utcnow())])
+    db.session.commit()
+    data_version = athlete.data_version
+
+    JOBS['expire-invites'][0]()
+    JOBS['close-stale-workouts'][0]()
+    db.session.commit()
+    db.session.expire_all()
+    assert (old_invite.status, new_invite.status) == ('expired', 'pending')
+    assert stale.completed_at == last_set_at and stale.revision == 1
+    assert active.completed_at is None
+    assert db.session.get(User, athlete.id).data_version == data_version + 1
@@ -0,0 +1,72 @@
+"""Packed rep storage serializes exactly like Rep rows and converts both ways"""
+import app as app_module
+from app import db, Rep, Set
+
+REPS = [
+    {'depth': 16.55, 'time_seconds': 0.835, 'velocity': 512.5, 'quality': 'deep'},  # rounding edges
+    {'depth': 14.2, 'time_seconds': 0.91, 'velocity': 488, 'quality': 'parallel'},
+    {'depth': None, 'time_seconds': None, 'velocity': 455, 'quality': None},
+    {'depth': 9.8, 'time_seconds': 1.07, 'velocity': None, 'quality': 'half'},
+]
+
+
+def workout_json(client, workout_id):
+    workout = client.get(f'/api/workouts/{workout_id}').get_json()['workout']
+    for s in workout['sets']:
+        for r in s['reps']:
+            r.pop('id')  # unpacking gives reps new row ids
+    return workout
+
+
+def test_pack_and_unpack_round_trip(app, client, make_user, login):
+    login(make_user())
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': REPS})
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [dict(REPS[0], quality='ass-to-grass')]})
+    as_rows = workout_json(client, workout_id)
+    row_ids = [r.id for r in Rep.query.order_by(Rep.id)][:len(REPS)]
+
+    result = app.test_cli_runner().invoke(args=['reps', 'pack', '--batch-size', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Packed reps for 1 sets (1 left as rows' in result.output
+    assert Rep.query.count() == 1
+    assert workout_json(client, workout_id) == as_rows
+    packed = client.get(f'/api/workouts/{workout_id}').get_json()['workout']['sets'][0]
+    assert [r['id'] for r in packed['reps']] == row_ids  # clients' rep ids still point at the same reps
+
+    result = app.test_cli_runner().invoke(args=['reps', 'unpack'])
+    assert result.exit_code == 0, result.output
+    assert Set.query.filter(Set.rep_data.isnot(None)).count() == 0
+    assert workout_json(client, workout_id) == as_rows
+
+
+def test_rep_edits_on_packed_sets(client, make_user, login, monkeypatch):
+    monkeypatch.setattr(app_module, 'REP_STORAGE', 'packed')
+    login(make_user())
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    created = client.post(f'/api/workouts/{workout_id}/sets', json={'reps': REPS}).get_json()['set']
+    assert Rep.query.count() == 0
+    assert [r['rep_number'] for r in created['reps']] == [1, 2, 3, 4]
+
+    added = client.post(f"/api/sets/{created['id']}/reps", json={'depth': 15.0, 'quality': 'parallel'})
+    assert added.status_code == 201
+    assert added.get_json()['rep']['id'] == 5
+    bad = client.post(f"/api/sets/{created['id']}/reps", json={'quality': 'ass-to-grass'})
+    assert bad.status_code == 400
+
+    assert created['reps'][0]['depth'] == 16.6 and created['reps'][0]['time_seconds'] == 0.83
+
+    result = client.delete(f"/api/sets/{created['id']}/reps/1").get_json()['set']
+    assert [r['velocity'] for r in result['reps']] == [488, 455, None, None]
+    assert [r['rep_number'] for r in result['reps']] == [1, 2, 3, 4]
+    assert [r['id'] for r in result['reps']] == [2, 3, 4, 5]
+    assert client.delete(f"/api/sets/{created['id']}/reps/1").status_code == 404  # a stale id hits nothing
+    assert result['reps_completed'] == 4
+    assert result['max_velocity'] == 488
+    assert result['avg_velocity'] == round((488 + 455) / 2)
+    assert result['fatigue_drop'] is None  # last rep has no velocity
+    assert client.delete(f"/api/sets/{created['id']}/reps/9").status_code == 404
+
+    client.delete(f"/api/sets/{created['id']}/reps/5")
+    readded = client.post(f"/api/sets/{created['id']}/reps", json={'depth': 15.0, 'quality': 'parallel'})
+    assert readded.get_json()['rep']['id'] == 6  # 5 is never handed out again
@@ -0,0 +1,97 @@
+"""Partition management is Postgres-only; rep loads bound created_at once partitioned"""
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+import app as app_module
+from app import add_months, db, is_partitioned, ProgramSetLog, purge_deleted, Rep, Set
+from conftest import add_program_logs, add_workouts
+
+on_postgres = os.environ['DATABASE_URL'].startswith('postgresql')
+postgres_only = pytest.mark.skipif(not on_postgres, reason='needs TEST_DATABASE_URL pointing at Postgres')
+
+
+@pytest.mark.skipif(on_postgres, reason='checks the SQLite refusal')
+def test_partition_commands_refuse_sqlite(app):
+    for args in (['partitions', 'enable'], ['partitions', 'maintain', '--retain-months', '12']):
+        result = app.test_cli_runner().invoke(args=args)
+        assert result.exit_code != 0
+        assert 'Partitioning needs Postgres' in result.output
+
+
+def test_add_months_crosses_years():
+    assert add_months(datetime(2026, 11, 1), 3) == datetime(2027, 2, 1)
+    assert add_months(datetime(2026, 1, 1), -13) == datetime(2024, 12, 1)
+
+
+def test_partitioned_rep_loads_are_bounded_by_oldest_set(client, make_user, login, count_queries, monkeypatch):
+    login(make_user())
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [{'velocity': 500}, {'velocity': 450}]})
+
+    monkeypatch.setattr(app_module, 'DB_PARTITIONING', 'monthly')
+    with count_queries() as counter:
+        workout = client.get(f'/api/workouts/{workout_id}').get_json()['workout']
+    assert [r['velocity'] for r in workout['sets'][0]['reps']] == [500, 450]
+    rep_query = next(s for s in counter.statements if 'FROM rep' in s)
+    assert 'rep.created_at >=' in rep_query
+
+
+def foreign_keys_to_set():
+    """Parent-level foreign keys referencing set, as {column: ON DELETE action code}"""
+    with db.engine.connect() as conn:
+        return dict(conn.exec_driver_sql(
+            "SELECT c.conrelid::regclass::text || '.' || a.attname, c.confdeltype FROM pg_constraint c "
+            "JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = c.conkey[1] "
+            "WHERE c.contype = 'f' AND c.conparentid = 0 AND c.confrelid = to_regclass('\"set\"')"
+        ).all())
+
+
+@postgres_only
+def test_enable_and_maintain_keep_foreign_keys_and_crud(app, client, make_user, login, monkeypatch):
+    user = make_user()
+    login(user)
+    add_workouts(user, workouts=2, sets_per_workout=2, reps_per_set=3)
+    add_program_logs(user, ['Squat'], logs_per_exercise=1)
+    linked_set = Set.query.order_by(Set.id).first()
+    ProgramSetLog.query.one().workout_set_id = linked_set.id
+    db.session.commit()
+    linked_set_id, linked_workout_id = linked_set.id, linked_set.workout_id
+    db.session.close()  # The rebuild takes exclusive locks
+    before = foreign_keys_to_set()
+
+    runner = app.test_cli_runner()
+    for args in (['partitions', 'enable'], ['partitions', 'enable'],
+                 ['partitions', 'maintain', '--months-ahead', '4', '--retain-months', '1200']):
+        result = runner.invoke(args=args)
+        assert result.exit_code == 0, result.output
+    with db.engine.connect() as conn:
+        assert [is_partitioned(conn, table) for table in ('set', 'rep', 'program_set_log')] == [False, True, True]
+    assert foreign_keys_to_set() == before == {'rep.set_id': 'c', 'program_set_log.workout_set_id': 'n'}
+    assert Rep.query.count() == 2 * 2 * 3 and ProgramSetLog.query.count() == 1
+
+    # The app keeps working on the partitioned tables
+    monkeypatch.setattr(app_module, 'DB_PARTITIONING', 'monthly')
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    set_id = client.post(f'/api/workouts/{workout_id}/sets',
+                         json={'reps': [{'velocity': 500}, {'velocity': 450}]}).get_json()['set']['id']
+    rep = client.post(f'/api/sets/{set_id}/reps', json={'depth': 15}).get_json()['rep']
+    assert client.delete(f"/api/sets/{set_id}/reps/{rep['id']}").get_json()['success']
+    reps = client.get(f'/api/workouts/{workout_id}').get_json()['workout']['sets'][0]['reps']
+    assert [r['velocity'] for r in reps] == [500, 450]
+
+    assert client.delete(f'/api/workouts/{linked_workout_id}').get_json()['success']
+    purge_deleted()
+    assert ProgramSetLog.query.one().workout_set_id is None
+    assert Rep.query.filter_by(set_id=linked_set_id).count() == 0
+
+    # Referential integrity is enforced, cascades included
+    db.session.add(Rep(set_id=10 ** 9, rep_number=1))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+    db.session.execute(db.delete(Set).where(Set.id == set_id))
+    db.session.commit()
+    assert Rep.query.filter_by(set_id=set_id).count() == 0
@@ -0,0 +1,85 @@
+"""Password hashing runs off the request thread, is bounded, and upgrades old hashes on login"""
+import threading
+
+from werkzeug.security import generate_password_hash
+
+import app as app_module
+from app import calibrate_hash_method, db, hash_password, password_needs_rehash, verify_password, User
+
+
+def test_login_rehashes_to_current_parameters(client, make_user):
+    user = make_user()
+    user.password_hash = generate_password_hash('password123', 'pbkdf2:sha256:500')
+    db.session.commit()
+
+    assert client.post('/login', json={'email': user.email, 'password': 'wrong-password'}).status_code == 401
+    assert db.session.get(User, user.id).password_hash.startswith('pbkdf2:sha256:500$')
+
+    response = client.post('/login', json={'email': user.email, 'password': 'password123'})
+    assert response.get_json()['success']
+    assert 'password_verify;dur=' in response.headers['Server-Timing']
+    assert 'password_hash;dur=' in response.headers['Server-Timing']  # the re-hash
+    rehashed = db.session.get(User, user.id).password_hash
+    assert rehashed.startswith('pbkdf2:sha256:1000$')
+    assert verify_password(rehashed, 'password123')
+
+
+def test_only_weaker_hashes_are_rehashed():
+    assert password_needs_rehash('pbkdf2:sha256:999$salt$hash')
+    assert not password_needs_rehash('pbkdf2:sha256:1000$salt$hash')
+    assert not password_needs_rehash('pbkdf2:sha512:600000$salt$hash')  # pinned lower than what's stored
+    assert not password_needs_rehash('scrypt:32768:8:1$salt$hash')
+
+
+def test_hashing_in_process_pool(monkeypatch):
+    monkeypatch.setattr(app_module, 'PASSWORD_HASH_IN_POOL', True)
+    try:
+        pwhash = hash_password('password123')
+        assert verify_password(pwhash, 'password123') and not verify_password(pwhash, 'nope')
+        assert app_module.password_hash_pool is not None
+    finally:
+        if app_module.password_hash_pool is not None:
+            app_module.password_hash_pool.shutdown()
+            app_module.password_hash_pool = None
+
+
+def test_full_pool_answers_503(client, make_user, monkeypatch):
+    user = make_user()
+    monkeypatch.setattr(app_module, 'password_hash_slots', threading.BoundedSemaphore(1))
+    app_module.password_hash_slots.acquire()  # one hash already in flight
+    response = client.post('/login', json={'email': user.email, 'password': 'password123'})
+    assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+
+
+def test_calibration_and_metrics(client, make_user, monkeypatch):
+    assert calibrate_hash_method(target_ms=1) == 'scrypt:32768:8:1'  # never below the default
+
+    user = make_user()
+    client.post('/login', json={'email': user.email, 'password': 'password123'})
+    assert client.get('/metrics').status_code == 404
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'secret')
+    metrics = client.get('/metrics', headers={'Authorization': 'Bearer secret'}).get_json()
+    assert metrics['latency']['login']['count'] >= 1
+    assert metrics['password_hash_method'] == 'pbkdf2:sha256:1000'
+
+
+def test_dead_hashing_process_is_replaced(client, make_user, monkeypatch):
+    monkeypatch.setattr(app_module, 'PASSWORD_HASH_IN_POOL', True)
+    user = make_user()
+    try:
+        pwhash = hash_password('password123')
+        broken = app_module.password_hash_pool
+        for process in list(broken._processes.values()):  # e.g. OOM-killed
+            process.kill()
+            process.join()
+
+        assert verify_password(pwhash, 'password123')
+        assert app_module.password_hash_pool not in (None, broken)
+
+        monkeypatch.setattr(app_module, 'hashing_pool', lambda: broken)  # a pool that stays broken
+        response = client.post('/login', json={'email': user.email, 'password': 'password123'})
+        assert response.status_code == 503 and response.headers['Retry-After'] == '1'
+    finally:
+        if app_module.password_hash_pool is not None:
+            app_module.password_hash_pool.shutdown()
+            app_module.password_hash_pool = None
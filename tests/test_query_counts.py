@@ -0,0 +1,247 @@
+"""Query-count regression tests for the workout tree serializers"""
+import os
+import threading
+
+import pytest
+from sqlalchemy.orm import Session
+
+from app import db, Workout, Set
+from conftest import add_program, add_program_logs, add_workouts
+
+
+def queries_for(client, count_queries, url):
+    # Requests share the test's app context (and session), so start each one cold
+    db.session.expire_all()
+    with count_queries() as counter:
+        response = client.get(url)
+    assert response.status_code == 200
+    return counter.count, response.get_json()
+
+
+def test_workout_list_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+
+    add_workouts(user, workouts=2, sets_per_workout=1, reps_per_set=1)
+    small, _ = queries_for(client, count_queries, '/api/workouts?per_page=10')
+
+    add_workouts(user, workouts=8, sets_per_workout=5, reps_per_set=8)
+    large, data = queries_for(client, count_queries, '/api/workouts?per_page=10')
+
+    assert small == large
+    assert len(data['workouts']) == 10
+    assert sum(w['set_count'] for w in data['workouts']) == 2 + 8 * 5
+
+
+def test_single_workout_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+
+    add_workouts(user, workouts=1, sets_per_workout=1, reps_per_set=1)
+    small_id = Workout.query.first().id
+    small, _ = queries_for(client, count_queries, f'/api/workouts/{small_id}')
+
+    add_workouts(user, workouts=1, sets_per_workout=6, reps_per_set=10)
+    large_id = Workout.query.order_by(Workout.id.desc()).first().id
+    large, data = queries_for(client, count_queries, f'/api/workouts/{large_id}')
+
+    assert small == large
+    workout = data['workout']
+    assert [s['set_number'] for s in workout['sets']] == [1, 2, 3, 4, 5, 6]
+    assert [r['rep_number'] for r in workout['sets'][0]['reps']] == list(range(1, 11))
+    assert workout['total_reps'] == 60
+
+
+def test_current_workout_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+
+    add_workouts(user, workouts=1, sets_per_workout=1, reps_per_set=1)
+    small, _ = queries_for(client, count_queries, '/api/workouts/current')
+
+    add_workouts(user, workouts=1, sets_per_workout=8, reps_per_set=12)
+    large, _ = queries_for(client, count_queries, '/api/workouts/current')
+
+    assert small == large
+
+
+def test_athlete_details_query_count_is_constant(client, make_user, login, count_queries):
+    coach = make_user('coach@example.com', is_coach=True)
+    athlete = make_user('athlete@example.com', coach_id=coach.id)
+    login(coach)
+
+    add_workouts(athlete, workouts=1, sets_per_workout=1, reps_per_set=1)
+    small, _ = queries_for(client, count_queries, f'/api/coach/athletes/{athlete.id}')
+
+    add_workouts(athlete, workouts=9, sets_per_workout=4, reps_per_set=6)
+    large, data = queries_for(client, count_queries, f'/api/coach/athletes/{athlete.id}')
+
+    assert small == large
+    assert len(data['workouts']) == 10
+
+
+def test_coach_roster_is_a_single_query(client, make_user, login, count_queries):
+    coach = make_user('coach@example.com', is_coach=True)
+    login(coach)
+
+    first = make_user('first@example.com', coach_id=coach.id)
+    add_workouts(first, workouts=1, sets_per_workout=2, reps_per_set=3)
+    small, _ = queries_for(client, count_queries, '/api/coach/athletes')
+
+    for i in range(10):
+        athlete = make_user(f'athlete{i}@example.com', coach_id=coach.id)
+        add_workouts(athlete, workouts=2, sets_per_workout=7, reps_per_set=2)
+    make_user('idle@example.com', coach_id=coach.id)
+    large, data = queries_for(client, count_queries, '/api/coach/athletes')
+
+    assert small == large
+    roster = {a['email']: a for a in data['athletes']}
+    assert len(roster) == 12
+    assert roster['first@example.com']['total_workouts'] == 1
+    assert roster['first@example.com']['total_sets'] == 2
+    assert roster['athlete0@example.com']['total_sets'] == 14
+    assert roster['athlete0@example.com']['avg_velocity'] == 500
+    assert roster['idle@example.com']['total_workouts'] == 0
+    assert roster['idle@example.com']['avg_velocity'] is None
+
+
+def test_lift_stats_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+
+    add_program_logs(user, ['Squat'], logs_per_exercise=1)
+    small, _ = queries_for(client, count_queries, '/api/dashboard/lift-stats')
+
+    add_program_logs(user, ['Bench', 'Deadlift', 'Row'], logs_per_exercise=12)
+    large, data = queries_for(client, count_queries, '/api/dashboard/lift-stats')
+
+    assert small == large
+    bench = data['stats']['bench']
+    assert bench['total_sets'] == 12
+    assert bench['max_weight'] == 111
+    assert bench['recent_weight'] == 111
+    assert bench['avg_velocity'] == round(sum(range(400, 412)) / 12)
+    assert data['stats']['squat']['total_sets'] == 1
+
+
+def test_add_set_statement_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+
+    def save_set(rep_count):
+        reps = [{'depth': 16.0, 'time_seconds': 0.7, 'velocity': 500 - i, 'quality': 'deep'}
+                for i in range(rep_count)]
+        with count_queries() as counter:
+            response = client.post(f'/api/workouts/{workout_id}/sets', json={'reps': reps})
+        assert response.status_code == 201
+        return counter.count, response.get_json()['set']
+
+    small, first = save_set(1)
+    large, second = save_set(30)
+
+    assert small == large
+    assert (first['set_number'], second['set_number']) == (1, 2)
+    assert [r['rep_number'] for r in second['reps']] == list(range(1, 31))
+    assert all(r['id'] for r in second['reps'])
+    stored = client.get(f'/api/workouts/{workout_id}').get_json()['workout']['sets'][1]
+    assert stored == second
+
+
+@pytest.mark.skipif(not os.environ['DATABASE_URL'].startswith('postgresql'), reason='row locks need Postgres')
+def test_concurrent_add_set_waits_for_the_workout(app, client, make_user, login):
+    login(make_user())
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+
+    with db.engine.connect() as other:
+        # Another request mid-way through adding set 1
+        other_session = Session(bind=other)
+        other_session.query(Workout).filter_by(id=workout_id).with_for_update().one()
+        other_session.add(Set(workout_id=workout_id, set_number=1))
+        other_session.flush()
+
+        responses = []
+        adding = threading.Thread(target=lambda: responses.append(
+            client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [{'velocity': 500}]})))
+        adding.start()
+        adding.join(0.5)
+        assert adding.is_alive()  # blocked on the workout's row lock
+        other_session.commit()
+        adding.join(10)
+
+    assert responses[0].status_code == 201
+    assert responses[0].get_json()['set']['set_number'] == 2
+
+
+def test_cursor_pagination_walks_history_with_constant_queries(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+    add_workouts(user, workouts=25, sets_per_workout=1, reps_per_set=2)
+
+    seen, counts, cursor = [], [], ''
+    while True:
+        count, data = queries_for(client, count_queries, f'/api/workouts?after={cursor}&per_page=10')
+        counts.append(count)
+        seen.extend(w['id'] for w in data['workouts'])
+        if not data['has_more']:
+            break
+        cursor = data['next_cursor']
+
+    expected = [w.id for w in Workout.query.order_by(Workout.created_at.desc(), Workout.id.desc())]
+    assert seen == expected
+    assert len(set(counts)) == 1
+    assert 'total' not in data
+
+    data = client.get('/api/workouts?after=&per_page=5&include_total=1').get_json()
+    assert data['total'] == 25
+    assert client.get('/api/workouts?after=not-a-cursor').status_code == 400
+
+
+def test_program_tree_query_count_is_constant(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+
+    small = add_program(user, days=1, exercises_per_day=1, logs_per_exercise=1)
+    large = add_program(user, days=4, exercises_per_day=6, logs_per_exercise=25)
+
+    small_count, _ = queries_for(client, count_queries, f'/api/programs/{small.id}?include_logs=1')
+    large_count, data = queries_for(client, count_queries, f'/api/programs/{large.id}?include_logs=1')
+
+    assert small_count == large_count
+    days = data['program']['days']
+    assert [d['day_number'] for d in days] == [1, 2, 3, 4]
+    assert [e['order'] for e in days[0]['exercises']] == list(range(6))
+    logs = days[0]['exercises'][0]['set_logs']
+    assert len(logs) == 20
+    assert logs[0]['set_number'] == 25
+
+    _, data = queries_for(client, count_queries, f'/api/programs/{large.id}')
+    assert 'set_logs' not in data['program']['days'][0]['exercises'][0]
+
+
+def test_exercise_logs_batch_velocity_data(client, make_user, login, count_queries):
+    from app import ProgramExercise
+
+    user = make_user()
+    login(user)
+    add_program_logs(user, ['Squat'], logs_per_exercise=2)
+    add_program_logs(user, ['Bench'], logs_per_exercise=30)
+    squat = ProgramExercise.query.filter_by(name='Squat').one()
+    bench = ProgramExercise.query.filter_by(name='Bench').one()
+
+    small, _ = queries_for(client, count_queries, f'/api/exercises/{squat.id}/logs')
+    large, data = queries_for(client, count_queries, f'/api/exercises/{bench.id}/logs?limit=25')
+    assert small == large
+    assert len(data['logs']) == 25
+    assert all('velocity_data' in log for log in data['logs'])
+
+    rest = client.get(f"/api/exercises/{bench.id}/logs?limit=25&after={data['next_cursor']}").get_json()
+    assert not rest['has_more']
+    ids = [log['id'] for log in data['logs'] + rest['logs']]
+    assert len(ids) == len(set(ids)) == 30
+
+    program_id = squat.day.program_id
+    with_logs, data = queries_for(client, count_queries, f'/api/programs/{program_id}?include_logs=1')
+    assert data['program']['days'][0]['exercises'][0]['set_logs'][0]['velocity_data']['avg_velocity'] == 401
+    bench_program, _ = queries_for(client, count_queries, f'/api/programs/{bench.day.program_id}?include_logs=1')
+    assert with_logs == bench_program
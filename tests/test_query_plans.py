@@ -0,0 +1,109 @@
+"""Query-plan regression suite for the hot API endpoints.
+
+Every SELECT an endpoint issues is re-run under EXPLAIN QUERY PLAN (SQLite) or
+EXPLAIN with enable_seqscan off (Postgres). A full scan of a table means a
+filter or sort lost its index and the test fails.
+"""
+import re
+
+import pytest
+
+from app import (db, Workout, Set, Rep, Program, ProgramDay, ProgramExercise,
+                 ProgramSetLog, CoachInvite)
+
+
+SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?"?(\w+)"?(?: AS \w+)?$')
+POSTGRES_SCAN = re.compile(r'Seq Scan on "?(\w+)"?')
+
+
+@pytest.fixture
+def seeded(make_user):
+    coach = make_user('coach@example.com', is_coach=True, stripe_customer_id='cus_coach')
+    athlete = make_user('athlete@example.com', coach_id=coach.id, stripe_customer_id='cus_athlete')
+    make_user('other@example.com', coach_id=coach.id)
+
+    program = Program(coach_id=coach.id, athlete_id=athlete.id, name='Block')
+    db.session.add(program)
+    db.session.flush()
+    day = ProgramDay(program_id=program.id, day_number=1)
+    db.session.add(day)
+    db.session.flush()
+    exercise = ProgramExercise(program_day_id=day.id, name='Squat', exercise_type='squat_velocity')
+    db.session.add(exercise)
+    db.session.flush()
+
+    for w in range(3):
+        workout = Workout(user_id=athlete.id)
+        db.session.add(workout)
+        db.session.flush()
+        for s in range(3):
+            workout_set = Set(workout_id=workout.id, set_number=s + 1, reps_completed=2, avg_velocity=500)
+            db.session.add(workout_set)
+            db.session.flush()
+            for r in range(2):
+                db.session.add(Rep(set_id=workout_set.id, rep_number=r + 1, velocity=500))
+            db.session.add(ProgramSetLog(program_exercise_id=exercise.id, user_id=athlete.id,
+                                         set_number=s + 1, weight=225, velocity_tracked=True,
+                                         workout_set_id=workout_set.id))
+    db.session.add(CoachInvite(coach_id=coach.id, email='new@example.com', token='invite-token'))
+    db.session.commit()
+    return {'coach': coach, 'athlete': athlete, 'program': program, 'exercise': exercise,
+            'workout': workout}
+
+
+def full_scans(statement, parameters):
+    """Names of real tables the plan reads front to back (derived tables are fine)"""
+    tables = set(db.metadata.tables)
+    connection = db.session.connection()
+    if connection.dialect.name == 'postgresql':
+        connection.exec_driver_sql('SET LOCAL enable_seqscan = off')
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters).fetchall()
+        return [m.group(1) for (line,) in rows for m in [POSTGRES_SCAN.search(line)]
+                if m and m.group(1) in tables]
+
+    rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters).fetchall()
+    return [m.group(1) for row in rows for m in [SQLITE_SCAN.match(row[-1])]
+            if m and m.group(1) in tables]
+
+
+def assert_indexed(client, count_queries, method, url, **kwargs):
+    db.session.expire_all()
+    with count_queries() as counter:
+        response = getattr(client, method)(url, **kwargs)
+    assert response.status_code < 400, response.get_data(as_text=True)
+
+    selects = [(statement, parameters) for statement, parameters, many in counter.executed
+               if not many and statement.lstrip().upper().startswith(('SELECT', 'WITH'))]
+    assert selects
+    for statement, parameters in selects:
+        scans = full_scans(statement, parameters)
+        assert not scans, f'{method.upper()} {url} scans {scans}:\n{statement}'
+
+
+def test_athlete_endpoints_use_indexes(client, login, count_queries, seeded):
+    login(seeded['athlete'])
+    workout_id = seeded['workout'].id
+    exercise_id = seeded['exercise'].id
+
+    assert_indexed(client, count_queries, 'get', '/api/workouts?per_page=10')
+    assert_indexed(client, count_queries, 'get', '/api/workouts?after=&per_page=2')
+    assert_indexed(client, count_queries, 'get', f'/api/workouts/{workout_id}')
+    assert_indexed(client, count_queries, 'get', '/api/workouts/current')
+    assert_indexed(client, count_queries, 'get', '/api/stats')
+    assert_indexed(client, count_queries, 'get', '/api/dashboard/lift-stats')
+    assert_indexed(client, count_queries, 'get', '/api/programs')
+    assert_indexed(client, count_queries, 'get', f"/api/programs/{seeded['program'].id}")
+    assert_indexed(client, count_queries, 'get', f'/api/exercises/{exercise_id}/logs')
+    assert_indexed(client, count_queries, 'post', f'/api/workouts/{workout_id}/sets',
+                   json={'reps': [{'velocity': 480, 'depth': 16}]})
+
+
+def test_coach_endpoints_use_indexes(client, login, count_queries, seeded):
+    login(seeded['coach'])
+
+    assert_indexed(client, count_queries, 'get', '/api/coach/athletes')
+    assert_indexed(client, count_queries, 'get', f"/api/coach/athletes/{seeded['athlete'].id}")
+    assert_indexed(client, count_queries, 'get', '/api/coach/invites')
+    assert_indexed(client, count_queries, 'post', '/api/coach/invite', json={'email': 'new@example.com'})
+    assert_indexed(client, count_queries, 'get', '/api/programs')
+    assert_indexed(client, count_queries, 'get', f"/api/exercises/{seeded['exercise'].id}/logs")
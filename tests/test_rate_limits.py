@@ -0,0 +1,92 @@
+"""Requests draw weighted tokens from buckets shared by every worker, and a full machine sheds load"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import app as app_module
+from app import settle_buckets, SQLiteBuckets
+
+
+@pytest.fixture
+def buckets(monkeypatch, tmp_path):
+    buckets = SQLiteBuckets(str(tmp_path / 'rate-limits.db'))
+    monkeypatch.setattr(app_module, 'rate_limit_buckets', buckets)
+    monkeypatch.setattr(app_module, 'in_flight_requests', buckets)
+    return buckets
+
+
+def test_buckets_refill_and_charge_all_or_nothing():
+    charges = [('user:1', 10, 5, 30), ('endpoint:x', 10, 1, 15)]
+    wait, states = settle_buckets(charges, {}, now=100)
+    assert wait == 0 and states == {'user:1': (20, 100), 'endpoint:x': (5, 100)}
+
+    wait, unchanged = settle_buckets(charges, states, now=101)
+    assert wait == pytest.approx(4) and unchanged == {}  # user:1 could pay, endpoint:x is 4 tokens short
+    assert settle_buckets(charges, states, now=105)[1] == {'user:1': (20, 105), 'endpoint:x': (0, 105)}
+
+
+def test_expensive_endpoint_throttles_one_user_only(client, make_user, login, buckets, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_BURST', 30)
+    alice, bob = make_user('alice@example.com'), make_user('bob@example.com')
+    login(alice)
+    assert [client.get('/api/dashboard/lift-stats').status_code for _ in range(3)] == [200, 200, 200]
+    throttled = client.get('/api/dashboard/lift-stats')
+    assert throttled.status_code == 429 and throttled.headers['Retry-After'] == '2'  # 10 tokens at 5/s
+
+    login(bob)
+    assert client.get('/api/dashboard/lift-stats').status_code == 200
+    assert client.get('/api/workouts/current').status_code == 200
+
+
+def test_workers_share_buckets(client, make_user, login, buckets, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_ENDPOINT_BURST', 20)
+    login(make_user())
+    assert client.get('/api/dashboard/lift-stats').status_code == 200
+
+    # Another worker process opens the same file and sees the endpoint's bucket drawn down
+    other_worker = SQLiteBuckets(buckets.path)
+    charge = [('endpoint:get_lift_stats', 10, app_module.RATE_LIMIT_ENDPOINT_PER_SECOND, 20)]
+    assert other_worker.take(charge, app_module.time.time()) == 0
+    assert client.get('/api/dashboard/lift-stats').status_code == 429
+
+
+def test_in_flight_cap_is_machine_wide(client, make_user, login, buckets, monkeypatch):
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_MAX_IN_FLIGHT', 1)
+    monkeypatch.setattr(app_module, 'METRICS_TOKEN', 'secret')
+    login(make_user())
+    assert client.get('/api/workouts/current').status_code == 200  # and gave its slot back
+
+    other_worker = SQLiteBuckets(buckets.path)
+    assert other_worker.enter(1)  # a slow request in another worker
+    response = client.get('/api/workouts/current')
+    assert response.status_code == 429 and response.headers['Retry-After'] == '1'
+    assert client.get('/metrics', headers={'Authorization': 'Bearer secret'}).get_json()['rejected']['in_flight'] >= 1
+    other_worker.leave()
+    assert client.get('/api/workouts/current').status_code == 200
+
+    # A worker killed mid-request doesn't hold its count forever
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    buckets.connection().execute('INSERT INTO in_flight (pid, requests) VALUES (?, 1)', (dead.pid,))
+    assert client.get('/api/workouts/current').status_code == 200
+
+
+def in_flight_default(**env):
+    """RATE_LIMIT_MAX_IN_FLIGHT as a fresh process computes it from its environment"""
+    env = {k: v for k, v in os.environ.items() if k not in ('WEB_CONCURRENCY', 'GUNICORN_THREADS',
+                                                          'RATE_LIMIT_MAX_IN_FLIGHT')} | env
+    return int(subprocess.run([sys.executable, '-c', 'import app; print(app.RATE_LIMIT_MAX_IN_FLIGHT)'],
+                              env=env, capture_output=True, text=True, check=True).stdout.split()[-1])
+
+
+def test_in_flight_cap_needs_gunicorns_environment(client, make_user, login, buckets, monkeypatch):
+    assert in_flight_default() == 0  # flask run, tests, scripts
+    assert in_flight_default(WEB_CONCURRENCY='2', GUNICORN_THREADS='4') == 6
+
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_MAX_IN_FLIGHT', 0)
+    login(make_user())
+    for _ in range(4):  # the dashboard's parallel calls, still running in other threads
+        assert buckets.enter(4)
+    assert client.get('/api/workouts/current').status_code == 200
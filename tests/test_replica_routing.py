@@ -0,0 +1,74 @@
+"""Read-only views go to the replica except right after the user writes"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.pool import StaticPool
+
+import app as app_module
+from app import db, LRUCache, User, Workout
+
+
+@pytest.fixture
+def replica(app):
+    engine = create_engine('sqlite://', poolclass=StaticPool)
+    db.metadata.create_all(engine)
+    db.engines['replica'] = engine
+    yield engine
+    db.session.remove()
+    del db.engines['replica']
+    engine.dispose()
+
+
+def workout_names(client):
+    data = client.get('/api/workouts?after=').get_json()
+    return [w['name'] for w in data['workouts']]
+
+
+def test_reads_use_replica_until_the_user_writes(client, make_user, login, replica):
+    user = make_user()
+    login(user)
+    with replica.begin() as conn:
+        conn.execute(Workout.__table__.insert().values(user_id=user.id, name='On replica'))
+
+    assert workout_names(client) == ['On replica']
+
+    client.post('/api/workouts', json={'name': 'On primary'})
+    assert workout_names(client) == ['On primary']
+
+    with client.session_transaction() as sess:
+        sess['primary_until'] = 0
+    assert workout_names(client) == ['On replica']
+
+
+def test_writes_never_go_to_replica(client, make_user, login, replica):
+    user = make_user()
+    login(user)
+    with replica.begin() as conn:
+        conn.execute(Workout.__table__.insert().values(user_id=user.id))
+
+    # get_stats computes a missing rollup row from the replica without storing it
+    assert client.get('/api/stats').get_json()['stats']['total_workouts'] == 1
+    with replica.connect() as conn:
+        assert conn.exec_driver_sql('SELECT COUNT(*) FROM user_stats').scalar() == 0
+    assert db.session.execute(db.text('SELECT COUNT(*) FROM user_stats')).scalar() == 0
+    with client.session_transaction() as sess:
+        assert 'primary_until' not in sess  # nothing was written, so no switch to the primary
+
+
+def test_cache_keys_on_the_replicas_data_version(client, make_user, login, replica, monkeypatch):
+    monkeypatch.setattr(app_module, 'response_cache', LRUCache(max_bytes=1024 * 1024, ttl=60))
+    user = make_user()
+    login(user)
+    with replica.begin() as conn:  # replicated the account but not the workout yet
+        conn.execute(User.__table__.insert().values(id=user.id, email=user.email, password_hash='x', data_version=0))
+    client.post('/api/workouts', json={'name': 'Lagging'})
+    assert db.session.get(User, user.id).data_version == 1
+    with client.session_transaction() as sess:
+        sess['primary_until'] = 0
+    assert client.get('/api/workouts/current').get_json()['workout'] is None
+
+    with replica.begin() as conn:  # caught up
+        conn.execute(User.__table__.update().values(data_version=1))
+        conn.execute(Workout.__table__.insert().values(user_id=user.id, name='Lagging'))
+    response = client.get('/api/workouts/current')
+    assert response.headers['X-Cache'] == 'MISS' and response.get_json()['workout']['name'] == 'Lagging'
+    assert client.get('/api/workouts/current').headers['X-Cache'] == 'HIT'
@@ -0,0 +1,52 @@
+"""Dashboard responses are cached per user until one of their writes bumps data_version"""
+import pytest
+
+import app as app_module
+from app import LRUCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = LRUCache(max_bytes=1024 * 1024, ttl=60)
+    monkeypatch.setattr(app_module, 'response_cache', cache)
+    return cache
+
+
+def test_writes_invalidate_cached_dashboard(client, make_user, login, cache):
+    login(make_user())
+    first = client.get('/api/stats')
+    assert first.headers['X-Cache'] == 'MISS'
+    assert client.get('/api/stats').headers['X-Cache'] == 'HIT'
+    assert client.get('/api/stats').get_json() == first.get_json()
+
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    after_write = client.get('/api/stats')
+    assert after_write.headers['X-Cache'] == 'MISS'
+    assert after_write.get_json()['stats']['total_workouts'] == 1
+
+    client.post(f'/api/workouts/{workout_id}/sets', json={'reps': [{'velocity': 500}]})
+    assert client.get('/api/stats').get_json()['stats']['total_sets'] == 1
+    assert cache.stats()['hits'] == 2
+
+
+def test_cache_is_per_user_and_per_params(client, make_user, login, cache):
+    alice, bob = make_user('alice@example.com'), make_user('bob@example.com')
+    login(alice)
+    client.post('/api/workouts', json={})
+    assert client.get('/api/stats').get_json()['stats']['total_workouts'] == 1
+    assert client.get('/api/stats?x=1').headers['X-Cache'] == 'MISS'
+
+    login(bob)
+    response = client.get('/api/stats')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['stats']['total_workouts'] == 0
+
+
+def test_lru_evicts_to_byte_budget():
+    cache = LRUCache(max_bytes=10, ttl=60)
+    cache.set('a', b'12345')
+    cache.set('b', b'12345')
+    assert cache.get('a') == b'12345'  # a is now most recent
+    cache.set('c', b'12345')
+    assert cache.get('b') is None
+    assert cache.stats() == {'hits': 1, 'misses': 1, 'entries': 2, 'bytes': 10}
@@ -0,0 +1,81 @@
+"""Incremental set aggregates agree with a from-scratch recompute"""
+import random
+
+from app import db, Set, Rep
+
+
+def recomputed(set_id):
+    reps = Rep.query.filter_by(set_id=set_id).order_by(Rep.rep_number).all()
+    depths = [r.depth for r in reps if r.depth]
+    velocities = [r.velocity for r in reps if r.velocity]
+    fatigue_drop = None
+    if len(velocities) >= 2 and reps[0].velocity and reps[-1].velocity:
+        fatigue_drop = round(((reps[0].velocity - reps[-1].velocity) / reps[0].velocity) * 100, 1)
+    return {
+        'rep_numbers': [r.rep_number for r in reps],
+        'avg_depth': sum(depths) / len(depths) if depths else None,
+        'avg_velocity': sum(velocities) / len(velocities) if velocities else None,
+        'min_velocity': min(velocities) if velocities else None,
+        'max_velocity': max(velocities) if velocities else None,
+        'fatigue_drop': fatigue_drop
+    }
+
+
+def stored(set_id):
+    db.session.expire_all()
+    workout_set = db.session.get(Set, set_id)
+    return {
+        'rep_numbers': list(range(1, workout_set.rep_count + 1)),
+        'avg_depth': workout_set.avg_depth,
+        'avg_velocity': workout_set.avg_velocity,
+        'min_velocity': workout_set.min_velocity,
+        'max_velocity': workout_set.max_velocity,
+        'fatigue_drop': workout_set.fatigue_drop
+    }
+
+
+def assert_close(actual, expected):
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        if isinstance(value, float):
+            assert abs(actual[key] - value) < 1e-6, key
+        else:
+            assert actual[key] == value, key
+
+
+def test_random_rep_edits_keep_aggregates_exact(client, make_user, login):
+    user = make_user()
+    login(user)
+    rng = random.Random(7)
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    reps = [{'depth': rng.choice([None, 14.0, 16.5, 18.0]), 'velocity': rng.randint(300, 700)}
+            for _ in range(12)]
+    set_id = client.post(f'/api/workouts/{workout_id}/sets', json={'reps': reps}).get_json()['set']['id']
+
+    for step in range(20):
+        if step % 3 == 0:
+            response = client.post(f'/api/sets/{set_id}/reps', json={'depth': rng.choice([None, 15.0])})
+            assert response.status_code == 201
+        else:
+            rep_ids = [r.id for r in Rep.query.filter_by(set_id=set_id)]
+            if not rep_ids:
+                continue
+            response = client.delete(f'/api/sets/{set_id}/reps/{rng.choice(rep_ids)}')
+            assert response.status_code == 200
+        assert_close(stored(set_id), recomputed(set_id))
+
+
+def test_rep_delete_renumbers_with_one_update(client, make_user, login, count_queries):
+    user = make_user()
+    login(user)
+    workout_id = client.post('/api/workouts', json={}).get_json()['workout']['id']
+    set_id = client.post(f'/api/workouts/{workout_id}/sets',
+                         json={'reps': [{'velocity': 500 + i} for i in range(20)]}).get_json()['set']['id']
+    rep_id = Rep.query.filter_by(set_id=set_id, rep_number=5).one().id
+
+    db.session.expire_all()
+    with count_queries() as counter:
+        client.delete(f'/api/sets/{set_id}/reps/{rep_id}')
+    (renumber,) = [s for s in counter.statements if s.startswith('UPDATE rep')]
+    assert renumber.startswith('UPDATE rep SET rep_number=(rep.rep_number - ') and 'rep.rep_number >' in renumber
+    assert [r.rep_number for r in Rep.query.filter_by(set_id=set_id).order_by(Rep.rep_number)] == list(range(1, 20))
@@ -0,0 +1,17 @@
+"""Cold start stays cheap: no database round trip or eager SDK imports when the app loads"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_cold_start_within_budget():
+    # Budgets are generous for slow CI machines; tighten them with the env vars
+    result = subprocess.run(
+        [sys.executable, os.path.join(ROOT, 'benchmarks', 'startup.py'), '--runs', '3',
+         '--max-import-ms', os.getenv('STARTUP_MAX_IMPORT_MS', '2000'),
+         '--max-first-request-ms', os.getenv('STARTUP_MAX_FIRST_REQUEST_MS', '2500')],
+        capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,84 @@
+"""The webhook only queues verified events; the worker applies them with retries"""
+from datetime import datetime, timedelta
+
+import app as app_module
+from app import db, process_stripe_events, StripeEvent, User
+from conftest import checkout_completed, post_event
+
+
+def subscription_event(event_id, kind, status, created):
+    return {'id': event_id, 'type': f'customer.subscription.{kind}', 'created': created,
+            'data': {'object': {'customer': 'cus_1', 'status': status}}}
+
+
+def test_webhook_queues_verified_events_once(client, fake_stripe):
+    event = checkout_completed('evt_1', 'new@example.com', 'sub_1')
+    assert post_event(client, event, signature='forged').status_code == 400
+    assert post_event(client, event).get_json() == {'success': True}
+    assert post_event(client, event).get_json() == {'success': True, 'duplicate': True}
+    assert StripeEvent.query.count() == 1
+    assert User.query.count() == 0  # nothing applied until the worker runs
+
+    fake_stripe.subscriptions['sub_1'] = {'items': {'data': [{'price': {'recurring': {'interval': 'year'}}}]}}
+    assert process_stripe_events() == (1, 0)
+    user = User.query.filter_by(email='new@example.com').one()
+    assert (user.subscribed, user.subscription_type, user.needs_password_setup) == (True, 'annual', True)
+    assert db.session.get(StripeEvent, 'evt_1').processed_at is not None
+
+
+def test_failed_events_back_off_and_retry(client, make_user, fake_stripe):
+    make_user('existing@example.com', subscription_type='monthly')
+    fake_stripe.failures = 1
+    fake_stripe.subscriptions['sub_2'] = {'items': {'data': []}}
+    post_event(client, checkout_completed('evt_2', 'existing@example.com', 'sub_2'))
+    post_event(client, subscription_event('evt_3', 'updated', 'past_due', created=1_700_000_000))
+
+    assert process_stripe_events() == (1, 1)  # evt_3 finds no user with cus_1 yet and is done
+    failed = db.session.get(StripeEvent, 'evt_2')
+    assert failed.attempts == 1 and 'unreachable' in failed.last_error
+    assert failed.next_attempt_at > datetime.utcnow()
+    assert process_stripe_events() == (0, 0)  # not due yet
+
+    failed.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert process_stripe_events() == (1, 0)
+    assert User.query.filter_by(email='existing@example.com').one().stripe_customer_id == 'cus_1'
+
+
+def test_events_are_given_up_after_max_attempts(client, fake_stripe, monkeypatch):
+    monkeypatch.setattr(app_module, 'STRIPE_EVENT_MAX_ATTEMPTS', 2)
+    monkeypatch.setattr(app_module, 'STRIPE_EVENT_RETRY_SECONDS', 0)
+    fake_stripe.failures = 5
+    post_event(client, checkout_completed('evt_4', 'new@example.com', 'sub_4'))
+
+    assert process_stripe_events() == (0, 2)
+    event = db.session.get(StripeEvent, 'evt_4')
+    assert (event.attempts, event.next_attempt_at, event.processed_at) == (2, None, None)
+
+
+def test_retried_events_never_undo_newer_ones(client, make_user, fake_stripe):
+    make_user('existing@example.com', stripe_customer_id='cus_1')
+    fake_stripe.failures = 1  # the checkout fails once and is retried after the cancellation
+    fake_stripe.subscriptions['sub_5'] = {'items': {'data': []}}
+    post_event(client, checkout_completed('evt_5', 'existing@example.com', 'sub_5', created=100))
+    post_event(client, subscription_event('evt_6', 'updated', 'active', created=200))
+    post_event(client, subscription_event('evt_7', 'deleted', 'canceled', created=300))
+    assert process_stripe_events() == (2, 1)
+
+    retried = db.session.get(StripeEvent, 'evt_5')
+    retried.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    post_event(client, subscription_event('evt_8', 'updated', 'active', created=250))  # delivered late
+    assert process_stripe_events() == (2, 0)
+    assert User.query.filter_by(email='existing@example.com').one().subscribed is False
+
+
+def test_payment_success_applies_the_queued_checkout(client, fake_stripe):
+    fake_stripe.checkout_sessions['cs_evt_9'] = {'id': 'cs_evt_9', 'customer_details': {'email': 'new@example.com'}}
+    assert b'finishing setting up' in client.get('/payment-success?session_id=cs_evt_9').data  # no webhook yet
+
+    post_event(client, checkout_completed('evt_9', 'new@example.com'))
+    response = client.get('/payment-success?session_id=cs_evt_9')
+    assert response.status_code == 302 and response.headers['Location'].endswith('/setup-password')
+    assert db.session.get(StripeEvent, 'evt_9').processed_at is not None
+    assert client.get('/api/subscription-status').get_json()['email'] == 'new@example.com'
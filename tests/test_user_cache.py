@@ -0,0 +1,66 @@
+"""current_user comes from a per-process snapshot cache; writes to the user invalidate it"""
+import pytest
+
+import app as app_module
+from app import db, load_user, User
+
+
+@pytest.fixture
+def user_cache(monkeypatch):
+    monkeypatch.setattr(app_module, 'USER_CACHE_TTL_SECONDS', 60)
+    app_module.user_cache.clear()
+    yield app_module.user_cache
+    app_module.user_cache.clear()
+
+
+def test_loader_serves_cached_read_only_snapshot(client, make_user, login, count_queries, user_cache):
+    user = make_user()
+    login(user)
+    client.get('/api/subscription-status')
+    with count_queries() as counter:
+        response = client.get('/api/subscription-status')
+    assert response.get_json()['subscribed'] is True
+    assert not any('user.password_hash' in s for s in counter.statements)  # no user load
+
+    snapshot = load_user(str(user.id))
+    assert snapshot.get_display_name() == 'athlete'
+    with pytest.raises(AttributeError, match='mutates_user'):
+        snapshot.height = 70
+
+
+def test_profile_writes_reach_the_database_and_the_cache(client, make_user, login, user_cache):
+    user = make_user()
+    login(user)
+    client.get('/api/subscription-status')
+    assert client.put('/api/user/profile', json={'name': 'Sam', 'height': 70}).get_json()['user']['name'] == 'Sam'
+    assert client.post('/set_height', json={'height': 72}).get_json()['height'] == 72
+
+    db.session.expire_all()
+    assert (db.session.get(User, user.id).name, db.session.get(User, user.id).height) == ('Sam', 72)
+    assert (load_user(str(user.id)).name, load_user(str(user.id)).height) == ('Sam', 72)
+
+
+def test_coach_links_invalidate_the_athlete(client, make_user, login, user_cache):
+    coach = make_user('coach@example.com', is_coach=True)
+    athlete = make_user()
+    assert load_user(str(athlete.id)).coach_id is None
+
+    login(coach)
+    client.post('/api/coach/add-athlete', json={'email': athlete.email})
+    assert load_user(str(athlete.id)).coach_id == coach.id
+    client.delete(f'/api/coach/remove-athlete/{athlete.id}')
+    assert load_user(str(athlete.id)).coach_id is None
+
+
+def test_subscription_gates_read_the_database(client, make_user, login, user_cache):
+    user = make_user()
+    login(user)
+    assert client.get('/dashboard').status_code == 200
+
+    # Cancelled by the jobs worker: another process, so this one's snapshot is stale
+    db.session.execute(db.update(User).where(User.id == user.id).values(subscribed=False))
+    db.session.commit()
+    assert load_user(str(user.id)).subscribed is True
+    assert client.get('/dashboard').headers['Location'].endswith('/subscribe')
+    assert client.get('/tracker').headers['Location'].endswith('/subscribe')
+    assert client.get('/api/subscription-status').get_json()['subscribed'] is False
@@ -0,0 +1,64 @@
+"""user_stats rollups stay in step with the workout tables"""
+from app import db, UserStats, compute_user_stats
+
+
+def post_set(client, workout_id, velocities):
+    reps = [{'depth': 16.0, 'time_seconds': 0.8, 'velocity': v, 'quality': 'parallel'} for v in velocities]
+    response = client.post(f'/api/workouts/{workout_id}/sets', json={'reps': reps})
+    assert response.status_code == 201
+    return response.get_json()['set']
+
+
+def assert_rollup_matches(user):
+    db.session.expire_all()
+    stats = db.session.get(UserStats, user.id)
+    expected = compute_user_stats([user.id])[user.id]
+    assert stats.total_workouts == expected['total_workouts']
+    assert stats.total_sets == expected['total_sets']
+    assert stats.total_reps == expected['total_reps']
+    assert stats.get_recent_sets() == expected['recent_sets']
+
+
+def test_write_routes_maintain_rollup(client, make_user, login):
+    user = make_user()
+    login(user)
+
+    first = client.post('/api/workouts', json={'name': 'A'}).get_json()['workout']
+    second = client.post('/api/workouts', json={'name': 'B'}).get_json()['workout']
+    post_set(client, first['id'], [500, 480, 450])
+    kept = post_set(client, second['id'], [600, 550])
+    dropped = post_set(client, second['id'], [300])
+    assert_rollup_matches(user)
+
+    client.post(f"/api/sets/{kept['id']}/reps", json={'depth': 15.0})
+    assert_rollup_matches(user)
+
+    rep_id = kept['reps'][0]['id']
+    client.delete(f"/api/sets/{kept['id']}/reps/{rep_id}")
+    assert_rollup_matches(user)
+
+    client.delete(f"/api/workouts/{second['id']}/sets/{dropped['id']}")
+    assert_rollup_matches(user)
+
+    client.delete(f"/api/workouts/{first['id']}")
+    assert_rollup_matches(user)
+
+    stats = client.get('/api/stats').get_json()['stats']
+    assert stats['total_workouts'] == 1
+    assert stats['total_sets'] == 1
+    assert stats['avg_velocity'] == 550
+
+
+def test_rebuild_command_backfills_existing_users(app, client, make_user, login):
+    user = make_user()
+    login(user)
+    workout = client.post('/api/workouts', json={}).get_json()['workout']
+    post_set(client, workout['id'], [500, 500])
+
+    UserStats.query.delete()
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['stats', 'rebuild'])
+    assert result.exit_code == 0, result.output
+    assert_rollup_matches(user)
+    assert db.session.get(UserStats, user.id).total_reps == 2